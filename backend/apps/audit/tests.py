@@ -1,3 +1,37 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from apps.audit.utils import generate_excel_backup, restore_excel_backup
+from apps.content.domain import services as content_services
+from apps.courses.domain import services as course_services
+from apps.customauth.models import CustomTeacher
+from apps.evaluation.api.models import QuestionBelongsToTopic
+from apps.evaluation.domain import counters, rollups, services
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RestoreBackupTests(TestCase):
+
+    def setUp(self):
+        self.teacher = CustomTeacher.objects.create_user(username="admin", email="admin@admin.com", password="admin123")
+        subject = course_services.create_subject(name_es="Asignatura", name_en="Subject", teacher=self.teacher)
+        self.group = course_services.create_student_group(subject=subject, name_es="Grupo", name_en="Group", teacher=self.teacher)
+        self.topic = content_services.create_topic(title_es="Tema 1", title_en="Topic 1", teacher=self.teacher)
+        self.question = services.create_question(teacher=self.teacher, type='multiple', statement_es='P1', statement_en='Q1')
+        QuestionBelongsToTopic.objects.create(question=self.question, topic=self.topic)
+
+    def _grade(self, *results):
+        counters.apply_increments(counters.merge_increments(self.group.id, [(self.question.id, ok) for ok in results]))
+
+    def test_restore_rebuilds_analytics_rollups(self):
+        self._grade(True, False, True)
+        backup = generate_excel_backup()
+        # Correcciones posteriores a la copia: la restauración debe descartarlas también de los agregados
+        self._grade(False, False)
+
+        restore_excel_backup(backup.id)
+
+        topic_rows = rollups.top('topic')
+        self.assertEqual([(row['key_id'], row['attempts'], row['correct']) for row in topic_rows], [(self.topic.id, 3, 2)])
+        self.assertEqual(rollups.top('group')[0]['attempts'], 3)
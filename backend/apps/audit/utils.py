@@ -3,7 +3,7 @@ from io import BytesIO
 import traceback
 from django.core.files import File
 from django.db import transaction, IntegrityError
-from django.db.models import Q
+from django.db.models import Q, Sum
 from .models import BackupFile
 
 
@@ -20,6 +20,7 @@ from apps.evaluation.api.models import (
     QuestionEvaluationGroup  # <--- IMPORTANTE: Asegúrate de importar esto
 )
 from apps.customauth.models import CustomTeacher as Teacher 
+from apps.evaluation.domain import rollups
 
 from apps.courses.utils import generate_groupCode
 
@@ -212,12 +213,14 @@ def generate_excel_backup(is_auto=False):
 
             # 11. QUESTION EVALUATION GROUPS (ANALYTICS) - NUEVO
             # print("   - Exportando Analytics (QuestionEvaluationGroup)...")
-            qs_eval = QuestionEvaluationGroup.objects.all().values(
+            # Sumamos las sub-filas (shards) de cada contador: una fila por (grupo, pregunta)
+            qs_eval = QuestionEvaluationGroup.objects.values(
                 'group__id',
                 'question__id',
-                'ev_count',
-                'correct_count'
-            )
+            ).annotate(
+                ev_count=Sum('ev_count'),
+                correct_count=Sum('correct_count')
+            ).order_by('group__id', 'question__id')
             df_eval = pd.DataFrame(list(qs_eval))
             if not df_eval.empty:
                 df_eval.rename(columns={
@@ -527,6 +530,9 @@ def restore_excel_backup(backup_id):
                         )
                 except: pass
 
+        # Los contadores se han creado sin pasar por los agregados: se recalculan desde cero
+        rollups.rebuild()
+
         # print("🏁 Restauración completada.")
 
 # ==========================================
@@ -3,12 +3,15 @@ from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from apps.utils.permissions import BaseContentViewSet
+from apps.utils import deletions
 from .serializers import (
     ConceptSerializer, TopicSerializer, LongEpigraphSerializer, 
     EpigraphSerializer, ShortConceptSerializer, ShortEpigraphSerializer, 
     ShortTopicSerializer
 )
 from apps.content.domain import services, selectors
+from apps.evaluation.domain import concept_links
+from apps.utils.mixins import get_request_lang
 
 class TopicViewSet(BaseContentViewSet):
     serializer_class = ShortTopicSerializer
@@ -27,7 +30,15 @@ class TopicViewSet(BaseContentViewSet):
         return Response(self.get_serializer(topic).data, status=status.HTTP_200_OK)
       
     def destroy(self, request, *args, **kwargs):
-        services.delete_topic(selectors.get_topic_by_id(kwargs['pk']), teacher=request.user)
+        topic = selectors.get_topic_by_id(kwargs['pk'])
+        # Temas con muchas preguntas se desenlazan en segundo plano (ver apps.utils.deletions)
+        job = deletions.run(
+            'topic',
+            lambda progress: services.delete_topic(topic, teacher=request.user, progress=progress),
+            total=topic.questions.count(),
+        )
+        if job['status'] == 'running':
+            return Response({'job': job}, status=status.HTTP_202_ACCEPTED)
         # Devolvemos una respuesta HTTP 204 (No Content)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -268,6 +279,26 @@ class ConceptViewSet(BaseContentViewSet):
 
             return Response({'message': 'Unlinked successfully'}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['get'], url_path='suggested-concepts', url_name='suggested-concepts')
+    def suggested_concepts(self, request, pk=None):
+        """
+        GET: Relaciones sugeridas por compute_concept_links (conceptos que los grupos aciertan y fallan
+        a la vez), de mejor a peor y sin las que ya existen. Se aceptan con POST a /concepts/<id>/concepts/.
+        """
+        lang = get_request_lang(request)
+        data = [
+            {
+                'id': suggestion.concept_to_id,
+                'name': getattr(suggestion.concept_to, f'name_{lang}'),
+                'score': suggestion.score,
+                'correlation': suggestion.correlation,
+                'co_failure': suggestion.co_failure,
+                'groups': suggestion.groups,
+            }
+            for suggestion in concept_links.suggestions(pk)
+        ]
+        return Response(data)
+
     def update(self, request, *args, **kwargs):
         concept = selectors.get_concept_by_id(kwargs['pk'])
         services.update_concept(concept, teacher=request.user, **request.data)
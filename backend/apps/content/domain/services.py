@@ -2,6 +2,7 @@
 from ..api.models import Topic, Concept, Epigraph, TopicIsAboutConcept, ConceptIsRelatedToConcept, SubjectIsAboutTopic
 from django.core.exceptions import ValidationError
 from apps.utils.audit import makeChanges
+from apps.utils.deletions import delete_in_chunks
 from apps.customauth.models import CustomTeacher
 from apps.content.domain import selectors
 from django.db.models import Q
@@ -41,8 +42,12 @@ def update_topic(topic: Topic, teacher: CustomTeacher, title_es: str = None, tit
 
     return topic
 
-def delete_topic(topic: Topic, teacher: CustomTeacher):
+def delete_topic(topic: Topic, teacher: CustomTeacher, progress=None):
+    from apps.evaluation.api.models import QuestionBelongsToTopic
+
     delete_epigraphs_by_topic(topic, teacher)
+    # Las preguntas del tema se desenlazan por lotes (cada enlace ajusta los agregados por señal)
+    delete_in_chunks(QuestionBelongsToTopic.objects.filter(topic=topic), progress=progress)
     SubjectIsAboutTopic.objects.filter(topic=topic).delete()
     TopicIsAboutConcept.objects.filter(topic=topic).delete()
     makeChanges(user=teacher, old_object=topic, new_object=None)
@@ -2,6 +2,8 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 from apps.content.domain import services
 from apps.content.api.models import Topic, Epigraph, Concept
+from apps.evaluation.api.models import ConceptLinkSuggestion
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 CustomTeacher = get_user_model()
@@ -119,4 +121,18 @@ class ConceptViewSetTests(APITestCase):
     def test_get_concept_detail(self):
         response = self.client.get(f"/concepts/{self.concept.id}/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data["name"], self.concept.name_es)
\ No newline at end of file
+        self.assertEqual(response.data["name"], self.concept.name_es)
+
+    def test_suggested_concepts_hide_existing_links(self):
+        other = Concept.objects.create(name_es="Derivada", name_en="Derivative")
+        linked = Concept.objects.create(name_es="Integral", name_en="Integral")
+        for concept, score in ((other, 0.9), (linked, 0.8)):
+            ConceptLinkSuggestion.objects.create(
+                concept_from=self.concept, concept_to=concept, score=score, correlation=score, co_failure=score,
+                groups=4, computed_at=timezone.now(),
+            )
+        services.link_concepts(linked, self.concept)
+
+        response = self.client.get(f"/concepts/{self.concept.id}/suggested-concepts/", HTTP_ACCEPT_LANGUAGE='en')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(item['id'], item['name'], item['score']) for item in response.data], [(other.id, 'Derivative', 0.9)])
@@ -1,7 +1,10 @@
 # Create your views here.
 
+import gzip
+
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.http import HttpResponse
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -12,9 +15,15 @@ from apps.content.domain import selectors as content_selectors
 from apps.courses.domain import selectors as courses_selectors
 from apps.evaluation.domain import selectors as evaluation_selectors
 from apps.evaluation.domain import services as evaluation_services
+from apps.evaluation.domain import manifests, difficulty, variants, mastery
+from apps.evaluation.api.models import QuestionEvaluationGroup
 from apps.evaluation.api.serializers import ShortQuestionSerializer
 from apps.content.api.serializers import TopicSerializer, ShortTopicSerializer, ShortConceptSerializer, ShortEpigraphSerializer
 from apps.utils.permissions import BaseContentViewSet
+from apps.utils import deletions
+from apps.utils.mixins import get_request_lang
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from apps.utils.audit import makeChanges
 from apps.utils.permissions import IsTeacher
 
@@ -164,7 +173,16 @@ class SubjectViewSet(BaseContentViewSet):
         
         elif request.method == 'DELETE':
             subject = courses_selectors.get_subject_by_id(subject_id=pk)
-            services.delete_student_groups_by_subject(subject)
+            if not subject:
+                return Response({'detail': 'Subject not found'}, status=status.HTTP_404_NOT_FOUND)
+            # Muchos contadores: se borran en segundo plano y se devuelve el trabajo (ver apps.utils.deletions)
+            job = deletions.run(
+                'subject-groups',
+                lambda progress: services.delete_student_groups_by_subject(subject, teacher=request.user, progress=progress),
+                total=QuestionEvaluationGroup.objects.filter(group__subject=subject).count(),
+            )
+            if job['status'] == 'running':
+                return Response({'job': job}, status=status.HTTP_202_ACCEPTED)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['get', 'put', 'delete'], url_path='groups/(?P<group_pk>[^/.]+)')
@@ -267,6 +285,30 @@ class StudentGroupViewSet(BaseContentViewSet):
         topics = courses_selectors.get_topics_related(trs)
         return Response(ShortTopicSerializer(topics_with_order, many=True, context={'request': request}).data)
     
+    #/studentgroups/hexagon/?code=XXX-XXX&n=6
+    @action(detail=False, methods=['get'], url_path='hexagon', url_name='hexagon')
+    def hexagon(self, request):
+        """Dominio del grupo en los N conceptos más evaluados de su asignatura (totales precalculados por grupo y concepto)."""
+        code = request.query_params.get('code')
+        if not code:
+            return Response({'detail': 'No code provided'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('n') or settings.GROUP_MASTERY_CONCEPTS)
+        except ValueError:
+            return Response({'detail': 'Invalid n'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'detail': 'Invalid n'}, status=status.HTTP_400_BAD_REQUEST)
+
+        student_group = courses_selectors.get_student_group_by_code(code)
+        if not student_group:
+            return Response({'detail': 'Student group not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        vector = mastery.get_vector(student_group)
+        return Response({
+            'code': code,
+            'concepts': mastery.top(vector, limit, get_request_lang(request)),
+        })
+
     #/studentgroups/topic/?title=t1
     @action(detail=False, methods=['get'], url_path='topic', url_name='topic')
     def topic(self, request):
@@ -290,8 +332,11 @@ class StudentGroupViewSet(BaseContentViewSet):
         })
     
     #/studentgroups/exam/?topics=x,x,x,?nQuestions=x?code=XXX-XXX
+    # Si el grupo tiene un examen publicado se sirve una de sus variantes (&variant=n o &key=alumno)
     @action(detail=False, methods=['get'], url_path='exam', url_name='exam')    
     def exam(self, request):
+        code = request.query_params.get('code')
+        student_group = courses_selectors.get_student_group_by_code(code) if code else None
         topics_str = request.query_params.get('topics')
         nQuestions = request.query_params.get('nQuestions')
         if not topics_str:
@@ -299,15 +344,74 @@ class StudentGroupViewSet(BaseContentViewSet):
         
         topic_titles = topics_str.split(',')
         topic_titles = [title.strip() for title in topic_titles]
+
+        # El examen publicado solo sustituye a las peticiones con sus mismos temas y número de preguntas
+        if student_group and nQuestions and nQuestions.isdigit():
+            published = variants.find(student_group.id, topic_titles, int(nQuestions))
+            if published:
+                return self._published_exam(request, student_group, *published)
+
         topics = [content_selectors.get_topic_by_title(title) for title in topic_titles]
         topics = [topic for topic in topics if topic] # Filter out any None topics
 
         if not topics:
             return Response({'detail': 'No valid topics found'}, status=status.HTTP_404_NOT_FOUND)
         
-        questions = evaluation_services.create_exam(topics=set(topics), num_questions=int(nQuestions))
-        serializerQuestions = ShortQuestionSerializer(questions, many=True, context={'request': request})
-        return Response(serializerQuestions.data)
+        # Con ?seed= el examen es reproducible y la respuesta se puede cachear
+        seed = request.query_params.get('seed')
+        try:
+            exam_seed = int(seed) if seed is not None else evaluation_services.new_exam_seed()
+        except ValueError:
+            return Response({'detail': 'Invalid seed'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # ?difficulty=easy|mixed|hard|target:<p> elige las preguntas según su dificultad estimada
+        difficulty_mode = None
+        if request.query_params.get('difficulty'):
+            try:
+                difficulty_mode = difficulty.parse_mode(request.query_params['difficulty'])
+            except ValueError:
+                return Response({'detail': 'Invalid difficulty'}, status=status.HTTP_400_BAD_REQUEST)
+
+        questions = evaluation_services.create_exam_records(
+            topics=list(dict.fromkeys(topics)), num_questions=int(nQuestions), seed=exam_seed, difficulty_mode=difficulty_mode
+        )
+        lang = get_request_lang(request)
+        manifest = manifests.sign_exam(
+            [(question.id, question.answer_keys()) for question in questions],
+            group_id=student_group.id if student_group else None,
+            seed=exam_seed,
+        )
+        response = Response(
+            [question.as_short(lang, seed=exam_seed) for question in questions],
+            headers={manifests.HEADER: manifest, manifests.SEED_HEADER: str(exam_seed)},
+        )
+        if seed is not None:
+            patch_cache_control(response, public=True, max_age=settings.EXAM_SEEDED_CACHE_MAX_AGE)
+            patch_vary_headers(response, ['Accept-Language'])
+        return response
+
+    def _published_exam(self, request, student_group, exam_id, count):
+        """Variante pregenerada tal cual se guardó: sin muestrear ni serializar preguntas."""
+        try:
+            number = int(request.query_params['variant']) if request.query_params.get('variant') else None
+        except ValueError:
+            return Response({'detail': 'Invalid variant'}, status=status.HTTP_400_BAD_REQUEST)
+        number = variants.pick_number(count, number, request.query_params.get('key'))
+        variant = variants.get_variant(exam_id, get_request_lang(request), number)
+        if variant is None:
+            return Response({'detail': 'Exam variant not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        payload, answer_keys, seed = variant
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(payload, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(payload), content_type='application/json')
+        response[manifests.HEADER] = manifests.sign_exam(answer_keys, group_id=student_group.id, seed=seed)
+        response[manifests.SEED_HEADER] = str(seed)
+        response[variants.HEADER] = str(number)
+        patch_vary_headers(response, ['Accept-Encoding', 'Accept-Language'])
+        return response
 
     @action(detail=False, methods=['get'], url_path='question-translate', url_name='question-translate')    
     def question(self, request):
@@ -1,10 +1,12 @@
 from apps.courses.api.models import Subject, StudentGroup, TeacherMakeChangeStudentGroup, SubjectIsAboutTopic
 from apps.content.api.models import Topic
 from apps.customauth.models import CustomTeacher as Teacher
-from apps.evaluation.api.models import QuestionEvaluationGroup
+from apps.evaluation.api.models import QuestionEvaluationGroup, EvaluationEvent, ExamAttempt
 from apps.evaluation.domain import selectors as evaluation_selectors
+from apps.evaluation.domain import rollups
 from apps.courses.utils import generate_groupCode
 from apps.utils.audit import makeChanges
+from apps.utils.deletions import delete_in_chunks
 from apps.evaluation.api.models import QuestionEvaluationGroup
 
 from django.core.exceptions import ValidationError
@@ -114,12 +116,15 @@ def update_student_group(group: StudentGroup, teacher: Teacher, name_es: str = N
 
     return group
 
-def delete_student_group(group: StudentGroup, teacher: Teacher) -> None:
-    QuestionEvaluationGroup.objects.filter(group=group).delete()
+def delete_student_group(group: StudentGroup, teacher: Teacher, progress=None) -> None:
+    # Por lotes con transacciones cortas: las correcciones de exámenes no esperan a un único DELETE
+    delete_in_chunks(QuestionEvaluationGroup.objects.filter(group=group), rollups.delete_counters, progress)
+    delete_in_chunks(EvaluationEvent.objects.filter(group=group), progress=progress)
+    delete_in_chunks(ExamAttempt.objects.filter(group=group), progress=progress)
     makeChanges(user=teacher, old_object=group, new_object=None)
     group.delete()
 
-def delete_student_groups_by_subject(subject: Subject, teacher: Teacher):
+def delete_student_groups_by_subject(subject: Subject, teacher: Teacher, progress=None):
     groups = StudentGroup.objects.filter(subject=subject)
     for group in groups:
-        delete_student_group(group=group, teacher=teacher)
\ No newline at end of file
+        delete_student_group(group=group, teacher=teacher, progress=progress)
\ No newline at end of file
@@ -85,6 +85,12 @@ class SubjectViewSetTests(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_delete_subject_groups(self):
+        url = reverse('subject-groups', kwargs={'pk': self.subject.id})
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(StudentGroup.objects.filter(subject=self.subject).exists())
+
     def test_get_subject_groups(self):
         url = reverse('subject-groups', kwargs={'pk': self.subject.id})
         response = self.client.get(url)
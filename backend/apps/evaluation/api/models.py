@@ -94,9 +94,11 @@ class QuestionEvaluationGroup(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='evaluations')
     ev_count = models.PositiveIntegerField(default=0)
     correct_count = models.PositiveIntegerField(default=0)
+    # Sub-fila del contador (EVALUATION_COUNTER_SHARDS). Las lecturas siempre suman todas las sub-filas.
+    shard = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
-        unique_together = ('group', 'question')
+        unique_together = ('group', 'question', 'shard')
         indexes = [
             # Ayuda a agrupar por pregunta rápidamente
             models.Index(fields=['question']), 
@@ -104,3 +106,259 @@ class QuestionEvaluationGroup(models.Model):
 
     def __str__(self):
         return f"{self.group} evaluated Q{self.question.id}  "
+
+
+class ExamSubmission(models.Model):
+    """Resultado de una corrección enviada con `submission_id`, para responder igual a los reintentos."""
+    submission_id = models.CharField(max_length=64, unique=True)
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Submission {self.submission_id}"
+
+
+class ExamAttempt(models.Model):
+    """
+    Un examen corregido en formato compacto para las estadísticas psicométricas.
+    `question_ids` son los ids ordenados codificados como diferencias (uint16, o
+    uint32 si alguna no cabe) y `correct` el acierto de cada una con np.packbits,
+    en el mismo orden. Ver apps.evaluation.domain.attempts.
+    """
+    group = models.ForeignKey(StudentGroup, on_delete=models.CASCADE, related_name='attempts')
+    created_at = models.DateTimeField(auto_now_add=True)
+    n_questions = models.PositiveSmallIntegerField()
+    mark = models.PositiveSmallIntegerField()
+    question_ids = models.BinaryField()
+    correct = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['group', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.group} attempt {self.mark}/{self.n_questions}"
+
+
+class PublishedExam(models.Model):
+    """
+    Examen programado que un profesor publica para un grupo: se pregeneran
+    `variants` variantes (semillas seed_start .. seed_start + variants - 1) en
+    cada idioma y los alumnos reciben una de ellas ya serializada.
+    """
+    group = models.ForeignKey(StudentGroup, on_delete=models.CASCADE, related_name='published_exams')
+    teacher = models.ForeignKey(Teacher, on_delete=models.SET_NULL, null=True, related_name='published_exams')
+    topics = models.ManyToManyField(Topic, related_name='published_exams')
+    num_questions = models.PositiveSmallIntegerField()
+    variants = models.PositiveSmallIntegerField()
+    seed_start = models.BigIntegerField(default=0)
+    difficulty = models.CharField(max_length=20, null=True, blank=True)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.group} exam {self.id} ({self.variants} variants)"
+
+
+class ExamVariant(models.Model):
+    """Una variante lista para enviar: el JSON del examen comprimido con gzip y su clave de respuestas."""
+    exam = models.ForeignKey(PublishedExam, on_delete=models.CASCADE, related_name='variant_set')
+    number = models.PositiveSmallIntegerField()
+    lang = models.CharField(max_length=2)
+    seed = models.BigIntegerField()
+    payload = models.BinaryField()
+    # [[question_id, [[answer_id, is_correct], ...]], ...] para firmar el manifiesto al servirla
+    answer_keys = models.JSONField()
+
+    class Meta:
+        unique_together = ('exam', 'lang', 'number')
+
+    def __str__(self):
+        return f"Exam {self.exam_id} variant {self.number} ({self.lang})"
+
+
+class AnalyticsRollup(models.Model):
+    """
+    Totales de QuestionEvaluationGroup ya agregados por dimensión (tema,
+    concepto, grupo, asignatura o pregunta), globales (subject_id = 0) y por
+    asignatura. Se mantienen en el mismo lote que los contadores; ver
+    apps.evaluation.domain.rollups.
+    """
+    DIMENSIONS = [
+        ('topic', 'Topic'),
+        ('concept', 'Concept'),
+        ('group', 'Group'),
+        ('subject', 'Subject'),
+        ('question', 'Question'),
+    ]
+
+    subject_id = models.PositiveIntegerField(default=0)
+    dimension = models.CharField(max_length=10, choices=DIMENSIONS)
+    key_id = models.PositiveIntegerField()
+    attempts = models.BigIntegerField(default=0)
+    correct = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('subject_id', 'dimension', 'key_id')
+
+    def __str__(self):
+        return f"{self.dimension} {self.key_id} (subject {self.subject_id}): {self.correct}/{self.attempts}"
+
+
+class AnalyticsVersion(models.Model):
+    """
+    Versión de las analíticas, compartida por todos los procesos (una sola
+    fila). `version` sube con cada escritura de los agregados y
+    `reset_version` guarda la última que vino de un borrado o una
+    reconstrucción; ver apps.evaluation.domain.analytics_cache.
+    """
+    version = models.BigIntegerField(default=1)
+    reset_version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"analytics v{self.version} (reset v{self.reset_version})"
+
+
+class GroupConceptRollup(models.Model):
+    """
+    Intentos y aciertos de cada grupo en cada concepto (el vector del
+    «hexágono»). Se mantiene en el mismo lote que AnalyticsRollup; ver
+    apps.evaluation.domain.mastery.
+    """
+    group = models.ForeignKey(StudentGroup, on_delete=models.CASCADE, related_name='+')
+    concept = models.ForeignKey(Concept, on_delete=models.CASCADE, related_name='+')
+    attempts = models.BigIntegerField(default=0)
+    correct = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('group', 'concept')
+
+    def __str__(self):
+        return f"group {self.group_id} concept {self.concept_id}: {self.correct}/{self.attempts}"
+
+
+class EvaluationEvent(models.Model):
+    """
+    Registro de correcciones por franjas de tiempo: intentos y aciertos de
+    cada (grupo, pregunta) en una hora, un día o una semana. A diferencia de
+    QuestionEvaluationGroup no se borra con reset_analytics; ver
+    apps.evaluation.domain.events. En PostgreSQL la tabla está particionada
+    por mes sobre bucket_start.
+    """
+    GRANULARITIES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+        ('week', 'Week'),
+    ]
+
+    group = models.ForeignKey(StudentGroup, on_delete=models.CASCADE, related_name='evaluation_events')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='evaluation_events')
+    granularity = models.CharField(max_length=4, choices=GRANULARITIES, default='hour')
+    bucket_start = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    # La misma sub-fila que el contador de la corrección (QuestionEvaluationGroup.shard). Las lecturas suman todas.
+    shard = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('granularity', 'bucket_start', 'group', 'question', 'shard')
+        indexes = [
+            models.Index(fields=['bucket_start']),
+        ]
+
+    def __str__(self):
+        return f"{self.group} - {self.question} @ {self.bucket_start:%Y-%m-%d %H:00} ({self.granularity})"
+
+
+class QuestionStats(models.Model):
+    """
+    Calidad de cada pregunta calculada por lotes (comando compute_question_stats):
+    p suavizada con su intervalo de confianza, discriminación punto-biserial y
+    un aviso si la pregunta es atípica. Ver apps.evaluation.domain.item_stats.
+    """
+    FLAGS = [
+        ('', 'OK'),
+        ('too_hard', 'Too hard'),
+        ('too_easy', 'Too easy'),
+        ('negative_discrimination', 'Negative discrimination'),
+        ('insufficient_data', 'Insufficient data'),
+    ]
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    groups = models.PositiveIntegerField(default=0)
+    p_value = models.FloatField()
+    ci_low = models.FloatField()
+    ci_high = models.FloatField()
+    discrimination = models.FloatField(null=True, blank=True)
+    flag = models.CharField(max_length=24, choices=FLAGS, blank=True, default='')
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['flag']),
+            models.Index(fields=['p_value']),
+        ]
+
+    def __str__(self):
+        return f"Q{self.question_id} p={self.p_value:.2f} {self.flag}"
+
+
+class ConceptLinkSuggestion(models.Model):
+    """
+    Relación entre conceptos sugerida a partir de los resultados de los grupos
+    (comando compute_concept_links): conceptos cuya tasa de acierto sube y baja a
+    la vez entre grupos y que se fallan juntos. Ver apps.evaluation.domain.concept_links.
+    """
+    concept_from = models.ForeignKey(Concept, on_delete=models.CASCADE, related_name='suggested_links')
+    concept_to = models.ForeignKey(Concept, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    correlation = models.FloatField()
+    co_failure = models.FloatField()
+    # Grupos con evaluaciones de los dos conceptos
+    groups = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('concept_from', 'concept_to')
+        indexes = [
+            models.Index(fields=['concept_from', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.concept_from_id} → {self.concept_to_id} ({self.score:.2f})"
+
+
+class DeletionJob(models.Model):
+    """
+    Borrado por lotes en segundo plano (reset de analíticas, grupos de una
+    asignatura, preguntas o temas) con las filas borradas hasta el momento.
+    Está en la BD para que cualquier worker pueda consultarlo; ver
+    apps.utils.deletions.
+    """
+    STATUSES = [
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.CharField(max_length=32, primary_key=True)
+    kind = models.CharField(max_length=40)
+    status = models.CharField(max_length=10, choices=STATUSES, default='running')
+    total = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Lo renueva cada lote: un trabajo 'running' sin lotes recientes es de un proceso que murió
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status}): {self.deleted}/{self.total}"
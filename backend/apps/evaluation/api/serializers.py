@@ -4,7 +4,7 @@ from .models import (
     Question, Answer,
     # TeacherMakeChangeQuestion, TeacherMakeChangeAnswer,
     QuestionBelongsToTopic, QuestionRelatedToConcept,
-    QuestionEvaluationGroup
+    QuestionEvaluationGroup, PublishedExam, QuestionStats
 )
 from apps.content.api.serializers import ShortTopicSerializer, ShortConceptSerializer
 
@@ -68,12 +68,13 @@ class QuestionSerializer(LanguageSerializerMixin, serializers.ModelSerializer):
     explanation = serializers.SerializerMethodField()
     explanation_es = serializers.SerializerMethodField()
     explanation_en = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = Question
         fields = [
             'id', 'type', 'statement', 'statement_es', 'statement_en', 'approved', 'generated',
-            'answers', 'topics', 'subjects', 'concepts', 'explanation', 'explanation_es', 'explanation_en'
+            'answers', 'topics', 'subjects', 'concepts', 'explanation', 'explanation_es', 'explanation_en', 'stats'
         ]
         read_only_fields = ['id', 'answers']
         extra_kwargs = {
@@ -138,6 +139,11 @@ class QuestionSerializer(LanguageSerializerMixin, serializers.ModelSerializer):
         # 4. IMPORTANTE: Usamos ShortSubjectSerializer, NO ShortTopicSerializer
         # Asegúrate de que ShortSubjectSerializer incluya 'description' si lo necesitas en el JSON
         return ShortSubjectSerializer(subjects_set, many=True, context=self.context).data
+
+    def get_stats(self, obj):
+        # None hasta que compute_question_stats calcule la pregunta
+        stats = getattr(obj, 'stats', None)
+        return QuestionStatsSerializer(stats).data if stats else None
     
 # class TeacherMakeChangeQuestionSerializer(serializers.ModelSerializer):
 #     class Meta:
@@ -150,6 +156,12 @@ class QuestionSerializer(LanguageSerializerMixin, serializers.ModelSerializer):
 #         model = TeacherMakeChangeAnswer
 #         fields = '__all__'
 
+class QuestionStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuestionStats
+        fields = ['attempts', 'correct', 'groups', 'p_value', 'ci_low', 'ci_high', 'discrimination', 'flag', 'computed_at']
+        read_only_fields = fields
+
 class QuestionBelongsToTopicSerializer(serializers.ModelSerializer):
     class Meta:
         model = QuestionBelongsToTopic
@@ -175,4 +187,11 @@ class AnalyticsResponseSerializer(serializers.Serializer):
     full_label = serializers.CharField()
     value = serializers.FloatField()
     attempts = serializers.IntegerField()
-    total_failures = serializers.FloatField(required=False)
\ No newline at end of file
+    total_failures = serializers.FloatField(required=False)
+    series = serializers.ListField(child=serializers.DictField(), required=False)
+
+class PublishedExamSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PublishedExam
+        fields = ['id', 'group', 'topics', 'num_questions', 'variants', 'seed_start', 'difficulty', 'active', 'created_at']
+        read_only_fields = fields
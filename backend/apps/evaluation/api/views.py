@@ -1,27 +1,33 @@
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.db.models import Sum, F, Case, When, Value, FloatField, ExpressionWrapper, Prefetch
+from django.db.models import F, Prefetch
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.utils.urls import replace_query_param
 from apps.content.api.models import Topic
 from apps.content.domain import selectors as content_selectors
 from apps.courses.domain import selectors as courses_selectors
 from rest_framework import permissions
-from django.db.models.functions import Coalesce
 from .models import (
     Question, Answer,
     QuestionBelongsToTopic, QuestionRelatedToConcept,
-    QuestionEvaluationGroup
+    QuestionEvaluationGroup, PublishedExam, QuestionStats
 )
 from .serializers import (
     QuestionSerializer, AnswerSerializer, ShortQuestionSerializer,
     QuestionRelatedToConceptSerializer,
-    AnalyticsResponseSerializer
+    AnalyticsResponseSerializer, PublishedExamSerializer
 )
-from apps.evaluation.domain import selectors, services
+from apps.evaluation.domain import selectors, services, manifests, difficulty, game, dedup, variants, rollups, events, analytics_cache, statistics, item_stats, exports
 from apps.utils.permissions import BaseContentViewSet
+from apps.utils import deletions
+from apps.utils.mixins import get_request_lang
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
 
-from apps.utils.permissions import IsSuperTeacher
+from apps.utils.permissions import IsSuperTeacher, IsTeacher
 
 class QuestionRelatedToConceptViewSet(BaseContentViewSet):
     queryset = QuestionRelatedToConcept.objects.all()
@@ -74,14 +80,50 @@ class QuestionViewSet(BaseContentViewSet):
 
     def destroy(self, request, *args, **kwargs):
         question = self.get_object()
-        services.delete_question(teacher=request.user, question=question)
+        job = deletions.run(
+            'question',
+            lambda progress: services.delete_question(teacher=request.user, question=question, progress=progress),
+            total=QuestionEvaluationGroup.objects.filter(question=question).count(),
+        )
+        if job['status'] == 'running':
+            return Response({'job': job}, status=status.HTTP_202_ACCEPTED)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    # Ordenaciones de long-questions por las estadísticas de QuestionStats (?ordering=, con - para descendente)
+    STATS_ORDERING = {
+        'p_value': 'stats__p_value',
+        'discrimination': 'stats__discrimination',
+        'attempts': 'stats__attempts',
+        'ci_width': 'ci_width',
+    }
+
+    def _filter_by_stats(self, queryset, params):
+        flag = params.get('flag')
+        if flag is not None:
+            if flag not in dict(QuestionStats.FLAGS):
+                raise ValidationError(f"Invalid flag: {flag}")
+            queryset = queryset.filter(stats__flag=flag)
+        ordering = params.get('ordering')
+        if ordering:
+            field = self.STATS_ORDERING.get(ordering.lstrip('-'))
+            if field is None:
+                raise ValidationError(f"Invalid ordering: {ordering}")
+            if field == 'ci_width':
+                queryset = queryset.annotate(ci_width=F('stats__ci_high') - F('stats__ci_low'))
+            # Las preguntas sin estadísticas (o sin discriminación) van siempre al final
+            expression = F(field).desc(nulls_last=True) if ordering.startswith('-') else F(field).asc(nulls_last=True)
+            queryset = queryset.order_by(expression, '-id')
+        return queryset
+
     @action(detail=False, methods=['get'], url_path='long-questions', url_name='long-questions')
     def long_questions(self, request):
         queryset = self.filter_queryset(self.get_queryset())
+        try:
+            queryset = self._filter_by_stats(queryset, request.query_params)
+        except ValidationError as e:
+            return Response({'detail': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
         
-        queryset_optimized = queryset.prefetch_related(
+        queryset_optimized = queryset.select_related('stats').prefetch_related(
             # A. Traemos respuestas activas y las guardamos en 'active_answers' (para el serializer)
             Prefetch(
                 'answers',
@@ -105,6 +147,17 @@ class QuestionViewSet(BaseContentViewSet):
         return Response(serializer.data)
 
 
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """GET /questions/stats/: preguntas por aviso de calidad y fecha del último cálculo."""
+        return Response(item_stats.summary())
+
+    @stats.mapping.post
+    def refresh_stats(self, request):
+        """POST /questions/stats/: recalcula QuestionStats (lo mismo que compute_question_stats)."""
+        item_stats.refresh()
+        return Response(item_stats.summary())
+
     @action(detail=True, methods=['get'], url_path='last-modified', url_name='last-modified')
     def last_modified(self, request, pk=None):
         question = selectors.get_question_by_id(pk)
@@ -183,50 +236,212 @@ class ExamViewSet(viewsets.GenericViewSet):
         if not topics:
             return Response({'detail': 'No valid topics found'}, status=status.HTTP_404_NOT_FOUND)
         
-        questions = services.create_exam(topics=set(topics), num_questions=int(nQuestions))
-        serializerQuestions = ShortQuestionSerializer(questions, many=True, context={'request': request})
-        return Response(serializerQuestions.data)
+        # Con ?seed= el examen es reproducible y la respuesta se puede cachear
+        seed = request.query_params.get('seed')
+        try:
+            exam_seed = int(seed) if seed is not None else services.new_exam_seed()
+        except ValueError:
+            return Response({'detail': 'Invalid seed'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # ?difficulty=easy|mixed|hard|target:<p> elige las preguntas según su dificultad estimada
+        difficulty_mode = None
+        if request.query_params.get('difficulty'):
+            try:
+                difficulty_mode = difficulty.parse_mode(request.query_params['difficulty'])
+            except ValueError:
+                return Response({'detail': 'Invalid difficulty'}, status=status.HTTP_400_BAD_REQUEST)
+
+        questions = services.create_exam_records(
+            topics=list(dict.fromkeys(topics)), num_questions=int(nQuestions), seed=exam_seed, difficulty_mode=difficulty_mode
+        )
+        lang = get_request_lang(request)
+        # Manifiesto firmado para corregir sin releer preguntas; ?code= lo ata a un grupo
+        code = request.query_params.get('code')
+        student_group = courses_selectors.get_student_group_by_code(code) if code else None
+        manifest = manifests.sign_exam(
+            [(question.id, question.answer_keys()) for question in questions],
+            group_id=student_group.id if student_group else None,
+            seed=exam_seed,
+        )
+        response = Response(
+            [question.as_short(lang, seed=exam_seed) for question in questions],
+            headers={manifests.HEADER: manifest, manifests.SEED_HEADER: str(exam_seed)},
+        )
+        if seed is not None:
+            patch_cache_control(response, public=True, max_age=settings.EXAM_SEEDED_CACHE_MAX_AGE)
+            patch_vary_headers(response, ['Accept-Language'])
+        return response
+
+    @action(detail=False, methods=['post'], url_path='generate-from-blueprint', url_name='generate-from-blueprint')
+    def create_exam_from_blueprint(self, request):
+        """
+        POST /exams/generate-from-blueprint/
+        {"nQuestions": 12, "topics": [{"title": "Tema 1", "min": 2}], "types": {"truefalse": 0.3},
+         "concepts": ["Concepto"], "difficulty": "target:0.6", "seed": 1, "code": "XXX-XXX"}
+        Devuelve {"questions": [...], "relaxed": [...]} con las restricciones que no se han podido cumplir.
+        """
+        data = request.data
+        try:
+            num_questions = int(data.get('nQuestions', 0))
+            exam_seed = int(data['seed']) if data.get('seed') is not None else services.new_exam_seed()
+        except (TypeError, ValueError):
+            return Response({'detail': 'Invalid nQuestions or seed'}, status=status.HTTP_400_BAD_REQUEST)
+        difficulty_mode = None
+        if data.get('difficulty'):
+            try:
+                difficulty_mode = difficulty.parse_mode(data['difficulty'])
+            except ValueError:
+                return Response({'detail': 'Invalid difficulty'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            questions, relaxed = services.create_exam_from_blueprint(
+                num_questions=num_questions,
+                topics=data.get('topics') or [],
+                types=data.get('types') or {},
+                concepts=data.get('concepts') or [],
+                seed=exam_seed,
+                difficulty_mode=difficulty_mode,
+            )
+        except ValidationError as e:
+            return Response({'detail': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        except (KeyError, TypeError, ValueError):
+            return Response({'detail': 'Invalid blueprint'}, status=status.HTTP_400_BAD_REQUEST)
+
+        lang = get_request_lang(request)
+        code = data.get('code')
+        student_group = courses_selectors.get_student_group_by_code(code) if code else None
+        manifest = manifests.sign_exam(
+            [(question.id, question.answer_keys()) for question in questions],
+            group_id=student_group.id if student_group else None,
+            seed=exam_seed,
+        )
+        return Response(
+            {'questions': [question.as_short(lang, seed=exam_seed) for question in questions], 'relaxed': relaxed},
+            headers={manifests.HEADER: manifest, manifests.SEED_HEADER: str(exam_seed)},
+        )
 
     @transaction.atomic
     @action(detail=False, methods=['post'], url_path='evaluate-exam', url_name='evaluate-exam', permission_classes=[permissions.AllowAny])
     def evaluate_exam(self, request):
         data = request.data
+        # Con submission_id los reintentos del cliente devuelven la primera corrección sin volver a contar
+        result, = dedup.run_once([data.get('submission_id')], lambda positions: {0: self._evaluate(request, data)})
+        # Los errores no se guardan en dedup: el cliente puede corregir el envío y reintentar
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if 'detail' in result else status.HTTP_200_OK)
+
+    def _evaluate(self, request, data):
         student_group = courses_selectors.get_student_group_by_code(data.get('student_group_code'))
-     
-        questions_and_answers = data.get('questions_and_answers', [])
+        try:
+            answers = {int(q_id): int(a_id) for q_id, a_id in data.get('questions_and_answers', {}).items()}
+        except (AttributeError, TypeError, ValueError):
+            return {'detail': 'Invalid questions_and_answers'}
 
-        # --- OPTIMIZACIÓN DE BÚSQUEDA MASIVA ---
-        
-        # 1. Extraemos todos los IDs de golpe
-        # questions_and_answers es un dict { "question_id": "answer_id" } ? 
-        # Asumo que las claves son IDs de pregunta y valores IDs de respuesta.
-        
-        q_ids = list(questions_and_answers.keys())
-        a_ids = list(questions_and_answers.values())
-
-        # 2. Hacemos 2 Queries para traer todos los objetos a memoria
-        # Usamos in_bulk para obtener un diccionario {id: objeto} instantáneo
-        questions_map = Question.objects.in_bulk(q_ids)
-        answers_map = Answer.objects.in_bulk(a_ids)
-
-        questions_and_answers_dict = {}
-
-        # 3. Reconstruimos el diccionario en memoria (CPU Python, muy rápido)
-        for q_id_str, a_id_str in questions_and_answers.items():
-            # Convertimos a int si vienen como string
-            q_id = int(q_id_str)
-            a_id = int(a_id_str)
-            
-            question_obj = questions_map.get(q_id)
-            answer_obj = answers_map.get(a_id)
-
-            if question_obj and answer_obj:
-                questions_and_answers_dict[question_obj] = answer_obj
-            
-        # Llamamos al servicio con los objetos ya cargados
-        mark, explanations, recommendations = services.correct_exam(student_group, questions_and_answers_dict)
-        
-        return Response({'mark': mark, "explanations": explanations, "recommendations": recommendations})
+        try:
+            # Con un manifiesto válido se corrige sin leer preguntas ni respuestas
+            manifest = data.get('manifest') or request.headers.get(manifests.HEADER)
+            result = services.correct_exam_from_manifest(student_group, manifest, answers) if manifest and student_group else None
+            if result is None:
+                # Si no, dos in_bulk (preguntas y respuestas) y la corrección en memoria
+                result = services.correct_exam(student_group, services.load_answers(answers))
+        except ValidationError as e:
+            # Respuesta manipulada o de otra pregunta, como en correct_exams
+            return {'detail': e.messages[0]}
+
+        mark, explanations, recommendations = result
+        return {'mark': mark, "explanations": explanations, "recommendations": recommendations}
+
+    @transaction.atomic
+    @action(detail=False, methods=['post'], url_path='evaluate-exams', url_name='evaluate-exams', permission_classes=[permissions.AllowAny])
+    def evaluate_exams(self, request):
+        """
+        POST /exams/evaluate-exams/ {"exams": [{student_group_code, questions_and_answers, manifest?, submission_id?}, ...]}
+        Corrige de una vez los exámenes hechos sin conexión; devuelve un resultado por examen, en el mismo orden.
+        """
+        exams = request.data.get('exams')
+        if not isinstance(exams, list) or not all(isinstance(exam, dict) for exam in exams):
+            return Response({'detail': 'A list of exams is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(exams) > settings.EVALUATION_BATCH_MAX_EXAMS:
+            return Response({'detail': 'Too many exams in one request'}, status=status.HTTP_400_BAD_REQUEST)
+        results = dedup.run_once(
+            [exam.get('submission_id') for exam in exams],
+            lambda positions: dict(zip(positions, services.correct_exams([exams[position] for position in positions]))),
+        )
+        return Response({'results': results})
+
+class GameViewSet(viewsets.GenericViewSet):
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    # /game/questions/?subject=x | ?code=XXX-XXX &cursor=...
+    @action(detail=False, methods=['get'], url_path='questions', url_name='questions')
+    def questions(self, request):
+        subject_id = request.query_params.get('subject')
+        code = request.query_params.get('code')
+        if code:
+            student_group = courses_selectors.get_student_group_by_code(code)
+            if not student_group:
+                return Response({'detail': 'Student group not found'}, status=status.HTTP_404_NOT_FOUND)
+            subject_id = student_group.subject_id
+        elif subject_id is not None:
+            try:
+                subject_id = int(subject_id)
+            except ValueError:
+                return Response({'detail': 'Invalid subject'}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch, cursor = game.get_batch(subject_id, get_request_lang(request), request.query_params.get('cursor'))
+        next_url = None
+        if cursor:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+        return Response({'next': next_url, 'results': batch})
+
+class PublishedExamViewSet(viewsets.GenericViewSet):
+    """
+    Exámenes programados de los grupos del profesor.
+    POST /published-exams/ {"code": "XXX-XXX", "topics": ["Tema 1"], "nQuestions": 10, "variants": 30, "seed": 0, "difficulty": null}
+    DELETE /published-exams/<id>/ deja de servirlo.
+    Los alumnos lo reciben en /studentgroups/exam/?code= pidiendo sus mismos temas y nQuestions.
+    """
+    serializer_class = PublishedExamSerializer
+    permission_classes = [IsTeacher]
+
+    def get_queryset(self):
+        return PublishedExam.objects.filter(group__teacher=self.request.user).prefetch_related('topics').order_by('-id')
+
+    def list(self, request):
+        return Response(self.get_serializer(self.get_queryset(), many=True).data)
+
+    def create(self, request):
+        data = request.data
+        student_group = courses_selectors.get_student_group_by_code(data.get('code'))
+        if not student_group:
+            return Response({'detail': 'Student group not found'}, status=status.HTTP_404_NOT_FOUND)
+        if student_group.teacher != request.user:
+            return Response({'detail': 'You do not have permission to perform this action.'}, status=status.HTTP_403_FORBIDDEN)
+        topics = [content_selectors.get_topic_by_title(title.strip()) for title in data.get('topics') or []]
+        if not all(topics):
+            return Response({'detail': 'No valid topics found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            exam = variants.publish(
+                teacher=request.user,
+                student_group=student_group,
+                topics=topics,
+                num_questions=int(data.get('nQuestions', 0)),
+                variants=int(data.get('variants', 0)),
+                seed_start=int(data.get('seed') or 0),
+                difficulty_mode=data.get('difficulty') or None,
+            )
+        except (TypeError, ValueError):
+            return Response({'detail': 'Invalid nQuestions, variants or seed'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({'detail': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(exam).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        exam = self.get_queryset().filter(pk=pk).first()
+        if not exam:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        variants.unpublish(exam)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 class AnalyticsViewSet(BaseContentViewSet):
 
@@ -238,17 +453,11 @@ class AnalyticsViewSet(BaseContentViewSet):
 
     @action(detail=False, methods=['get'])
     def performance(self, request):
-        queryset = QuestionEvaluationGroup.objects.all()
-
-        # 1. Filtramos basura
-        queryset = queryset.filter(ev_count__gt=0) 
-        
-        # Filtro Subject
+        # Filtro Subject (0 = todas las asignaturas)
+        subject_id = 0
         subject_id_param = request.query_params.get('subject_id')
         if subject_id_param and subject_id_param.isdigit():
             subject_id = int(subject_id_param)
-            if subject_id > 0:
-                queryset = queryset.filter(group__subject_id=subject_id)
 
         # Configuración
         group_by = request.query_params.get('group_by', 'topic')
@@ -258,109 +467,187 @@ class AnalyticsViewSet(BaseContentViewSet):
         # --- LÓGICA DE IDIOMA DINÁMICA ---
         lang = self.get_language(request)
 
+        # Intervalo de tiempo (from/to) y evolución por franjas (bucket): se leen del registro de correcciones
+        params = request.query_params
+        window = None
+        if any(params.get(name) for name in ('from', 'to', 'bucket')):
+            try:
+                window = events.parse_window(params.get('from'), params.get('to'), params.get('bucket'))
+            except ValidationError as e:
+                return Response({'detail': e.messages[0]}, status=400)
+
+        if group_by not in rollups.DIMENSIONS:
+            return Response({'detail': 'Invalid group_by parameter'}, status=400)
+
+        # Resultado guardado para estos parámetros (ver analytics_cache); solo se espera si no hay ninguno
+        cache_params = {
+            'subject_id': subject_id, 'group_by': group_by, 'limit': limit, 'lang': lang,
+            'from': params.get('from'), 'to': params.get('to'), 'bucket': params.get('bucket'),
+        }
         try:
-            label_key = None 
-            is_question_grouping = False
-            id_key = None
-
-            if group_by == 'topic':
-                # Seleccionamos la columna title_es o title_en dinámicamente
-                label_key = f'question__topics__topic__title_{lang}'
-                id_key = 'question__topics__topic__id'
-                queryset = queryset.exclude(question__topics__topic__isnull=True)
-            elif group_by == 'concept':
-                # name_es o name_en
-                label_key = f'question__concepts__concept__name_{lang}'
-                id_key = 'question__concepts__concept__id'
-                queryset = queryset.exclude(question__concepts__concept__isnull=True)
-            elif group_by == 'group':
-                # name_es o name_en
-                label_key = f'group__name_{lang}'
-                id_key = 'group__id'
-            elif group_by == 'question':
-                id_key = 'question__id'
-                # Para preguntas el label es el ID, pero buscaremos el texto después
-                label_key = 'question__id'
-                is_question_grouping = True
-            else:
-                return Response({'detail': 'Invalid group_by parameter'}, status=400)
-
-            # --- CONSULTA Y CÁLCULOS ---
-            result = queryset.values(label_key, id_key).annotate(
-                total_attempts=Coalesce(Sum('ev_count'), 0),
-                total_correct=Coalesce(Sum('correct_count'), 0)
-            ).annotate(
-                accuracy=Case(
-                    When(total_attempts=0, then=Value(0.0)),
-                    default=ExpressionWrapper(
-                        (F('total_correct') * 100.0) / F('total_attempts'),
-                        output_field=FloatField()
-                    ),
-                    output_field=FloatField()
-                ),
-                total_failures=ExpressionWrapper(
-                    F('total_attempts') - F('total_correct'),
-                    output_field=FloatField()
-                )
+            data, cache_state = analytics_cache.get_or_compute(
+                cache_params, lambda: self._performance_data(group_by, subject_id, limit, lang, window)
             )
-            
-            # Ordenamiento inteligente
-            result = result.order_by('-total_failures') 
-
-            if limit:
-                result = result[:limit]
-
-            # --- MAPEO DE TEXTOS (Si es por pregunta) ---
-            question_map = {}
-            if is_question_grouping and result:
-                q_ids = [item['question__id'] for item in result]
-                # Buscamos statement_es o statement_en dinámicamente
-                statement_field = f'statement_{lang}'
-                questions = Question.objects.filter(id__in=q_ids).values('id', statement_field)
-                for q in questions:
-                    question_map[q['id']] = q[statement_field]
-
-            formatted_data = []
-            for item in result:
-                attempts = item['total_attempts']
-                percentage = round(item['accuracy'], 2) if item['accuracy'] is not None else 0
-                item_id = item.get(id_key)
-
-                if is_question_grouping:
-                    q_id = item['question__id']
-                    statement = question_map.get(q_id, "Texto no encontrado")
-                    label = f"Q{q_id}" 
-                    full_label = f"Q{q_id}: {statement}"
-                else:
-                    raw_label = item.get(label_key) or "Sin asignar"
-                    label = str(raw_label)[:15] + '...' if len(str(raw_label)) > 15 else str(raw_label)
-                    full_label = str(raw_label)
-
-                formatted_data.append({
-                    'id': item_id,
-                    'label': label,
-                    'full_label': full_label,
-                    'value': percentage,
-                    'attempts': attempts,
-                    'total_failures': item.get('total_failures', 0)
-                })
-
-            # Usamos el Serializer para validar la salida (opcional pero limpio)
-            serializer = AnalyticsResponseSerializer(data=formatted_data, many=True)
-            serializer.is_valid() # No levantamos excepción aquí para ser flexibles, pero estructura los datos
-            
-            return Response(serializer.data)
-
         except Exception as e:
             print(f"Error Analytics: {e}")
             import traceback
             traceback.print_exc()
             return Response({'detail': str(e)}, status=500) 
 
+        response = Response(data)
+        response['X-Analytics-Cache'] = cache_state.upper()
+        return response
+
+    def _performance_data(self, group_by, subject_id, limit, lang, window):
+        is_question_grouping = group_by == 'question'
+
+        # --- CONSULTA: agregados ya calculados (ver rollups) o franjas del intervalo (ver events) ---
+        if window:
+            start, end, bucket = window
+            result = events.top(group_by, subject_id, start, end, limit)
+        else:
+            result = rollups.top(group_by, subject_id, limit)
+        # title_es/en, name_es/en o statement_es/en según la dimensión
+        label_map = rollups.labels(group_by, [item['key_id'] for item in result], lang)
+
+        formatted_data = []
+        for item in result:
+            attempts = item['attempts']
+            percentage = round(item['correct'] * 100.0 / attempts, 2)
+            item_id = item['key_id']
+
+            if is_question_grouping:
+                statement = label_map.get(item_id, "Texto no encontrado")
+                label = f"Q{item_id}" 
+                full_label = f"Q{item_id}: {statement}"
+            else:
+                raw_label = label_map.get(item_id) or "Sin asignar"
+                label = str(raw_label)[:15] + '...' if len(str(raw_label)) > 15 else str(raw_label)
+                full_label = str(raw_label)
+
+            formatted_data.append({
+                'id': item_id,
+                'label': label,
+                'full_label': full_label,
+                'value': percentage,
+                'attempts': attempts,
+                'total_failures': item['failures']
+            })
+
+        if window and bucket:
+            trends = events.series(group_by, [item['id'] for item in formatted_data], subject_id, start, end, bucket)
+            for item in formatted_data:
+                item['series'] = trends.get(item['id'], [])
+
+        # Usamos el Serializer para validar la salida (opcional pero limpio)
+        serializer = AnalyticsResponseSerializer(data=formatted_data, many=True)
+        serializer.is_valid() # No levantamos excepción aquí para ser flexibles, pero estructura los datos
+        return [dict(item) for item in serializer.data]
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Descarga de analíticas en streaming (ver exports).
+        Query Params:
+            - output: 'csv' (por defecto) o 'ndjson'
+            - level: 'aggregate' (por defecto, una fila por id de group_by) o 'raw' (contadores)
+            - group_by, subject_id, from, to: como en performance
+        """
+        params = request.query_params
+        output = params.get('output', 'csv')
+        level = params.get('level', 'aggregate')
+        group_by = params.get('group_by', 'topic')
+        subject_id = int(params['subject_id']) if (params.get('subject_id') or '').isdigit() else 0
+        if output not in exports.FORMATS:
+            return Response({'detail': 'Invalid output format'}, status=400)
+        if level not in exports.LEVELS:
+            return Response({'detail': 'Invalid level'}, status=400)
+        if group_by not in rollups.DIMENSIONS:
+            return Response({'detail': 'Invalid group_by parameter'}, status=400)
+        window = None
+        if params.get('from') or params.get('to'):
+            try:
+                window = events.parse_window(params.get('from'), params.get('to'), None)
+            except ValidationError as e:
+                return Response({'detail': e.messages[0]}, status=400)
+
+        fields = exports.columns(level, window)
+        records = exports.rows(level, group_by, subject_id, window, self.get_language(request))
+        response = StreamingHttpResponse(exports.stream(output, fields, records), content_type=exports.FORMATS[output])
+        name = f"analytics-{group_by if level == 'aggregate' else 'raw'}.{output}"
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def crosstab(self, request):
+        """
+        Tabla cruzada de dos dimensiones (topic, concept, group, question o subject).
+        Query Params:
+            - rows / columns: dimensiones de filas y columnas (por defecto topic × group)
+            - subject_id: solo los grupos de esa asignatura
+            - top_rows / top_columns: solo las filas o columnas con más fallos
+        Devuelve las matrices por columnas: ids y etiquetas de cada eje y
+        attempts / correct / accuracy como listas de filas (accuracy null sin intentos).
+        """
+        params = request.query_params
+        rows = params.get('rows', 'topic')
+        columns = params.get('columns', 'group')
+        if rows == columns or rows not in statistics.DIMENSIONS or columns not in statistics.DIMENSIONS:
+            return Response({'detail': 'Invalid rows or columns parameter'}, status=400)
+        try:
+            subject_id = int(params.get('subject_id') or 0)
+            top_rows = int(params['top_rows']) if params.get('top_rows') else None
+            top_columns = int(params['top_columns']) if params.get('top_columns') else None
+        except ValueError:
+            return Response({'detail': 'Invalid subject_id, top_rows or top_columns'}, status=400)
+        lang = self.get_language(request)
+
+        def compute():
+            table = statistics.crosstab(rows, columns, subject_id).top(top_rows, top_columns)
+            row_labels = rollups.labels(rows, table.row_ids.tolist(), lang)
+            column_labels = rollups.labels(columns, table.column_ids.tolist(), lang)
+            return {
+                'rows': {
+                    'dimension': rows,
+                    'ids': table.row_ids.tolist(),
+                    'labels': [row_labels.get(i) or "Sin asignar" for i in table.row_ids.tolist()],
+                },
+                'columns': {
+                    'dimension': columns,
+                    'ids': table.column_ids.tolist(),
+                    'labels': [column_labels.get(i) or "Sin asignar" for i in table.column_ids.tolist()],
+                },
+                'attempts': table.attempts.tolist(),
+                'correct': table.correct.tolist(),
+                'accuracy': table.accuracy_rows(),
+            }
+
+        cache_params = {
+            'endpoint': 'crosstab', 'rows': rows, 'columns': columns, 'subject_id': subject_id,
+            'top_rows': top_rows, 'top_columns': top_columns, 'lang': lang,
+        }
+        data, cache_state = analytics_cache.get_or_compute(cache_params, compute)
+        response = Response(data)
+        response['X-Analytics-Cache'] = cache_state.upper()
+        return response
+
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        """Aciertos, resultados caducados servidos y fallos de la caché de performance."""
+        return Response(analytics_cache.stats())
+
+    @action(detail=False, methods=['get'], url_path='deletion-jobs/(?P<job_id>[^/.]+)', url_name='deletion-job', permission_classes=[IsTeacher])
+    def deletion_job(self, request, job_id=None):
+        """Estado y filas borradas de un borrado en segundo plano (reset-analytics, grupos, preguntas o temas)."""
+        job = deletions.get_job(job_id)
+        if job is None:
+            return Response({'detail': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
+
     @action(detail=False, methods=['delete'], url_path='reset-analytics', permission_classes=[IsSuperTeacher])
     def reset_analytics(self, request):
         """
-        Permite borrar registros de QuestionEvaluationGroup.
+        Permite borrar registros de QuestionEvaluationGroup (y restarlos de los agregados).
         Query Params:
             - scope: 'global', 'subject', 'specific'
             - subject_id: ID de la asignatura (opcional para global, requerido para subject)
@@ -375,9 +662,8 @@ class AnalyticsViewSet(BaseContentViewSet):
 
         try:
             if scope == 'global':
-                # Borrar TODO
-                count, _ = queryset.delete()
-                return Response({'message': f'Se han eliminado {count} registros globales.'})
+                # Borrar TODO (contadores y agregados)
+                message = 'Se han eliminado {count} registros globales.'
 
             elif scope == 'subject':
                 # Borrar por Asignatura
@@ -386,8 +672,7 @@ class AnalyticsViewSet(BaseContentViewSet):
                 
                 # Filtramos por los grupos que pertenecen a esa asignatura
                 queryset = queryset.filter(group__subject_id=subject_id)
-                count, _ = queryset.delete()
-                return Response({'message': f'Se han eliminado {count} registros de la asignatura.'})
+                message = 'Se han eliminado {count} registros de la asignatura.'
 
             elif scope == 'specific':
                 # Borrar un item específico de la lista (un tema concreto, un grupo concreto...)
@@ -411,12 +696,20 @@ class AnalyticsViewSet(BaseContentViewSet):
                 # Si además hay subject seleccionado, respetamos ese filtro también por seguridad
                 if subject_id:
                     queryset = queryset.filter(group__subject_id=subject_id)
-
-                count, _ = queryset.delete()
-                return Response({'message': f'Se han eliminado {count} registros específicos.'})
+                message = 'Se han eliminado {count} registros específicos.'
 
             else:
                 return Response({'detail': 'Invalid scope'}, status=400)
 
+            # Por lotes restando de los agregados; si son muchos, en segundo plano (ver apps.utils.deletions)
+            job = deletions.run(
+                f'reset-analytics:{scope}',
+                lambda progress: deletions.delete_in_chunks(queryset, rollups.delete_counters, progress),
+                total=queryset.count(),
+            )
+            if job['status'] == 'running':
+                return Response({'job': job}, status=status.HTTP_202_ACCEPTED)
+            return Response({'message': message.format(count=job['deleted'])})
+
         except Exception as e:
             return Response({'detail': str(e)}, status=500)
\ No newline at end of file
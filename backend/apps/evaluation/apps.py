@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EvaluationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.evaluation'
+
+    def ready(self):
+        from apps.evaluation import signals  # noqa: F401
@@ -0,0 +1,141 @@
+"""
+Caché de resultados de /analytics/performance/.
+
+Los profesores recargan el panel una y otra vez con los mismos parámetros
+(asignatura, agrupación, límite, idioma e intervalo). Cada resultado se guarda
+en la caché de Django junto con la versión de analíticas con la que se
+calculó. La versión vive en la BD (fila única de AnalyticsVersion), no en la
+caché del proceso, para que todos los workers vean los cambios: se incrementa
+al confirmarse cualquier escritura de los agregados (una vez por volcado de los
+deltas pendientes, cambios de temas o conceptos de una pregunta; ver rollups). Los borrados,
+reset_analytics y las reconstrucciones la marcan además como reset.
+
+Las entradas se sirven con stale-while-revalidate: si la versión ha cambiado
+o han pasado ANALYTICS_CACHE_TTL segundos, se devuelve igualmente el resultado
+guardado y una sola petición del proceso (la que consigue el cerrojo) lo
+recalcula en un hilo aparte (o en la propia petición si
+ANALYTICS_CACHE_BACKGROUND_REFRESH es False). Se espera a la consulta cuando
+no hay nada guardado o cuando lo guardado es anterior al último reset: tras
+un borrado nunca se sirven los números de antes. Cada lectura cuesta la
+consulta de la versión. Los aciertos, resultados caducados y fallos se
+cuentan en la caché de cada proceso.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import F
+
+from apps.evaluation.api.models import AnalyticsVersion
+
+logger = logging.getLogger(__name__)
+
+STATES = ('hit', 'stale', 'miss')
+
+
+def _entry_key(params: dict) -> str:
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f'analytics:performance:{digest}'
+
+
+def _count(state: str) -> None:
+    key = f'analytics:stats:{state}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # La clave ha caducado o se ha desalojado entre add e incr
+            cache.set(key, 1, None)
+
+
+def _versions() -> tuple[int, int]:
+    """(versión actual, versión del último reset), en una consulta."""
+    versions = AnalyticsVersion.objects.filter(pk=1).values_list('version', 'reset_version').first()
+    if versions is None:
+        row, _ = AnalyticsVersion.objects.get_or_create(pk=1)
+        versions = (row.version, row.reset_version)
+    return versions
+
+
+def get_version() -> int:
+    return _versions()[0]
+
+
+def bump_version(reset: bool = False) -> None:
+    """
+    Marca como caducados todos los resultados guardados. Con `reset` (borrados
+    y reconstrucciones) dejan de poder servirse mientras se recalculan.
+    """
+    # Las dos columnas se calculan con el valor anterior de version
+    changes = {'version': F('version') + 1}
+    if reset:
+        changes['reset_version'] = F('version') + 1
+    if not AnalyticsVersion.objects.filter(pk=1).update(**changes):
+        AnalyticsVersion.objects.get_or_create(pk=1)
+        AnalyticsVersion.objects.filter(pk=1).update(**changes)
+
+
+def stats() -> dict:
+    counts = cache.get_many([f'analytics:stats:{state}' for state in STATES])
+    result = {state: counts.get(f'analytics:stats:{state}', 0) for state in STATES}
+    total = sum(result.values())
+    result['hit_ratio'] = round((result['hit'] + result['stale']) / total, 4) if total else None
+    result['version'] = get_version()
+    return result
+
+
+def _store(key: str, version: int, data) -> None:
+    ttl = getattr(settings, 'ANALYTICS_CACHE_TTL', 60)
+    stale_ttl = getattr(settings, 'ANALYTICS_CACHE_STALE_TTL', 24 * 3600)
+    cache.set(key, {'version': version, 'data': data, 'expires_at': time.time() + ttl}, ttl + stale_ttl)
+
+
+def _revalidate(key: str, version: int, compute: Callable):
+    try:
+        data = compute()
+        _store(key, version, data)
+        return data
+    finally:
+        cache.delete(f'{key}:lock')
+
+
+def _revalidate_in_background(key: str, version: int, compute: Callable) -> None:
+    def run():
+        close_old_connections()
+        try:
+            _revalidate(key, version, compute)
+        except Exception:
+            logger.exception('No se pudo recalcular el resultado de analíticas')
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=run, name='analytics-revalidate', daemon=True).start()
+
+
+def get_or_compute(params: dict, compute: Callable) -> tuple[object, str]:
+    """Resultado de `compute()` para `params` y su estado en la caché ('hit', 'stale' o 'miss')."""
+    key = _entry_key(params)
+    version, reset_version = _versions()
+    entry = cache.get(key)
+    if entry is None or entry['version'] < reset_version:
+        data = compute()
+        _store(key, version, data)
+        state = 'miss'
+    elif entry['version'] == version and entry['expires_at'] > time.time():
+        data, state = entry['data'], 'hit'
+    else:
+        data, state = entry['data'], 'stale'
+        # Solo una petición recalcula; el resto sigue sirviendo el resultado guardado
+        if cache.add(f'{key}:lock', True, 60):
+            if getattr(settings, 'ANALYTICS_CACHE_BACKGROUND_REFRESH', True):
+                _revalidate_in_background(key, version, compute)
+            else:
+                data = _revalidate(key, version, compute)
+    _count(state)
+    return data, state
@@ -0,0 +1,130 @@
+"""
+Almacén compacto de exámenes corregidos (ExamAttempt).
+
+QuestionEvaluationGroup solo guarda contadores agregados; para las
+distribuciones de notas y las correlaciones ítem-total hace falta saber qué
+acertó cada examen. Cada corrección guarda una fila con:
+
+  - question_ids: ids ordenados codificados como diferencias con el anterior,
+    en uint16 (o uint32 si alguna diferencia no cabe). El ancho se deduce de
+    la longitud y de n_questions.
+  - correct: el acierto de cada pregunta, en el mismo orden, con np.packbits.
+
+Unos 2 bytes y 1 bit por pregunta respondida más la cabecera de la fila. Las
+filas se escriben junto con los contadores (en el mismo lote si el buffer de
+escritura diferida está activo) y se leen desempaquetando todas a la vez.
+"""
+from typing import Iterable
+
+import numpy as np
+
+from apps.evaluation.api.models import ExamAttempt
+
+# (group_id, [(question_id, is_correct), ...]) de un examen corregido
+Attempt = tuple[int, list[tuple[int, bool]]]
+
+
+def encode(graded: list[tuple[int, bool]]) -> tuple[bytes, bytes]:
+    """Codifica [(question_id, is_correct), ...] como (diferencias de ids, aciertos empaquetados)."""
+    graded = sorted(graded)
+    question_ids = np.fromiter((question_id for question_id, _ in graded), dtype=np.int64, count=len(graded))
+    correct = np.fromiter((is_correct for _, is_correct in graded), dtype=bool, count=len(graded))
+    deltas = np.diff(question_ids, prepend=0)
+    dtype = '<u2' if not len(deltas) or deltas.max() <= np.iinfo(np.uint16).max else '<u4'
+    return deltas.astype(dtype).tobytes(), np.packbits(correct).tobytes()
+
+
+def build(attempts: Iterable[Attempt]) -> list[ExamAttempt]:
+    rows = []
+    for group_id, graded in attempts:
+        if not graded:
+            continue
+        question_ids, correct = encode(graded)
+        rows.append(ExamAttempt(
+            group_id=group_id,
+            n_questions=len(graded),
+            mark=sum(1 for _, is_correct in graded if is_correct),
+            question_ids=question_ids,
+            correct=correct,
+        ))
+    return rows
+
+
+def save(attempts: Iterable[Attempt]) -> None:
+    """Escribe los exámenes corregidos en un solo INSERT."""
+    rows = build(attempts)
+    if rows:
+        ExamAttempt.objects.bulk_create(rows, batch_size=500)
+
+
+class AttemptMatrix:
+    """
+    Exámenes desempaquetados en formato largo: una posición por pregunta
+    respondida, con el examen (`attempt`), la pregunta y si se acertó.
+    """
+
+    def __init__(self, group_ids: np.ndarray, lengths: np.ndarray, attempt: np.ndarray, question_ids: np.ndarray, correct: np.ndarray):
+        self.group_ids = group_ids
+        self.lengths = lengths
+        self.attempt = attempt
+        self.question_ids = question_ids
+        self.correct = correct
+
+    @property
+    def size(self) -> int:
+        return len(self.lengths)
+
+    @classmethod
+    def from_rows(cls, rows: list[tuple[int, int, bytes, bytes]]) -> 'AttemptMatrix':
+        """`rows` son (group_id, n_questions, question_ids, correct) tal como vienen de la BD."""
+        rows = [row for row in rows if row[1]]
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(empty, empty, empty, empty, np.zeros(0, dtype=bool))
+        group_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        lengths = np.array([row[1] for row in rows], dtype=np.int64)
+        total = int(lengths.sum())
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        attempt = np.repeat(np.arange(len(rows)), lengths)
+        # Posición de cada pregunta dentro de su examen
+        offsets = np.arange(total) - np.repeat(starts, lengths)
+
+        # Aciertos: cada examen ocupa ceil(n / 8) bytes
+        packed = np.frombuffer(b''.join(bytes(row[3]) for row in rows), dtype=np.uint8)
+        byte_starts = np.concatenate([[0], np.cumsum((lengths + 7) // 8)[:-1]]).astype(np.int64)
+        correct = np.unpackbits(packed)[np.repeat(byte_starts * 8, lengths) + offsets].astype(bool)
+
+        # Ids: se separan por ancho (2 o 4 bytes) y se deshacen las diferencias dentro de cada examen
+        deltas = np.empty(total, dtype=np.int64)
+        wide = np.array([len(row[2]) == 4 * row[1] for row in rows], dtype=bool)
+        for is_wide, dtype in ((False, '<u2'), (True, '<u4')):
+            selected = np.flatnonzero(wide == is_wide)
+            if not len(selected):
+                continue
+            values = np.frombuffer(b''.join(bytes(rows[i][2]) for i in selected), dtype=dtype)
+            deltas[np.repeat(wide == is_wide, lengths)] = values
+        cumulative = np.cumsum(deltas)
+        question_ids = cumulative - np.repeat(cumulative[starts] - deltas[starts], lengths)
+        return cls(group_ids, lengths, attempt, question_ids, correct)
+
+    def restrict(self, question_ids) -> 'AttemptMatrix':
+        """Solo las respuestas a `question_ids` (p. ej. las de un tema); los exámenes sin ninguna se quitan."""
+        keep = np.isin(self.question_ids, np.asarray(list(question_ids), dtype=np.int64))
+        attempt = self.attempt[keep]
+        present, attempt = np.unique(attempt, return_inverse=True)
+        lengths = np.bincount(attempt, minlength=len(present))
+        return AttemptMatrix(self.group_ids[present], lengths, attempt, self.question_ids[keep], self.correct[keep])
+
+    def marks(self) -> np.ndarray:
+        return np.bincount(self.attempt, weights=self.correct, minlength=self.size)
+
+
+def load(group_ids: list[int] = None, since=None) -> AttemptMatrix:
+    """Lee y desempaqueta los exámenes (de unos grupos y desde una fecha, si se indican)."""
+    queryset = ExamAttempt.objects.all()
+    if group_ids is not None:
+        queryset = queryset.filter(group_id__in=group_ids)
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    rows = list(queryset.order_by('id').values_list('group_id', 'n_questions', 'question_ids', 'correct').iterator(chunk_size=2000))
+    return AttemptMatrix.from_rows(rows)
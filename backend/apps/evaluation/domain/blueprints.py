@@ -0,0 +1,236 @@
+"""
+Exámenes a partir de un "blueprint" de restricciones.
+
+Un blueprint pide, por ejemplo, 12 preguntas con al menos 2 por tema, un 30 %
+de verdadero/falso, que salgan ciertos conceptos y una dificultad objetivo.
+Cada restricción es una fila de una matriz de incidencia (restricción ×
+pregunta candidata) con un mínimo y un máximo:
+
+  - tema: preguntas del tema, mínimo `min` y máximo `max` opcional.
+  - tipo: preguntas de ese Question.type, exactamente la proporción pedida.
+  - concepto: preguntas relacionadas con el concepto, al menos una.
+
+Las matrices se montan con NumPy desde el almacén en memoria (exam_store) y el
+índice de conceptos (recommendations), sin filtrar con el ORM. La selección es
+voraz: en cada paso se elige la pregunta que más restricciones pendientes
+cubre, pesando más las escasas (déficit / candidatas que quedan) y, a igualdad,
+la más cercana a la dificultad objetivo. Si una pasada no cumple todo, se sube
+el multiplicador (lagrangiano) de las filas incumplidas y se repite. Si no hay
+solución exacta se devuelve la mejor encontrada y qué restricciones se han relajado.
+"""
+import random
+import threading
+
+import numpy as np
+from django.core.exceptions import ValidationError
+
+from apps.evaluation.domain import difficulty, exam_store, recommendations
+
+# Pasadas voraces como máximo (cada una duplica el peso de lo incumplido)
+MAX_PASSES = 4
+# Peso de la distancia a la dificultad objetivo: siempre menor que cubrir una restricción
+DIFFICULTY_WEIGHT = 0.3
+# Diferencia tolerada entre la probabilidad media de acierto del examen y la pedida
+DIFFICULTY_TOLERANCE = 0.1
+# Probabilidad de acierto objetivo de los modos de dificultad
+MODE_TARGETS = {'easy': 0.8, 'mixed': 0.55, 'hard': 0.3}
+
+_lock = threading.Lock()
+_types_cache = None
+
+
+class Blueprint:
+    """
+    Restricciones ya resueltas a ids. `topics` son (topic_id, etiqueta, mínimo,
+    máximo o None), `types` {type: número de preguntas}, `concepts`
+    (concept_id, etiqueta) y `difficulty` el (modo, p) de difficulty.parse_mode.
+    """
+
+    def __init__(self, num_questions: int, topics=(), types=None, concepts=(), difficulty_mode=None):
+        self.num_questions = num_questions
+        self.topics = list(topics)
+        self.types = dict(types or {})
+        self.concepts = list(concepts)
+        self.difficulty_mode = difficulty_mode
+
+    @property
+    def target(self) -> float | None:
+        if self.difficulty_mode is None:
+            return None
+        mode, target = self.difficulty_mode
+        return target if mode == 'target' else MODE_TARGETS[mode]
+
+
+def type_counts(num_questions: int, mix: dict) -> dict[str, int]:
+    """Convierte {type: proporción (0-1) o número} en número de preguntas por tipo."""
+    counts = {}
+    for question_type, value in mix.items():
+        value = float(value)
+        if value < 0:
+            raise ValidationError(f"Proporción no válida para el tipo {question_type}.")
+        counts[question_type] = int(round(value * num_questions)) if value < 1 else int(value)
+    if sum(counts.values()) > num_questions:
+        raise ValidationError("La mezcla de tipos pide más preguntas que el examen.")
+    return counts
+
+
+def _question_types() -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """(ids ordenados, código de tipo de cada uno, nombres de los tipos) de las preguntas elegibles."""
+    global _types_cache
+    if not exam_store._enabled():
+        rows = sorted(exam_store.eligible_questions().values_list('id', 'type'))
+        return _encode_types(rows)
+    store = exam_store.get_store()
+    with _lock:
+        cached = _types_cache
+    if cached is not None and cached[0] is store and cached[1] == store.version:
+        return cached[2]
+    result = _encode_types(sorted((question_id, record.type) for question_id, record in store.records.items()))
+    with _lock:
+        _types_cache = (store, store.version, result)
+    return result
+
+
+def _encode_types(rows) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    names = sorted({question_type or '' for _, question_type in rows})
+    codes = {name: code for code, name in enumerate(names)}
+    question_ids = np.fromiter((question_id for question_id, _ in rows), dtype=np.int64, count=len(rows))
+    types = np.fromiter((codes[question_type or ''] for _, question_type in rows), dtype=np.int64, count=len(rows))
+    return question_ids, types, names
+
+
+def _members(candidates: np.ndarray, ids) -> np.ndarray:
+    """Fila de incidencia: qué candidatas (ids ordenados) están en `ids`."""
+    row = np.zeros(len(candidates), dtype=bool)
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(ids) or not len(candidates):
+        return row
+    positions = np.searchsorted(candidates, ids)
+    inside = positions < len(candidates)
+    positions, ids = positions[inside], ids[inside]
+    row[positions[candidates[positions] == ids]] = True
+    return row
+
+
+def _concept_question_ids(concept_id: int) -> np.ndarray:
+    index = recommendations.get_index()
+    position = np.searchsorted(index.concept_ids, concept_id)
+    if position == len(index.concept_ids) or index.concept_ids[position] != concept_id:
+        return np.zeros(0, dtype=np.int64)
+    owners = np.repeat(index.question_ids, np.diff(index.question_indptr))
+    return owners[index.question_concepts == position]
+
+
+def build_constraints(blueprint: Blueprint):
+    """
+    Candidatas (ids ordenados), matriz de incidencia (filas × candidatas),
+    mínimos, máximos y descripción de cada fila.
+    """
+    question_ids, types, type_names = _question_types()
+    if blueprint.topics:
+        topic_ids = [exam_store.get_topic_ids(topic_id) for topic_id, *_ in blueprint.topics]
+        universe = np.unique(np.concatenate([np.frombuffer(ids, dtype=np.int64) for ids in topic_ids]))
+        keep = _members(question_ids, universe)
+        candidates, types = question_ids[keep], types[keep]
+    else:
+        topic_ids = []
+        candidates = question_ids
+
+    rows, lower, upper, labels = [], [], [], []
+    for (topic_id, label, minimum, maximum), ids in zip(blueprint.topics, topic_ids):
+        rows.append(_members(candidates, np.frombuffer(ids, dtype=np.int64)))
+        lower.append(minimum or 0)
+        upper.append(maximum if maximum is not None else np.inf)
+        labels.append({'constraint': 'topic', 'id': topic_id, 'label': label})
+    for question_type, count in blueprint.types.items():
+        code = type_names.index(question_type) if question_type in type_names else -1
+        rows.append(types == code)
+        lower.append(count)
+        upper.append(count)
+        labels.append({'constraint': 'type', 'label': question_type})
+    for concept_id, label in blueprint.concepts:
+        rows.append(_members(candidates, _concept_question_ids(concept_id)))
+        lower.append(1)
+        upper.append(np.inf)
+        labels.append({'constraint': 'concept', 'id': concept_id, 'label': label})
+
+    matrix = np.array(rows, dtype=np.float32).reshape(len(rows), len(candidates))
+    return candidates, matrix, np.array(lower, dtype=float), np.array(upper, dtype=float), labels
+
+
+def _greedy(matrix, lower, upper, num_questions, weights, base) -> list[int]:
+    """Una pasada voraz. `base` es la puntuación de cada candidata sin restricciones (dificultad y desempate)."""
+    available = np.ones(matrix.shape[1], dtype=np.float32)
+    counts = np.zeros(len(lower))
+    chosen = []
+    for step in range(num_questions):
+        # No se puede elegir nada que pase el máximo de una fila ya llena
+        allowed = available > 0
+        full = counts >= upper
+        if full.any():
+            allowed &= full.astype(np.float32) @ matrix == 0
+        if not allowed.any():
+            break
+
+        deficit = np.maximum(lower - counts, 0)
+        score = np.zeros(matrix.shape[1], dtype=np.float32)
+        if deficit.any():
+            # Productos con todas las filas (peso 0 en las cumplidas): evita copiar la matriz en cada paso
+            supply = matrix @ allowed.astype(np.float32)
+            row_weights = np.where(deficit > 0, weights * (1 + deficit / np.maximum(supply, 1)), 0)
+            score = row_weights.astype(np.float32) @ matrix
+            # Si los huecos que quedan no sobran, solo valen preguntas que cubran algo pendiente
+            if deficit.sum() >= num_questions - step and (allowed & (score > 0)).any():
+                allowed &= score > 0
+        score = score + base
+        score[~allowed] = -np.inf
+        position = int(np.argmax(score))
+        chosen.append(position)
+        available[position] = 0
+        counts += matrix[:, position]
+    return chosen
+
+
+def solve(blueprint: Blueprint, rng: random.Random = None) -> tuple[list[int], list[dict]]:
+    """
+    Elige las preguntas del blueprint. Devuelve (question_ids, relajadas), con
+    una entrada en `relajadas` por cada restricción que no se ha podido cumplir.
+    """
+    rng = rng or random.Random()
+    candidates, matrix, lower, upper, labels = build_constraints(blueprint)
+    target = blueprint.target
+    noise = np.random.default_rng(rng.getrandbits(64)).random(len(candidates)) * 1e-3
+    probabilities = None
+    closeness = np.zeros(len(candidates))
+    if target is not None and len(candidates):
+        probabilities = difficulty.get_index().probabilities(candidates)
+        closeness = -DIFFICULTY_WEIGHT * np.abs(probabilities - target)
+
+    weights = np.ones(len(lower))
+    best = None
+    for _ in range(MAX_PASSES):
+        chosen = _greedy(matrix, lower, upper, blueprint.num_questions, weights, closeness + noise)
+        counts = matrix[:, chosen].sum(axis=1) if len(lower) else np.zeros(0)
+        shortfall = np.maximum(lower - counts, 0) + np.maximum(counts - upper, 0)
+        key = (shortfall.sum() + blueprint.num_questions - len(chosen), -closeness[chosen].sum() if chosen else 0)
+        if best is None or key < best[0]:
+            best = (key, chosen, counts)
+        if not shortfall.any():
+            break
+        weights = np.where(shortfall > 0, weights * 2, weights)
+
+    _, chosen, counts = best
+    relaxed = []
+    for label, required, maximum, achieved in zip(labels, lower, upper, counts):
+        if achieved < required or achieved > maximum:
+            relaxed.append({**label, 'required': int(required), 'achieved': int(achieved)})
+    if len(chosen) < blueprint.num_questions:
+        relaxed.append({'constraint': 'num_questions', 'required': blueprint.num_questions, 'achieved': len(chosen)})
+    if probabilities is not None and chosen:
+        mean = float(probabilities[chosen].mean())
+        if abs(mean - target) > DIFFICULTY_TOLERANCE:
+            relaxed.append({'constraint': 'difficulty', 'required': target, 'achieved': round(mean, 3)})
+
+    question_ids = candidates[chosen].tolist()
+    rng.shuffle(question_ids)
+    return question_ids, relaxed
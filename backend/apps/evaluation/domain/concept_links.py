@@ -0,0 +1,148 @@
+"""
+Sugerencias de relaciones entre conceptos (ConceptLinkSuggestion).
+
+ConceptIsRelatedToConcept se mantiene a mano. Aquí se buscan pares de
+conceptos que los grupos dominan o fallan a la vez:
+
+  1. Una consulta agrupada sobre QuestionEvaluationGroup (a través de
+     QuestionRelatedToConcept) da las evaluaciones y aciertos de cada par
+     (grupo, concepto), que se pivotan en matrices densas grupos × conceptos.
+     Solo cuentan las celdas con CONCEPT_LINKS_MIN_ATTEMPTS evaluaciones.
+  2. Para cada par de conceptos, sobre los grupos que tienen datos de ambos:
+       - correlación de Pearson de las tasas de acierto;
+       - co-fallo: similitud coseno de las tasas de fallo (1 si fallan en los
+         mismos grupos y en la misma proporción).
+     Todas las sumas por pares son productos de matrices (máscara × valores),
+     calculados por bloques de BLOCK_SIZE conceptos para acotar la memoria.
+  3. score = media de la correlación (negativa cuenta como 0) y el co-fallo.
+     Se guardan los CONCEPT_LINKS_TOP_K mejores de cada concepto con al menos
+     CONCEPT_LINKS_MIN_GROUPS grupos en común, sin los pares ya relacionados.
+
+refresh() sustituye la tabla entera; lo lanza el comando compute_concept_links.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from apps.content.api.models import ConceptIsRelatedToConcept
+from apps.evaluation.api.models import ConceptLinkSuggestion, QuestionEvaluationGroup
+
+# Conceptos por bloque al calcular los pares (memoria ~ BLOCK_SIZE × conceptos × 8 bytes por matriz)
+BLOCK_SIZE = 256
+
+
+def load_matrix() -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(group_ids, concept_ids, evaluaciones, aciertos) con las matrices grupos × conceptos."""
+    cells = np.array(
+        list(
+            QuestionEvaluationGroup.objects
+            .filter(question__concepts__concept__old=False)
+            .values('group_id', concept_id=F('question__concepts__concept_id'))
+            .annotate(ev_count=Sum('ev_count'), correct_count=Sum('correct_count'))
+            .values_list('group_id', 'concept_id', 'ev_count', 'correct_count')
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    group_ids, group_index = np.unique(cells[:, 0], return_inverse=True)
+    concept_ids, concept_index = np.unique(cells[:, 1], return_inverse=True)
+    attempts = np.zeros((len(group_ids), len(concept_ids)))
+    correct = np.zeros_like(attempts)
+    attempts[group_index, concept_index] = cells[:, 2]
+    correct[group_index, concept_index] = cells[:, 3]
+    return group_ids, concept_ids, attempts, correct
+
+
+def _existing_pairs(concept_ids: np.ndarray) -> np.ndarray:
+    """Matriz booleana conceptos × conceptos con las relaciones que ya existen (en cualquier sentido)."""
+    existing = np.zeros((len(concept_ids), len(concept_ids)), dtype=bool)
+    links = np.array(list(ConceptIsRelatedToConcept.objects.values_list('concept_from_id', 'concept_to_id')), dtype=np.int64).reshape(-1, 2)
+    if len(links) and len(concept_ids):
+        positions = np.minimum(np.searchsorted(concept_ids, links), len(concept_ids) - 1)
+        known = (concept_ids[positions] == links).all(axis=1)
+        rows, columns = positions[known, 0], positions[known, 1]
+        existing[rows, columns] = existing[columns, rows] = True
+    return existing
+
+
+def compute(attempts: np.ndarray, correct: np.ndarray, existing: np.ndarray = None) -> list[tuple[int, int, float, float, float, int]]:
+    """
+    Mejores pares por concepto como (posición origen, posición destino, score,
+    correlación, co-fallo, grupos en común), a partir de las matrices grupos × conceptos.
+    """
+    min_attempts = getattr(settings, 'CONCEPT_LINKS_MIN_ATTEMPTS', 3)
+    min_groups = getattr(settings, 'CONCEPT_LINKS_MIN_GROUPS', 3)
+    top_k = getattr(settings, 'CONCEPT_LINKS_TOP_K', 5)
+
+    mask = (attempts >= min_attempts).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        accuracy = np.where(mask > 0, correct / attempts, 0.0)
+    failure = (1 - accuracy) * mask
+    x, xx, f, ff = accuracy * mask, accuracy ** 2 * mask, failure, failure ** 2
+
+    size = attempts.shape[1]
+    results = []
+    for start in range(0, size, BLOCK_SIZE):
+        block = slice(start, min(start + BLOCK_SIZE, size))
+        # Sumas sobre los grupos con datos de los dos conceptos: filas del bloque × todas las columnas
+        n = mask[:, block].T @ mask
+        sx, sy = x[:, block].T @ mask, mask[:, block].T @ x
+        sxx, syy = xx[:, block].T @ mask, mask[:, block].T @ xx
+        sxy = x[:, block].T @ x
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = (n * sxx - sx ** 2) * (n * syy - sy ** 2)
+            correlation = np.where(variance > 1e-12, (n * sxy - sx * sy) / np.sqrt(np.maximum(variance, 1e-12)), 0.0)
+            joint_failure = (ff[:, block].T @ mask) * (mask[:, block].T @ ff)
+            co_failure = np.where(joint_failure > 0, (f[:, block].T @ f) / np.sqrt(np.maximum(joint_failure, 1e-12)), 0.0)
+        correlation = np.clip(correlation, -1, 1)
+        score = (np.clip(correlation, 0, 1) + co_failure) / 2
+
+        rows = np.arange(block.start, block.stop)
+        invalid = n < min_groups
+        invalid[rows - start, rows] = True
+        if existing is not None:
+            invalid |= existing[block]
+        score[invalid] = -np.inf
+
+        k = min(top_k, size)
+        best = np.argpartition(-score, k - 1, axis=1)[:, :k]
+        for offset, columns in enumerate(best):
+            for column in columns[np.argsort(-score[offset, columns], kind='stable')]:
+                if score[offset, column] > 0:
+                    results.append((
+                        int(rows[offset]), int(column), float(score[offset, column]),
+                        float(correlation[offset, column]), float(co_failure[offset, column]), int(n[offset, column]),
+                    ))
+    return results
+
+
+def refresh() -> int:
+    """Recalcula y sustituye las sugerencias. Devuelve cuántas se guardan."""
+    group_ids, concept_ids, attempts, correct = load_matrix()
+    pairs = compute(attempts, correct, _existing_pairs(concept_ids))
+    now = timezone.now()
+    objects = [
+        ConceptLinkSuggestion(
+            concept_from_id=int(concept_ids[source]), concept_to_id=int(concept_ids[target]),
+            score=round(score, 4), correlation=round(correlation, 4), co_failure=round(co_failure, 4),
+            groups=groups, computed_at=now,
+        )
+        for source, target, score, correlation, co_failure, groups in pairs
+    ]
+    with transaction.atomic():
+        ConceptLinkSuggestion.objects.all().delete()
+        ConceptLinkSuggestion.objects.bulk_create(objects, batch_size=1000)
+    return len(objects)
+
+
+def suggestions(concept_id: int):
+    """Sugerencias de un concepto, de mejor a peor, sin las relaciones creadas después del cálculo."""
+    return (
+        ConceptLinkSuggestion.objects
+        .filter(concept_from_id=concept_id, concept_to__old=False)
+        .exclude(concept_to_id__in=ConceptIsRelatedToConcept.objects.filter(concept_from_id=concept_id).values('concept_to_id'))
+        .exclude(concept_to_id__in=ConceptIsRelatedToConcept.objects.filter(concept_to_id=concept_id).values('concept_from_id'))
+        .select_related('concept_to')
+        .order_by('-score')
+    )
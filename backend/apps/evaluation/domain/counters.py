@@ -0,0 +1,140 @@
+"""
+Escritura de los contadores ev_count/correct_count de QuestionEvaluationGroup.
+
+Todas las correcciones acumulan sus incrementos en memoria y los aplican en
+una única sentencia, en vez de un get_or_create + save() por pregunta.
+"""
+import uuid
+import zlib
+from collections import defaultdict
+from typing import Iterable
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from apps.evaluation.api.models import QuestionEvaluationGroup
+from apps.evaluation.domain import attempts, difficulty, events, rollups
+
+# (group_id, question_id, shard) -> [ev_count, correct_count]
+Increments = dict[tuple[int, int, int], list[int]]
+
+
+def pick_shard(key: str = None) -> int:
+    """
+    Elige la sub-fila del contador a partir de un hash de la petición. Con
+    EVALUATION_COUNTER_SHARDS > 1 las correcciones simultáneas de un mismo grupo
+    se reparten entre varias filas en lugar de bloquear todas la misma.
+    """
+    shards = getattr(settings, 'EVALUATION_COUNTER_SHARDS', 1)
+    if shards <= 1:
+        return 0
+    key = key or uuid.uuid4().hex
+    return zlib.crc32(key.encode()) % shards
+
+
+def merge_increments(group_id: int, results: Iterable[tuple[int, bool]], into: Increments = None, shard: int = 0) -> Increments:
+    """Acumula los resultados (question_id, is_correct) de un grupo en un diccionario de incrementos."""
+    increments = into if into is not None else defaultdict(lambda: [0, 0])
+    for question_id, is_correct in results:
+        counters = increments[(group_id, question_id, shard)]
+        counters[0] += 1
+        if is_correct:
+            counters[1] += 1
+    return increments
+
+
+def record_increments(increments: Increments, exam_attempts: list = ()) -> None:
+    """
+    Punto de entrada de las correcciones: escribe ya los incrementos (y los
+    exámenes corregidos, ver attempts) o, con EVALUATION_WRITE_BEHIND activo,
+    los deja en el buffer de escritura diferida.
+    """
+    if not increments and not exam_attempts:
+        return
+    if getattr(settings, 'EVALUATION_WRITE_BEHIND', False):
+        from apps.evaluation.domain import write_behind
+        # Solo se encola si la transacción de la corrección llega a confirmarse
+        buffer = write_behind.get_buffer()
+        transaction.on_commit(lambda: buffer.add(increments or {}, exam_attempts))
+    else:
+        apply_increments(increments or {})
+        attempts.save(exam_attempts)
+
+
+def apply_increments(increments: Increments) -> None:
+    """
+    Suma los incrementos a QuestionEvaluationGroup, creando las filas que falten,
+    junto con las franjas (events) que se derivan de ellos. Los agregados
+    (rollups, y con ellos los de mastery) se reparten aquí pero se escriben
+    después de confirmarse, en el volcado de rollups.
+
+    El número de consultas no depende de cuántas preguntas traiga el lote: en
+    PostgreSQL son el upsert de contadores, la lectura de temas, conceptos y
+    asignatura de las preguntas y el upsert de franjas (en SQLite cada upsert
+    es una lectura con bloqueo más un bulk_create). Sin write-behind se paga en
+    cada corrección; con EVALUATION_WRITE_BEHIND, una vez por volcado del
+    buffer.
+    """
+    if not increments:
+        return
+    # Orden estable de claves: evita interbloqueos entre correcciones concurrentes
+    rows = sorted((key, counts) for key, counts in increments.items() if counts[0] or counts[1])
+    if not rows:
+        return
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            _upsert_postgresql(rows)
+        else:
+            _upsert_bulk_create(rows)
+        rollups.record(increments)
+        events.record(increments)
+    difficulty.record(increments)
+
+
+def _upsert_postgresql(rows) -> None:
+    table = QuestionEvaluationGroup._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+    params = []
+    for (group_id, question_id, shard), (ev_count, correct_count) in rows:
+        params.extend([group_id, question_id, shard, ev_count, correct_count])
+    sql = f"""
+        INSERT INTO {table} AS t (group_id, question_id, shard, ev_count, correct_count)
+        VALUES {values}
+        ON CONFLICT (group_id, question_id, shard) DO UPDATE SET
+            ev_count = t.ev_count + EXCLUDED.ev_count,
+            correct_count = t.correct_count + EXCLUDED.correct_count
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _upsert_bulk_create(rows) -> None:
+    # bulk_create(update_conflicts=...) sobrescribe en lugar de sumar, así que
+    # leemos antes los valores actuales (una consulta) dentro de la misma transacción.
+    group_ids = {key[0] for key, _ in rows}
+    question_ids = {key[1] for key, _ in rows}
+    current = {
+        (group_id, question_id, shard): (ev_count, correct_count)
+        for group_id, question_id, shard, ev_count, correct_count in (
+            QuestionEvaluationGroup.objects
+            .select_for_update()
+            .filter(group_id__in=group_ids, question_id__in=question_ids)
+            .values_list('group_id', 'question_id', 'shard', 'ev_count', 'correct_count')
+        )
+    }
+    objs = []
+    for key, (ev_count, correct_count) in rows:
+        old_ev, old_correct = current.get(key, (0, 0))
+        objs.append(QuestionEvaluationGroup(
+            group_id=key[0],
+            question_id=key[1],
+            shard=key[2],
+            ev_count=old_ev + ev_count,
+            correct_count=old_correct + correct_count,
+        ))
+    QuestionEvaluationGroup.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=['group', 'question', 'shard'],
+        update_fields=['ev_count', 'correct_count'],
+    )
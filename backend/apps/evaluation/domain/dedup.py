@@ -0,0 +1,179 @@
+"""
+Correcciones idempotentes con `submission_id`.
+
+Los clientes móviles reintentan `evaluate-exam` cuando se les agota el tiempo
+y cada reintento volvía a sumar en QuestionEvaluationGroup. Si la corrección
+trae `submission_id`, su resultado se guarda en ExamSubmission (único por
+submission_id) en la misma transacción que los contadores, y un reintento
+devuelve ese resultado sin volver a corregir.
+
+Para no consultar la tabla en cada corrección, cada proceso lleva un filtro de
+Bloom rotativo con los submission_id que ha visto: dos generaciones que se
+rotan cada EVALUATION_DEDUP_WINDOW segundos. Solo se consulta la tabla si el
+filtro dice "quizá". Un reintento que llega a otro proceso no está en su
+filtro, pero el índice único de la tabla lo detecta al guardar: se deshace esa
+corrección y se devuelve la guardada. En cada rotación se borran de la tabla
+las filas más antiguas que la ventana, al confirmarse la transacción de la
+corrección que la provoca y no dentro de ella.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.evaluation.api.models import ExamSubmission
+
+logger = logging.getLogger(__name__)
+
+# Tasa de falsos positivos del filtro con EVALUATION_DEDUP_CAPACITY envíos por ventana
+FALSE_POSITIVE_RATE = 0.01
+
+_lock = threading.Lock()
+_filter = None
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = FALSE_POSITIVE_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Doble hashing (Kirsch-Mitzenmacher): k posiciones a partir de un único digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RotatingBloomFilter:
+    """Dos generaciones de filtros: un id añadido se recuerda entre una y dos ventanas."""
+
+    def __init__(self, capacity: int, window: float):
+        self.capacity = capacity
+        self.window = window
+        self.current = BloomFilter(capacity)
+        self.previous = BloomFilter(capacity)
+        self.rotated_at = time.monotonic()
+
+    def rotate_if_needed(self) -> bool:
+        if time.monotonic() - self.rotated_at < self.window:
+            return False
+        self.previous, self.current = self.current, BloomFilter(self.capacity)
+        self.rotated_at = time.monotonic()
+        return True
+
+    def add(self, key: str) -> None:
+        self.current.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.current or key in self.previous
+
+
+def _window() -> int:
+    return getattr(settings, 'EVALUATION_DEDUP_WINDOW', 24 * 3600)
+
+
+def get_filter() -> RotatingBloomFilter:
+    """Filtro del proceso; al crearlo y en cada rotación se purga la tabla."""
+    global _filter
+    with _lock:
+        created = _filter is None
+        if created:
+            _filter = RotatingBloomFilter(getattr(settings, 'EVALUATION_DEDUP_CAPACITY', 100000), _window())
+        purge = created or _filter.rotate_if_needed()
+        bloom = _filter
+    if purge:
+        # Fuera de la transacción de la corrección (se ejecuta ya si no hay ninguna)
+        transaction.on_commit(collect_garbage)
+    return bloom
+
+
+def collect_garbage() -> int:
+    """Borra los envíos más antiguos que la ventana de deduplicación."""
+    try:
+        # Punto de guardado propio: si el DELETE falla no deja abortada la transacción que lo rodea
+        with transaction.atomic():
+            count, _ = ExamSubmission.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=_window())).delete()
+    except Exception:
+        logger.exception('No se pudieron purgar los envíos de exámenes antiguos')
+        return 0
+    return count
+
+
+def lookup(submission_ids: list[str], check_all: bool = False) -> dict[str, dict]:
+    """Resultados guardados. Sin `check_all` solo se consulta la tabla por los ids que el filtro dice haber visto."""
+    bloom = get_filter()
+    candidates = {submission_id for submission_id in submission_ids if submission_id and (check_all or submission_id in bloom)}
+    if not candidates:
+        return {}
+    return dict(ExamSubmission.objects.filter(submission_id__in=candidates).values_list('submission_id', 'result'))
+
+
+def store(results: dict[str, dict]) -> None:
+    """Guarda los resultados nuevos; lanza IntegrityError si otro proceso ya guardó alguno."""
+    if not results:
+        return
+    ExamSubmission.objects.bulk_create(
+        [ExamSubmission(submission_id=submission_id, result=result) for submission_id, result in results.items()]
+    )
+    bloom = get_filter()
+    with _lock:
+        for submission_id in results:
+            bloom.add(submission_id)
+
+
+def run_once(submission_ids: list[str], evaluate: Callable[[list[int]], dict[int, dict]]) -> list[dict]:
+    """
+    Corrige solo los envíos que no se han corregido ya. `submission_ids` tiene
+    un id (o None) por envío y `evaluate(posiciones)` corrige los envíos de esas
+    posiciones y devuelve {posición: resultado}. Los resultados con 'mark' se
+    guardan; los errores no, para que el cliente pueda reintentar.
+    """
+    submission_ids = [str(submission_id)[:64] if submission_id else None for submission_id in submission_ids]
+    if not any(submission_ids):
+        fresh = evaluate(list(range(len(submission_ids))))
+        return [fresh[position] for position in range(len(submission_ids))]
+    for check_all in (False, True):
+        stored = lookup(submission_ids, check_all=check_all)
+        results = {position: stored[submission_id] for position, submission_id in enumerate(submission_ids) if submission_id in stored}
+        # Un mismo id repetido en la petición se corrige una sola vez
+        first = {}
+        for position, submission_id in enumerate(submission_ids):
+            if position not in results and submission_id:
+                first.setdefault(submission_id, position)
+        pending = [
+            position for position, submission_id in enumerate(submission_ids)
+            if position not in results and (not submission_id or first[submission_id] == position)
+        ]
+        try:
+            with transaction.atomic():
+                fresh = evaluate(pending) if pending else {}
+                store({
+                    submission_ids[position]: result for position, result in fresh.items()
+                    if submission_ids[position] and 'mark' in result
+                })
+        except IntegrityError:
+            if check_all:
+                raise
+            # Otro proceso corrigió alguno de estos envíos a la vez: se deshace y se repite consultando la tabla
+            continue
+        results.update(fresh)
+        for position, submission_id in enumerate(submission_ids):
+            if position not in results:
+                results[position] = results[first[submission_id]]
+        return [results[position] for position in range(len(submission_ids))]
@@ -0,0 +1,241 @@
+"""
+Dificultad estimada de cada pregunta para los exámenes adaptativos.
+
+La probabilidad de acierto de una pregunta se estima con los contadores de
+QuestionEvaluationGroup de todos los grupos, suavizada con una Beta a priori
+centrada en el acierto medio del banco:
+
+    p = (aciertos + m * media) / (evaluaciones + m)
+
+con m = EXAM_DIFFICULTY_PRIOR_STRENGTH. Así una pregunta con pocas respuestas
+se queda cerca de la media en lugar de saltar a 0 o 1.
+
+Los contadores viven en un índice en memoria (arrays de NumPy ordenados por
+question_id). Cada escritura de contadores de este proceso deja sus
+incrementos pendientes al confirmarse su transacción (las que se deshacen no
+cuentan) y se suman en bloque, sin consultas, como mucho cada
+EXAM_DIFFICULTY_REFRESH_INTERVAL segundos. Un hilo en segundo plano lo
+reconstruye desde la BD cada EXAM_DIFFICULTY_REBUILD_INTERVAL segundos para
+recoger lo escrito por otros procesos. Los borrados de contadores (de una
+pregunta, de un grupo o reset_analytics) y las reconstrucciones de los
+agregados descartan el índice del proceso al confirmarse; el resto de procesos
+los recogen en su siguiente reconstrucción. Generar un examen no hace consultas.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Sum
+
+from apps.evaluation.api.models import QuestionEvaluationGroup
+
+logger = logging.getLogger(__name__)
+
+EASY, MEDIUM, HARD = 0, 1, 2
+# Límites de p entre los cubos fácil / medio / difícil
+EASY_THRESHOLD = 0.7
+HARD_THRESHOLD = 0.4
+MODES = ('easy', 'mixed', 'hard')
+
+_lock = threading.Lock()
+_index = None
+_pending: list[tuple[int, int, int]] = []
+_refresher = None
+
+
+def parse_mode(value: str) -> tuple[str, float]:
+    """Valida `difficulty=easy|mixed|hard|target:<p>` y devuelve (modo, p objetivo)."""
+    if value in MODES:
+        return value, None
+    if value and value.startswith('target:'):
+        target = float(value[len('target:'):])
+        if 0 <= target <= 1:
+            return 'target', target
+    raise ValueError(f'Modo de dificultad no válido: {value}')
+
+
+class DifficultyIndex:
+    def __init__(self, question_ids: np.ndarray, ev: np.ndarray, correct: np.ndarray):
+        self.built_at = self.refreshed_at = time.monotonic()
+        # Se sustituyen juntos (copia en escritura) para que los lectores nunca vean arrays de distinto tamaño
+        self.arrays = (question_ids, ev, correct)
+        self._update_prior()
+
+    @classmethod
+    def from_db(cls) -> 'DifficultyIndex':
+        rows = np.array(
+            list(
+                QuestionEvaluationGroup.objects
+                .values('question_id')
+                .annotate(ev=Sum('ev_count'), ok=Sum('correct_count'))
+                .order_by('question_id')
+                .values_list('question_id', 'ev', 'ok')
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        return cls(rows[:, 0].copy(), rows[:, 1].astype(float), rows[:, 2].astype(float))
+
+    def _update_prior(self) -> None:
+        _, ev, correct = self.arrays
+        total = ev.sum()
+        self.mean = correct.sum() / total if total else 0.5
+
+    def apply(self, deltas: np.ndarray) -> None:
+        """Suma incrementos [(question_id, ev, correct), ...] de forma vectorizada."""
+        # Primero se agregan por pregunta, así cada posición se actualiza una sola vez
+        ids, inverse = np.unique(deltas[:, 0], return_inverse=True)
+        ev_deltas = np.bincount(inverse, weights=deltas[:, 1], minlength=len(ids))
+        correct_deltas = np.bincount(inverse, weights=deltas[:, 2], minlength=len(ids))
+
+        question_ids, ev, correct = self.arrays
+        new_ids = np.setdiff1d(ids, question_ids, assume_unique=True)
+        if len(new_ids):
+            merged_ids = np.union1d(question_ids, new_ids)
+            positions = np.searchsorted(merged_ids, question_ids)
+            merged_ev = np.zeros(len(merged_ids))
+            merged_correct = np.zeros(len(merged_ids))
+            merged_ev[positions] = ev
+            merged_correct[positions] = correct
+            question_ids, ev, correct = merged_ids, merged_ev, merged_correct
+        else:
+            ev, correct = ev.copy(), correct.copy()
+        positions = np.searchsorted(question_ids, ids)
+        ev[positions] += ev_deltas
+        correct[positions] += correct_deltas
+        self.arrays = (question_ids, ev, correct)
+        self._update_prior()
+        self.refreshed_at = time.monotonic()
+
+    def probabilities(self, question_ids) -> np.ndarray:
+        """Probabilidad de acierto suavizada de cada pregunta (la media del banco si no tiene datos)."""
+        question_ids = np.asarray(question_ids, dtype=np.int64)
+        known_ids, known_ev, known_correct = self.arrays
+        strength = getattr(settings, 'EXAM_DIFFICULTY_PRIOR_STRENGTH', 10)
+        ev = np.zeros(len(question_ids))
+        correct = np.zeros(len(question_ids))
+        if len(known_ids):
+            positions = np.searchsorted(known_ids, question_ids)
+            positions[positions == len(known_ids)] = 0
+            found = known_ids[positions] == question_ids
+            ev[found] = known_ev[positions[found]]
+            correct[found] = known_correct[positions[found]]
+        return (correct + strength * self.mean) / (ev + strength)
+
+    def buckets(self, question_ids) -> np.ndarray:
+        p = self.probabilities(question_ids)
+        return np.where(p >= EASY_THRESHOLD, EASY, np.where(p < HARD_THRESHOLD, HARD, MEDIUM))
+
+
+def _queue(entries: list[tuple[int, int, int]]) -> None:
+    with _lock:
+        if _index is not None:
+            _pending.extend(entries)
+
+
+def record(increments) -> None:
+    """Deja pendientes los incrementos recién escritos al confirmarse la transacción. Se llama desde counters.apply_increments."""
+    entries = [
+        (question_id, ev_count, correct_count)
+        for (group_id, question_id, shard), (ev_count, correct_count) in increments.items()
+    ]
+    if entries:
+        transaction.on_commit(lambda: _queue(entries))
+
+
+def _apply_pending(index: DifficultyIndex) -> None:
+    global _pending
+    if not _pending:
+        return
+    deltas, _pending = np.array(_pending, dtype=np.int64), []
+    index.apply(deltas)
+
+
+def get_index() -> DifficultyIndex:
+    """Índice del proceso. Solo la primera llamada consulta la BD."""
+    global _index
+    with _lock:
+        index = _index
+    if index is None:
+        index = DifficultyIndex.from_db()
+        with _lock:
+            _index = index
+            _pending.clear()
+        _start_refresher()
+    interval = getattr(settings, 'EXAM_DIFFICULTY_REFRESH_INTERVAL', 30)
+    if time.monotonic() - index.refreshed_at >= interval:
+        with _lock:
+            _apply_pending(index)
+    return index
+
+
+def rebuild() -> None:
+    """Reconstruye el índice desde la BD (hilo de refresco o comandos)."""
+    global _index
+    index = DifficultyIndex.from_db()
+    with _lock:
+        _index = index
+        _pending.clear()
+
+
+def invalidate(**kwargs) -> None:
+    global _index
+    with _lock:
+        _index = None
+        _pending.clear()
+
+
+def on_counters_deleted(**kwargs) -> None:
+    """Señales de borrado y rollups.delete_counters: el índice se descarta cuando se confirma el borrado."""
+    transaction.on_commit(invalidate)
+
+
+def _start_refresher() -> None:
+    global _refresher
+    interval = getattr(settings, 'EXAM_DIFFICULTY_REBUILD_INTERVAL', 600)
+    if interval <= 0 or (_refresher is not None and _refresher.is_alive()):
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            close_old_connections()
+            try:
+                rebuild()
+            except Exception:
+                logger.exception('No se pudo reconstruir el índice de dificultad')
+            finally:
+                close_old_connections()
+
+    _refresher = threading.Thread(target=run, name='exam-difficulty-refresh', daemon=True)
+    _refresher.start()
+
+
+def order_deck(deck, mode: str, target: float, rng) -> np.ndarray:
+    """
+    Ordena los ids de un tema según la preferencia del modo; dentro de cada
+    cubo el orden es aleatorio (reproducible con el mismo rng).
+      - easy / hard: primero su cubo, luego el medio y por último el contrario.
+      - mixed: alterna fácil, medio y difícil.
+      - target: las más cercanas a la probabilidad objetivo.
+    """
+    deck = np.asarray(deck, dtype=np.int64)
+    index = get_index()
+    noise = np.random.default_rng(rng.getrandbits(64)).random(len(deck))
+    if mode == 'target':
+        distance = np.round(np.abs(index.probabilities(deck) - target), 2)
+        return deck[np.lexsort((noise, distance))]
+    buckets = index.buckets(deck)
+    if mode == 'easy':
+        return deck[np.lexsort((noise, buckets))]
+    if mode == 'hard':
+        return deck[np.lexsort((noise, -buckets))]
+    # mixed: posición dentro de su cubo (en orden aleatorio) y luego el cubo
+    order = np.lexsort((noise, buckets))
+    rank_in_bucket = np.empty(len(deck), dtype=np.int64)
+    sorted_buckets = buckets[order]
+    starts = np.searchsorted(sorted_buckets, sorted_buckets)
+    rank_in_bucket[order] = np.arange(len(deck)) - starts
+    return deck[np.lexsort((buckets, rank_in_bucket))]
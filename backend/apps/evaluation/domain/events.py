@@ -0,0 +1,304 @@
+"""
+Registro de correcciones por franjas de tiempo (EvaluationEvent).
+
+QuestionEvaluationGroup solo tiene contadores acumulados, así que no permite
+comparar "esta semana con la anterior" y reset_analytics borra la historia.
+Cada lote de contadores (counters.apply_increments) suma también sus intentos
+y aciertos a la franja de la hora actual de cada (grupo, pregunta), en la
+misma sub-fila (shard) que sus contadores: así las correcciones simultáneas de
+un grupo no vuelven a chocar en una sola fila. Las consultas suman todas las
+sub-filas y la compactación las junta en la 0.
+
+El trabajo de compactación (comando compact_evaluation_events) pasa las
+franjas horarias antiguas a diarias y las diarias antiguas a semanales, de
+modo que cada instante queda en una sola franja. En PostgreSQL la tabla está
+particionada por mes: ensure_partitions crea los meses siguientes y
+drop_before borra los antiguos con DROP TABLE en lugar de DELETE.
+
+Las consultas por intervalo cuentan las franjas que empiezan dentro de él: si
+el intervalo corta una franja diaria o semanal, esta cuenta entera.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apps.evaluation.api.models import EvaluationEvent
+
+GRANULARITIES = [granularity for granularity, _ in EvaluationEvent.GRANULARITIES]
+# Días del intervalo cuando solo se pide la evolución (bucket) o falta `from`
+DEFAULT_WINDOW_DAYS = 30
+TABLE = EvaluationEvent._meta.db_table
+# Ruta hasta el id de cada dimensión de analíticas
+DIMENSION_KEYS = {
+    'group': 'group_id',
+    'question': 'question_id',
+    'subject': 'group__subject_id',
+    'topic': 'question__topics__topic_id',
+    'concept': 'question__concepts__concept_id',
+}
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Inicio (UTC) de la franja que contiene `moment`. Las semanas empiezan en lunes."""
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'hour':
+        return moment
+    moment = moment.replace(hour=0)
+    if granularity == 'week':
+        moment -= timedelta(days=moment.weekday())
+    return moment
+
+
+def record(increments, now: datetime = None) -> None:
+    """Suma los incrementos de counters.apply_increments a la franja horaria actual (misma transacción y sub-fila)."""
+    start = bucket_start(now or timezone.now(), 'hour')
+    _write({
+        ('hour', start, group_id, question_id, shard): list(counts)
+        for (group_id, question_id, shard), counts in increments.items()
+    })
+
+
+def _write(totals: dict) -> None:
+    rows = sorted((key, counts) for key, counts in totals.items() if counts[0] or counts[1])
+    if not rows:
+        return
+    if connection.vendor == 'postgresql':
+        _upsert_postgresql(rows)
+    else:
+        _upsert_bulk_create(rows)
+
+
+def _upsert_postgresql(rows) -> None:
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+    params = []
+    for (granularity, start, group_id, question_id, shard), (attempts, correct) in rows:
+        params.extend([granularity, start, group_id, question_id, shard, attempts, correct])
+    sql = f"""
+        INSERT INTO {TABLE} AS t (granularity, bucket_start, group_id, question_id, shard, attempts, correct)
+        VALUES {values}
+        ON CONFLICT (granularity, bucket_start, group_id, question_id, shard) DO UPDATE SET
+            attempts = t.attempts + EXCLUDED.attempts,
+            correct = t.correct + EXCLUDED.correct
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _upsert_bulk_create(rows) -> None:
+    # Igual que en counters: se leen los valores actuales para sumar
+    current = {}
+    for granularity, start, group_id, question_id, shard, attempts, correct in (
+        EvaluationEvent.objects
+        .select_for_update()
+        .filter(
+            granularity__in={key[0] for key, _ in rows},
+            bucket_start__in={key[1] for key, _ in rows},
+            group_id__in={key[2] for key, _ in rows},
+            question_id__in={key[3] for key, _ in rows},
+        )
+        .values_list('granularity', 'bucket_start', 'group_id', 'question_id', 'shard', 'attempts', 'correct')
+    ):
+        current[(granularity, start, group_id, question_id, shard)] = (attempts, correct)
+    objs = []
+    for key, (attempts, correct) in rows:
+        old_attempts, old_correct = current.get(key, (0, 0))
+        objs.append(EvaluationEvent(
+            granularity=key[0], bucket_start=key[1], group_id=key[2], question_id=key[3], shard=key[4],
+            attempts=old_attempts + attempts, correct=old_correct + correct,
+        ))
+    EvaluationEvent.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=['granularity', 'bucket_start', 'group', 'question', 'shard'],
+        update_fields=['attempts', 'correct'],
+    )
+
+
+# --- Compactación ---
+
+def _roll(source: str, target: str, before: datetime) -> int:
+    """
+    Pasa las franjas `source` anteriores a `before` a franjas `target`, todas
+    las sub-filas a la 0. Devuelve cuántas filas se han compactado.
+    """
+    rows = EvaluationEvent.objects.filter(granularity=source, bucket_start__lt=before)
+    with transaction.atomic():
+        totals = {
+            (target, start, group_id, question_id, 0): [attempts, correct]
+            for start, group_id, question_id, attempts, correct in (
+                rows.annotate(start=Trunc('bucket_start', target, tzinfo=dt_timezone.utc))
+                .values('start', 'group_id', 'question_id')
+                .annotate(total_attempts=Sum('attempts'), total_correct=Sum('correct'))
+                .values_list('start', 'group_id', 'question_id', 'total_attempts', 'total_correct')
+            )
+        }
+        count, _ = rows.delete()
+        _write(totals)
+    return count
+
+
+def compact(now: datetime = None) -> dict[str, int]:
+    """
+    Horas anteriores a EVALUATION_EVENTS_HOURLY_DAYS días → días, y días
+    anteriores a EVALUATION_EVENTS_DAILY_DAYS días → semanas. Los cortes se
+    alinean al inicio del día o de la semana para no partir franjas.
+    """
+    now = now or timezone.now()
+    hourly_days = getattr(settings, 'EVALUATION_EVENTS_HOURLY_DAYS', 14)
+    daily_days = getattr(settings, 'EVALUATION_EVENTS_DAILY_DAYS', 120)
+    return {
+        'hour': _roll('hour', 'day', bucket_start(now - timedelta(days=hourly_days), 'day')),
+        'day': _roll('day', 'week', bucket_start(now - timedelta(days=daily_days), 'week')),
+    }
+
+
+# --- Particiones (solo PostgreSQL) ---
+
+def _month(moment: datetime, offset: int = 0) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _partition_name(month: datetime) -> str:
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def _partitions() -> list[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s",
+            [TABLE],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def ensure_partitions(now: datetime = None, months_ahead: int = None) -> list[str]:
+    """Crea las particiones mensuales desde el mes actual hasta `months_ahead` meses después. Devuelve las creadas."""
+    if connection.vendor != 'postgresql':
+        return []
+    now = now or timezone.now()
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'EVALUATION_EVENTS_PARTITIONS_AHEAD', 2)
+    existing = set(_partitions())
+    created = []
+    for offset in range(months_ahead + 1):
+        start, end = _month(now, offset), _month(now, offset + 1)
+        name = _partition_name(start)
+        if name in existing:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Las filas del mes que estén en la partición por defecto se mueven a la nueva
+            cursor.execute(f"CREATE TEMPORARY TABLE moved_events (LIKE {TABLE})")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {TABLE}_pdefault WHERE bucket_start >= %s AND bucket_start < %s RETURNING *) "
+                f"INSERT INTO moved_events SELECT * FROM moved",
+                [start, end],
+            )
+            cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)", [start, end])
+            cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM moved_events")
+            cursor.execute("DROP TABLE moved_events")
+        created.append(name)
+    return created
+
+
+def drop_before(cutoff: datetime) -> int:
+    """
+    Borra la historia anterior a `cutoff`. En PostgreSQL los meses completos
+    se eliminan con DROP TABLE; el resto con DELETE. Devuelve las particiones borradas.
+    """
+    dropped = 0
+    if connection.vendor == 'postgresql':
+        prefix = f'{TABLE}_p'
+        for name in _partitions():
+            suffix = name[len(prefix):]
+            if not suffix.isdigit():
+                continue
+            month = datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=dt_timezone.utc)
+            if _month(month, 1) <= cutoff:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP TABLE {name}')
+                dropped += 1
+    EvaluationEvent.objects.filter(bucket_start__lt=cutoff).delete()
+    return dropped
+
+
+# --- Consultas ---
+
+def _parse_moment(value: str) -> datetime:
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError(f"Fecha no válida: {value}")
+        moment = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def parse_window(start: str = None, end: str = None, bucket: str = None) -> tuple[datetime, datetime, str | None]:
+    """
+    Intervalo [start, end) y franja de la evolución a partir de los parámetros
+    `from`, `to` (fecha o fecha y hora ISO) y `bucket` de la petición.
+    """
+    if bucket and bucket not in GRANULARITIES:
+        raise ValidationError(f"bucket debe ser uno de: {', '.join(GRANULARITIES)}.")
+    try:
+        end = _parse_moment(end) if end else timezone.now()
+        start = _parse_moment(start) if start else end - timedelta(days=DEFAULT_WINDOW_DAYS)
+    except ValueError:
+        raise ValidationError("Fecha no válida.")
+    if start >= end:
+        raise ValidationError("`from` debe ser anterior a `to`.")
+    return start, end, bucket or None
+
+
+def _window(subject_id: int, start: datetime, end: datetime):
+    queryset = EvaluationEvent.objects.filter(bucket_start__gte=start, bucket_start__lt=end)
+    if subject_id:
+        queryset = queryset.filter(group__subject_id=subject_id)
+    return queryset
+
+
+def top(dimension: str, subject_id: int, start: datetime, end: datetime, limit: int = None) -> list[dict]:
+    """Como rollups.top pero solo con las correcciones de [start, end)."""
+    key = DIMENSION_KEYS[dimension]
+    rows = (
+        _window(subject_id, start, end)
+        .exclude(**{f'{key}__isnull': True})
+        .values(key_id=F(key))
+        .annotate(attempts=Sum('attempts'), correct=Sum('correct'))
+        .annotate(failures=F('attempts') - F('correct'))
+        .filter(attempts__gt=0)
+        .order_by('-failures', 'key_id')
+    )
+    return list(rows[:limit] if limit else rows)
+
+
+def series(dimension: str, key_ids, subject_id: int, start: datetime, end: datetime, bucket: str) -> dict[int, list[dict]]:
+    """Evolución de cada id por franjas de `bucket` (hour, day o week) dentro de [start, end)."""
+    key = DIMENSION_KEYS[dimension]
+    rows = (
+        _window(subject_id, start, end)
+        .filter(**{f'{key}__in': list(key_ids)})
+        .annotate(bucket=Trunc('bucket_start', bucket, tzinfo=dt_timezone.utc))
+        .values('bucket', key_id=F(key))
+        .annotate(attempts=Sum('attempts'), correct=Sum('correct'))
+        .order_by('key_id', 'bucket')
+    )
+    result = defaultdict(list)
+    for row in rows:
+        result[row['key_id']].append({
+            'bucket': row['bucket'].isoformat(),
+            'attempts': row['attempts'],
+            'value': round(row['correct'] * 100.0 / row['attempts'], 2) if row['attempts'] else 0,
+        })
+    return result
@@ -0,0 +1,265 @@
+"""
+Almacén en memoria del banco de preguntas para servir exámenes.
+
+Guarda por proceso las preguntas que pueden salir en un examen (no `old` y,
+con EXAM_APPROVED_QUESTIONS_ONLY, solo las aprobadas) como registros compactos
+con __slots__, sus respuestas como tuplas y, por tema, un array('q') ordenado
+con los ids de sus preguntas. Así generar un examen no lee la BD ni construye
+modelos ni serializers de DRF.
+
+Los cambios que hacen los servicios de preguntas y respuestas llegan por
+señales: solo se marcan las preguntas afectadas y se recargan en la siguiente
+lectura. Cada EXAM_SAMPLING_CACHE_TTL segundos se reconstruye entero, lo que
+cubre los cambios hechos desde otros procesos. Esa reconstrucción se hace en
+un hilo aparte y mientras tanto se sigue sirviendo el almacén anterior: solo
+la primera lectura del proceso (o tras invalidate) espera a construirlo. Con 0
+no se guarda nada y cada examen se lee de la BD.
+"""
+import logging
+import random
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.evaluation.api.models import Answer, Question, QuestionBelongsToTopic
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_store = None
+# Preguntas modificadas desde la última lectura del almacén
+_dirty: set[int] = set()
+# Hilo que está reconstruyendo el almacén caducado, si hay uno, y preguntas recargadas
+# sobre el anterior mientras tanto (el nuevo puede haberlas leído antes del cambio)
+_rebuilder = None
+_reloaded: set[int] = set()
+
+
+class QuestionRecord:
+    """Pregunta lista para servir. `answers` son tuplas (id, text_es, text_en, is_correct)."""
+
+    __slots__ = ('id', 'type', 'approved', 'statement_es', 'statement_en', 'explanation_es', 'explanation_en', 'answers')
+
+    def __init__(self, id, type, approved, statement_es, statement_en, explanation_es, explanation_en, answers=()):
+        self.id = id
+        self.type = type
+        self.approved = approved
+        self.statement_es = statement_es
+        self.statement_en = statement_en
+        self.explanation_es = explanation_es
+        self.explanation_en = explanation_en
+        self.answers = answers
+
+    def as_short(self, lang: str, seed: int = None) -> dict:
+        """
+        Mismo formato que ShortQuestionSerializer. Con `seed` las respuestas se
+        barajan de forma reproducible (mismo seed y pregunta, mismo orden).
+        """
+        es = lang == 'es'
+        answers = list(self.answers)
+        if seed is not None:
+            random.Random(f'{seed}:{self.id}').shuffle(answers)
+        return {
+            'id': self.id,
+            'type': self.type,
+            'statement': self.statement_es if es else self.statement_en,
+            'answers': [
+                {'id': answer_id, 'text': text_es if es else text_en, 'is_correct': is_correct}
+                for answer_id, text_es, text_en, is_correct in answers
+            ],
+            'explanation': self.explanation_es if es else self.explanation_en,
+        }
+
+    def answer_keys(self) -> list[tuple[int, bool]]:
+        return [(answer[0], answer[3]) for answer in self.answers]
+
+
+def eligible_questions():
+    """Preguntas que pueden salir en un examen."""
+    questions = Question.objects.filter(old=False)
+    if getattr(settings, 'EXAM_APPROVED_QUESTIONS_ONLY', False):
+        questions = questions.filter(approved=True)
+    return questions
+
+
+def load_records(question_ids=None) -> dict[int, QuestionRecord]:
+    """Lee de la BD las preguntas (todas las elegibles o solo `question_ids`) con sus respuestas: dos consultas."""
+    questions = eligible_questions()
+    answers = Answer.objects.all()
+    if question_ids is not None:
+        questions = questions.filter(id__in=question_ids)
+        answers = answers.filter(question_id__in=question_ids)
+    records = {
+        row[0]: QuestionRecord(*row)
+        for row in questions.values_list(
+            'id', 'type', 'approved', 'statement_es', 'statement_en', 'explanation_es', 'explanation_en'
+        )
+    }
+    grouped = defaultdict(list)
+    for question_id, *answer in answers.order_by('id').values_list('question_id', 'id', 'text_es', 'text_en', 'is_correct'):
+        if question_id in records:
+            grouped[question_id].append(tuple(answer))
+    for question_id, question_answers in grouped.items():
+        records[question_id].answers = tuple(question_answers)
+    return records
+
+
+def load_topic_ids(topic_id: int) -> array:
+    ids = (
+        QuestionBelongsToTopic.objects
+        .filter(topic_id=topic_id, question__in=eligible_questions())
+        .order_by('question_id')
+        .values_list('question_id', flat=True)
+    )
+    return array('q', ids)
+
+
+class ExamStore:
+    def __init__(self):
+        self.built_at = time.monotonic()
+        # Cambia con cada recarga parcial; sirve para invalidar lo calculado a partir del almacén
+        self.version = 0
+        self.records = load_records()
+        links = defaultdict(list)
+        question_topics = defaultdict(list)
+        for topic_id, question_id in QuestionBelongsToTopic.objects.order_by('question_id').values_list('topic_id', 'question_id'):
+            if question_id in self.records:
+                links[topic_id].append(question_id)
+                question_topics[question_id].append(topic_id)
+        self.topics = {topic_id: array('q', ids) for topic_id, ids in links.items()}
+        # Tuplas en lugar de sets: ocupan bastante menos con tan pocos temas por pregunta
+        self.question_topics = {question_id: tuple(topic_ids) for question_id, topic_ids in question_topics.items()}
+
+    def topic_ids(self, topic_id: int) -> array:
+        return self.topics.get(topic_id, array('q'))
+
+    def refresh(self, question_ids: set[int]) -> None:
+        """Recarga solo las preguntas indicadas y los arrays de los temas a los que pertenecían o pertenecen."""
+        records = load_records(question_ids)
+        self.version += 1
+        new_topics = defaultdict(set)
+        for topic_id, question_id in (
+            QuestionBelongsToTopic.objects
+            .filter(question_id__in=records.keys())
+            .values_list('topic_id', 'question_id')
+        ):
+            new_topics[question_id].add(topic_id)
+
+        touched = defaultdict(lambda: ([], []))  # topic_id -> (ids a quitar, ids a añadir)
+        for question_id in question_ids:
+            old = set(self.question_topics.pop(question_id, ()))
+            new = new_topics.get(question_id, set())
+            for topic_id in old - new:
+                touched[topic_id][0].append(question_id)
+            for topic_id in new - old:
+                touched[topic_id][1].append(question_id)
+            if new:
+                self.question_topics[question_id] = tuple(new)
+            if question_id in records:
+                self.records[question_id] = records[question_id]
+            else:
+                self.records.pop(question_id, None)
+
+        # Copia en escritura: los hilos que ya leyeron un array siguen usando el anterior
+        for topic_id, (removed, added) in touched.items():
+            ids = set(self.topics.get(topic_id, ())).difference(removed).union(added)
+            self.topics[topic_id] = array('q', sorted(ids))
+
+    def get_many(self, question_ids: list[int]) -> list[QuestionRecord]:
+        missing = [question_id for question_id in question_ids if question_id not in self.records]
+        if missing:
+            with _lock:
+                self.refresh(set(missing))
+        return [self.records[question_id] for question_id in question_ids if question_id in self.records]
+
+
+def _enabled() -> bool:
+    return getattr(settings, 'EXAM_SAMPLING_CACHE_TTL', 60) > 0
+
+
+def _rebuild(expired: ExamStore) -> None:
+    global _store, _rebuilder
+    close_old_connections()
+    try:
+        store = ExamStore()
+        with _lock:
+            # Si entretanto se invalidó, el siguiente lector construye uno nuevo
+            if _store is expired:
+                _store = store
+                _dirty.update(_reloaded)
+    except Exception:
+        logger.exception('No se pudo reconstruir el almacén de exámenes')
+    finally:
+        with _lock:
+            _rebuilder = None
+        close_old_connections()
+
+
+def _start_rebuild(expired: ExamStore) -> None:
+    """Lanza (una sola vez a la vez) la reconstrucción en segundo plano. Se llama con _lock cogido."""
+    global _rebuilder
+    if _rebuilder is not None:
+        return
+    _reloaded.clear()
+    _rebuilder = threading.Thread(target=_rebuild, args=(expired,), name='exam-store-rebuild', daemon=True)
+    _rebuilder.start()
+
+
+def get_store() -> ExamStore:
+    """
+    Devuelve el almacén del proceso con los cambios pendientes aplicados. Si ha
+    caducado se sigue devolviendo mientras otro hilo lo reconstruye. Las
+    preguntas marcadas durante la reconstrucción siguen en _dirty y se recargan
+    sobre el almacén nuevo.
+    """
+    global _store
+    ttl = getattr(settings, 'EXAM_SAMPLING_CACHE_TTL', 60)
+    with _lock:
+        store = _store
+        if store is None:
+            _dirty.clear()
+            store = _store = ExamStore()
+        else:
+            if time.monotonic() - store.built_at >= ttl:
+                _start_rebuild(store)
+            if _dirty:
+                dirty = set(_dirty)
+                _dirty.clear()
+                store.refresh(dirty)
+                if _rebuilder is not None:
+                    _reloaded.update(dirty)
+    return store
+
+
+def get_topic_ids(topic_id: int) -> array:
+    """Ids ordenados de las preguntas elegibles de un tema."""
+    if not _enabled():
+        return load_topic_ids(topic_id)
+    return get_store().topic_ids(topic_id)
+
+
+def get_questions(question_ids: list[int]) -> list[QuestionRecord]:
+    """Registros de las preguntas pedidas, en el mismo orden."""
+    if not _enabled():
+        records = load_records(question_ids)
+        return [records[question_id] for question_id in question_ids if question_id in records]
+    return get_store().get_many(question_ids)
+
+
+def mark_question_changed(sender, instance, **kwargs) -> None:
+    """Señal de Question, Answer o QuestionBelongsToTopic: recarga solo la pregunta afectada."""
+    question_id = instance.id if sender is Question else instance.question_id
+    with _lock:
+        _dirty.add(question_id)
+
+
+def invalidate(**kwargs) -> None:
+    """Descarta el almacén entero (p. ej. al cambiar o borrar un tema)."""
+    global _store
+    with _lock:
+        _store = None
+        _dirty.clear()
@@ -0,0 +1,139 @@
+"""
+Exportación de analíticas en CSV o NDJSON (/analytics/export/).
+
+Las filas se generan por trozos de ANALYTICS_EXPORT_CHUNK_SIZE con
+paginación por clave (WHERE clave > última ORDER BY clave LIMIT n): cada trozo
+es una consulta independiente y acotada, sin cursores de servidor ni
+transacciones abiertas mientras se envía la respuesta, así que funciona con
+pgbouncer en modo transacción y la memoria no depende del número de filas.
+
+Dos niveles:
+
+  - aggregate: una fila por id de la dimensión (group_by) con intentos,
+    aciertos, fallos y porcentaje, como /analytics/performance/ pero sin
+    límite. Sale de los agregados (rollups) o, con intervalo, de las franjas
+    del registro de correcciones (events).
+  - raw: los contadores tal cual, QuestionEvaluationGroup (una fila por
+    sub-fila de contador) o, con intervalo, EvaluationEvent (una fila por
+    franja, grupo, pregunta y sub-fila).
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.db.models import F, Sum
+
+from apps.evaluation.api.models import AnalyticsRollup, QuestionEvaluationGroup
+from apps.evaluation.domain import events, rollups
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+LEVELS = ('aggregate', 'raw')
+
+AGGREGATE_COLUMNS = ['id', 'label', 'attempts', 'correct', 'failures', 'accuracy']
+COUNTER_COLUMNS = ['group_id', 'subject_id', 'question_id', 'shard', 'attempts', 'correct']
+EVENT_COLUMNS = ['bucket_start', 'granularity', 'group_id', 'subject_id', 'question_id', 'shard', 'attempts', 'correct']
+
+
+def _chunk_size() -> int:
+    return getattr(settings, 'ANALYTICS_EXPORT_CHUNK_SIZE', 2000)
+
+
+def _keyset(queryset, key: str):
+    """Trozos de `queryset` (diccionarios) ordenados por `key`, una consulta con LIMIT por trozo."""
+    size = _chunk_size()
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(**{f'{key}__gt': last})
+        rows = list(page.order_by(key)[:size])
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        last = rows[-1][key]
+
+
+def _aggregate(group_by: str, subject_id: int, window, lang: str):
+    if window:
+        start, end, _ = window
+        key = events.DIMENSION_KEYS[group_by]
+        queryset = (
+            events._window(subject_id, start, end)
+            .exclude(**{f'{key}__isnull': True})
+            .values(key_id=F(key))
+            .annotate(attempts=Sum('attempts'), correct=Sum('correct'))
+            .filter(attempts__gt=0)
+        )
+    else:
+        queryset = (
+            AnalyticsRollup.objects
+            .filter(subject_id=subject_id or rollups.ALL_SUBJECTS, dimension=group_by, attempts__gt=0)
+            .values('key_id', 'attempts', 'correct')
+        )
+    for rows in _keyset(queryset, 'key_id'):
+        labels = rollups.labels(group_by, [row['key_id'] for row in rows], lang)
+        for row in rows:
+            yield {
+                'id': row['key_id'],
+                'label': labels.get(row['key_id']),
+                'attempts': row['attempts'],
+                'correct': row['correct'],
+                'failures': row['attempts'] - row['correct'],
+                'accuracy': round(row['correct'] * 100.0 / row['attempts'], 2),
+            }
+
+
+def _raw(subject_id: int, window):
+    if window:
+        start, end, _ = window
+        queryset = events._window(subject_id, start, end).values(
+            'id', 'bucket_start', 'granularity', 'group_id', 'question_id', 'shard', 'attempts', 'correct',
+            subject_id=F('group__subject_id'),
+        )
+    else:
+        queryset = QuestionEvaluationGroup.objects.all()
+        if subject_id:
+            queryset = queryset.filter(group__subject_id=subject_id)
+        queryset = queryset.values(
+            'id', 'group_id', 'question_id', 'shard',
+            subject_id=F('group__subject_id'), attempts=F('ev_count'), correct=F('correct_count'),
+        )
+    for rows in _keyset(queryset, 'id'):
+        for row in rows:
+            if window:
+                row['bucket_start'] = row['bucket_start'].isoformat()
+            yield row
+
+
+def columns(level: str, window) -> list[str]:
+    if level == 'aggregate':
+        return AGGREGATE_COLUMNS
+    return EVENT_COLUMNS if window else COUNTER_COLUMNS
+
+
+def rows(level: str, group_by: str, subject_id: int = 0, window=None, lang: str = 'es'):
+    """Generador de filas (diccionarios) del nivel pedido; las consultas se hacen a medida que se consume."""
+    if level == 'aggregate':
+        return _aggregate(group_by, subject_id, window, lang)
+    return _raw(subject_id, window)
+
+
+class _Echo:
+    """Pseudo-fichero para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def stream(output: str, fields: list[str], records):
+    """Líneas CSV (con cabecera) o NDJSON de `records`, una a una."""
+    if output == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for record in records:
+            yield writer.writerow([record[field] for field in fields])
+    else:
+        for record in records:
+            yield json.dumps({field: record[field] for field in fields}, ensure_ascii=False) + '\n'
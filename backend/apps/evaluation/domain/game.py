@@ -0,0 +1,112 @@
+"""
+Preguntas para el modo juego (/game/questions).
+
+Cada partida tiene una semilla y un "mazo": todas las preguntas elegibles de
+la asignatura (o del banco entero) en el orden que da el muestreo por temas
+(sampling) con random.Random(semilla), servidas en lotes de GAME_BATCH_SIZE.
+El cursor firmado lleva la semilla, los temas y el número de lote, así que
+cualquier worker vuelve a derivar el mismo mazo sin estado en el servidor:
+no hay nada en la caché que pueda expulsarse o no estar en otro proceso.
+
+Derivar el mazo solo usa los arrays de ids del almacén en memoria
+(exam_store), pero recorre y permuta todas las preguntas de la asignatura. Por
+eso el mazo de cada partida (sus ids, por temas y semilla) se guarda en la
+caché GAME_DECK_TTL segundos y cada lote solo lee su tramo y serializa sus
+preguntas; la caché es solo un atajo: si el mazo falta se vuelve a derivar
+desde el cursor. La lista de temas de cada asignatura también se guarda
+GAME_DECK_TTL segundos para empezar partidas sin consultas; las partidas en
+curso usan la de su cursor. Mientras el mazo está guardado las preguntas
+nuevas no entran en la partida y las borradas se saltan.
+"""
+import hashlib
+import random
+import secrets
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from apps.content.api.models import Topic
+from apps.courses.api.models import SubjectIsAboutTopic
+from apps.evaluation.domain import exam_store, sampling
+
+CURSOR_SALT = 'apps.evaluation.game-cursor'
+
+
+def _topics_key(scope: str) -> str:
+    return f'game:topics:{scope}'
+
+
+def _deck_key(topic_ids: list[int], seed: int) -> str:
+    digest = hashlib.sha1(','.join(map(str, topic_ids)).encode()).hexdigest()
+    return f'game:deck:{digest}:{seed}'
+
+
+def _load_topic_ids(subject_id: int = None) -> list[int]:
+    if subject_id is None:
+        return list(Topic.objects.filter(old=False).order_by('id').values_list('id', flat=True))
+    return list(
+        SubjectIsAboutTopic.objects.filter(subject_id=subject_id).order_by('order_id').values_list('topic_id', flat=True)
+    )
+
+
+def _topic_ids(subject_id: int = None) -> list[int]:
+    scope = str(subject_id) if subject_id is not None else 'all'
+    topic_ids = cache.get(_topics_key(scope))
+    if topic_ids is None:
+        topic_ids = _load_topic_ids(subject_id)
+        cache.set(_topics_key(scope), topic_ids, getattr(settings, 'GAME_DECK_TTL', 300))
+    return topic_ids
+
+
+def deck(topic_ids: list[int], seed: int) -> list[int]:
+    """Todas las preguntas de los temas en el orden de la partida `seed` (mismo orden en cualquier proceso)."""
+    total = len({question_id for topic_id in topic_ids for question_id in exam_store.get_topic_ids(topic_id)})
+    return sampling.sample_question_ids(topic_ids, total, random.Random(seed))
+
+
+def _cached_deck(topic_ids: list[int], seed: int) -> list[int]:
+    """Mazo de la partida desde la caché; solo se deriva si no está."""
+    key = _deck_key(topic_ids, seed)
+    question_ids = cache.get(key)
+    if question_ids is None:
+        question_ids = deck(topic_ids, seed)
+        cache.set(key, question_ids, getattr(settings, 'GAME_DECK_TTL', 300))
+    return question_ids
+
+
+def make_cursor(subject_id: int, lang: str, seed: int, topic_ids: list[int], number: int) -> str:
+    return signing.dumps([subject_id, lang, seed, topic_ids, number], salt=CURSOR_SALT, compress=True)
+
+
+def read_cursor(cursor: str) -> tuple[int, str, int, list[int], int] | None:
+    try:
+        subject_id, lang, seed, topic_ids, number = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    return subject_id, lang, seed, topic_ids, number
+
+
+def get_batch(subject_id: int, lang: str, cursor: str = None) -> tuple[list[dict], str | None]:
+    """
+    Devuelve el siguiente lote de preguntas ya serializadas y el cursor para
+    pedir el siguiente. Sin cursor (o con uno no válido) empieza una partida
+    nueva; al acabar el mazo se vuelve a empezar por el primer lote.
+    """
+    position = read_cursor(cursor) if cursor else None
+    if position and position[:2] == (subject_id, lang):
+        _, _, seed, topic_ids, number = position
+    else:
+        seed, topic_ids, number = secrets.randbits(32), _topic_ids(subject_id), 0
+
+    question_ids = _cached_deck(topic_ids, seed)
+    if not question_ids:
+        return [], None
+    size = getattr(settings, 'GAME_BATCH_SIZE', 10)
+    batches = -(-len(question_ids) // size)
+    number %= batches
+    batch = [
+        record.as_short(lang, seed=seed)
+        for record in exam_store.get_questions(question_ids[number * size:(number + 1) * size])
+    ]
+    return batch, make_cursor(subject_id, lang, seed, topic_ids, (number + 1) % batches)
@@ -0,0 +1,153 @@
+"""
+Calidad de las preguntas del banco (tabla QuestionStats), calculada por lotes.
+
+Se lee QuestionEvaluationGroup en una sola pasada (iterator + np.fromiter, sin
+cargar los modelos) y se agregan por pregunta las evaluaciones, los aciertos y
+el número de grupos con bincount. Para cada pregunta no antigua se guarda:
+
+  - p suavizada: los aciertos con una prior Beta centrada en la media del banco
+    y con peso EXAM_DIFFICULTY_PRIOR_STRENGTH (igual que difficulty), de modo
+    que las preguntas con pocas evaluaciones no salen con 0 % o 100 %.
+  - Intervalo de confianza al 95 % de esa p (aproximación normal de la
+    posterior Beta, recortado a [0, 1]).
+  - Discriminación punto-biserial a partir de los exámenes guardados
+    (psychometrics.item_statistics); None si no hay respuestas suficientes.
+  - Un aviso: datos insuficientes, demasiado difícil (nadie la acierta o el
+    intervalo queda por debajo de QUESTION_STATS_HARD_P), demasiado fácil (todos
+    la aciertan o el intervalo queda por encima de QUESTION_STATS_EASY_P) o
+    discriminación negativa.
+
+refresh() sustituye la tabla entera en una transacción; la lanzan el comando
+compute_question_stats y POST /questions/stats/.
+"""
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.evaluation.api.models import Question, QuestionEvaluationGroup, QuestionStats
+from apps.evaluation.domain import attempts, psychometrics
+
+Z_95 = 1.959964
+CHUNK_SIZE = 5000
+
+
+def _load_counters() -> np.ndarray:
+    """Filas (question_id, group_id, ev_count, correct_count) de QuestionEvaluationGroup como array (n, 4)."""
+    rows = (
+        QuestionEvaluationGroup.objects
+        .values_list('question_id', 'group_id', 'ev_count', 'correct_count')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 4)
+
+
+def _discrimination(question_ids: np.ndarray) -> np.ndarray:
+    """Punto-biserial de cada pregunta de `question_ids` (NaN si no hay datos)."""
+    result = np.full(len(question_ids), np.nan)
+    items = psychometrics.item_statistics(attempts.load())
+    known_ids = items['question_ids']
+    if len(known_ids):
+        positions = np.minimum(np.searchsorted(known_ids, question_ids), len(known_ids) - 1)
+        found = known_ids[positions] == question_ids
+        result[found] = items['point_biserial'][positions[found]]
+    return result
+
+
+def _flags(ev: np.ndarray, correct: np.ndarray, ci_low: np.ndarray, ci_high: np.ndarray, discrimination: np.ndarray) -> np.ndarray:
+    min_attempts = getattr(settings, 'QUESTION_STATS_MIN_ATTEMPTS', 20)
+    hard_p = getattr(settings, 'QUESTION_STATS_HARD_P', 0.2)
+    easy_p = getattr(settings, 'QUESTION_STATS_EASY_P', 0.9)
+    with np.errstate(invalid='ignore'):
+        negative = discrimination < 0
+    # np.select se queda con la primera condición que se cumple
+    return np.select(
+        [
+            ev < min_attempts,
+            (correct == 0) | (ci_high < hard_p),
+            (correct == ev) | (ci_low > easy_p),
+            negative,
+        ],
+        ['insufficient_data', 'too_hard', 'too_easy', 'negative_discrimination'],
+        default='',
+    )
+
+
+def compute() -> dict[str, np.ndarray]:
+    """Estadísticas de todas las preguntas no antiguas, como arrays alineados con 'question_ids'."""
+    question_ids = np.array(
+        sorted(Question.objects.filter(old=False).values_list('id', flat=True)), dtype=np.int64
+    )
+    rows = _load_counters()
+    size = len(question_ids)
+    ev = np.zeros(size, dtype=np.int64)
+    correct = np.zeros(size, dtype=np.int64)
+    groups = np.zeros(size, dtype=np.int64)
+    if size and len(rows):
+        positions = np.minimum(np.searchsorted(question_ids, rows[:, 0]), size - 1)
+        keep = (question_ids[positions] == rows[:, 0]) & (rows[:, 2] > 0)
+        rows, positions = rows[keep], positions[keep]
+        ev = np.bincount(positions, weights=rows[:, 2], minlength=size).astype(np.int64)
+        correct = np.bincount(positions, weights=rows[:, 3], minlength=size).astype(np.int64)
+        # Con contadores repartidos hay varias filas por (grupo, pregunta): se cuentan pares distintos
+        pairs = np.unique(np.stack([positions, rows[:, 1]], axis=1), axis=0)
+        groups = np.bincount(pairs[:, 0], minlength=size)
+
+    total_ev = ev.sum()
+    mean = correct.sum() / total_ev if total_ev else 0.5
+    strength = getattr(settings, 'EXAM_DIFFICULTY_PRIOR_STRENGTH', 10)
+    p = (correct + strength * mean) / (ev + strength)
+    half_width = Z_95 * np.sqrt(p * (1 - p) / (ev + strength + 1))
+    ci_low = np.clip(p - half_width, 0, 1)
+    ci_high = np.clip(p + half_width, 0, 1)
+    discrimination = _discrimination(question_ids)
+    return {
+        'question_ids': question_ids,
+        'attempts': ev,
+        'correct': correct,
+        'groups': groups,
+        'p_value': p,
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'discrimination': discrimination,
+        'flag': _flags(ev, correct, ci_low, ci_high, discrimination),
+    }
+
+
+def refresh() -> int:
+    """Recalcula y sustituye la tabla QuestionStats. Devuelve el número de preguntas."""
+    stats = compute()
+    now = timezone.now()
+    objects = [
+        QuestionStats(
+            question_id=int(question_id),
+            attempts=int(stats['attempts'][i]),
+            correct=int(stats['correct'][i]),
+            groups=int(stats['groups'][i]),
+            p_value=round(float(stats['p_value'][i]), 4),
+            ci_low=round(float(stats['ci_low'][i]), 4),
+            ci_high=round(float(stats['ci_high'][i]), 4),
+            discrimination=None if np.isnan(stats['discrimination'][i]) else round(float(stats['discrimination'][i]), 4),
+            flag=str(stats['flag'][i]),
+            computed_at=now,
+        )
+        for i, question_id in enumerate(stats['question_ids'])
+    ]
+    with transaction.atomic():
+        QuestionStats.objects.all().delete()
+        QuestionStats.objects.bulk_create(objects, batch_size=1000)
+    return len(objects)
+
+
+def summary() -> dict:
+    """Preguntas por aviso y fecha del último cálculo."""
+    flags = dict(QuestionStats.objects.values_list('flag').annotate(total=Count('pk')).order_by())
+    last = QuestionStats.objects.order_by('-computed_at').values_list('computed_at', flat=True).first()
+    return {
+        'computed_at': last,
+        'total': sum(flags.values()),
+        'flags': {value: flags.get(value, 0) for value, _ in QuestionStats.FLAGS},
+    }
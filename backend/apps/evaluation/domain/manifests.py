@@ -0,0 +1,75 @@
+"""
+Manifiestos firmados de examen.
+
+Al generar un examen se firma (HMAC con SECRET_KEY) un manifiesto compacto con
+los ids de las preguntas, la clave de respuestas hasheada, el grupo y la hora
+de emisión. Al corregir, si el manifiesto es válido se puntúa con él sin leer
+Question ni Answer de la BD.
+
+El manifiesto viaja al cliente y su contenido es legible (firmar no es cifrar),
+por eso las respuestas no van en claro: cada id de respuesta se guarda como un
+HMAC truncado que depende de un nonce propio del manifiesto.
+"""
+import secrets
+from typing import Iterable
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.utils.crypto import salted_hmac
+
+SALT = 'apps.evaluation.exam-manifest'
+HEADER = 'X-Exam-Manifest'
+SEED_HEADER = 'X-Exam-Seed'
+
+
+def _answer_hash(nonce: str, question_id: int, answer_id: int) -> str:
+    return salted_hmac(SALT, f'{nonce}:{question_id}:{answer_id}').hexdigest()[:10]
+
+
+def sign_exam(answer_keys: Iterable[tuple[int, Iterable[tuple[int, bool]]]], group_id: int = None, seed: int = None) -> str:
+    """
+    Firma el manifiesto de un examen a partir de [(question_id, [(answer_id, is_correct), ...]), ...].
+    Guarda también la semilla con la que se generó, para poder reproducirlo.
+    """
+    nonce = secrets.token_hex(4)
+    entries = []
+    for question_id, answers in answer_keys:
+        correct, wrong = [], []
+        for answer_id, is_correct in answers:
+            (correct if is_correct else wrong).append(_answer_hash(nonce, question_id, answer_id))
+        entries.append([question_id, correct, wrong])
+    payload = {'g': group_id, 'n': nonce, 's': seed, 'q': entries}
+    return signing.TimestampSigner(salt=SALT).sign_object(payload, compress=True)
+
+
+def grade(manifest: str, answers: dict[int, int], group_id: int) -> list[tuple[int, bool]] | None:
+    """
+    Corrige las respuestas {question_id: answer_id} con el manifiesto. Devuelve
+    None si el manifiesto no es válido, ha caducado, es de otro grupo o no
+    incluye alguna de las preguntas: en esos casos se corrige contra la BD.
+    """
+    try:
+        payload = signing.TimestampSigner(salt=SALT).unsign_object(
+            manifest, max_age=getattr(settings, 'EXAM_MANIFEST_MAX_AGE', 4 * 3600)
+        )
+    except signing.BadSignature:
+        return None
+    if payload['g'] is not None and payload['g'] != group_id:
+        return None
+
+    nonce = payload['n']
+    keys = {question_id: (set(correct), set(wrong)) for question_id, correct, wrong in payload['q']}
+    graded = []
+    for question_id, answer_id in answers.items():
+        if question_id not in keys:
+            return None
+        correct, wrong = keys[question_id]
+        answer_hash = _answer_hash(nonce, question_id, answer_id)
+        if answer_hash in correct:
+            graded.append((question_id, True))
+        elif answer_hash in wrong:
+            graded.append((question_id, False))
+        else:
+            raise ValidationError("La respuesta proporcionada no pertenece a la pregunta dada.")
+    return graded
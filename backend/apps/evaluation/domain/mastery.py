@@ -0,0 +1,153 @@
+"""
+Dominio de cada concepto por grupo (el «hexágono» de la app de alumnos).
+
+Los intentos y aciertos de cada grupo en cada concepto están precalculados en
+GroupConceptRollup, que se mantiene en el mismo lote que los agregados de
+analíticas (rollups): cada volcado de rollups le suma los deltas (grupo,
+concepto, intentos, aciertos) de los lotes de contadores, y los cambios de
+conceptos de una pregunta y los borrados de contadores se los restan. Nunca se
+recalcula el vector entero ni se guarda por proceso, así que todos los workers
+leen el mismo.
+
+El vector de un grupo son los conceptos de su asignatura (vía
+SubjectIsAboutTopic y TopicIsAboutConcept) con sus filas de la tabla: una sola
+consulta indexada, sin agregar nada al abrir la pantalla.
+
+El dominio de un concepto es su proporción de aciertos suavizada con una prior
+Beta centrada en el acierto global del grupo y con peso
+GROUP_MASTERY_PRIOR_STRENGTH; los conceptos sin evaluaciones salen con esa
+media. Se devuelven los N conceptos más evaluados.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from apps.courses.api.models import SubjectIsAboutTopic
+from apps.evaluation.api.models import GroupConceptRollup
+
+# (group_id, concept_id) -> [attempts, correct]
+Deltas = dict[tuple[int, int], list[int]]
+
+
+def write(deltas: Deltas) -> None:
+    """Suma los deltas (pueden ser negativos) creando las filas que falten. Se llama dentro de la transacción de rollups."""
+    rows = sorted((key, totals) for key, totals in deltas.items() if totals[0] or totals[1])
+    if not rows:
+        return
+    if connection.vendor == 'postgresql':
+        _upsert_postgresql(rows)
+    else:
+        _upsert_bulk_create(rows)
+
+
+def _upsert_postgresql(rows) -> None:
+    table = GroupConceptRollup._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+    params = []
+    for (group_id, concept_id), (attempts, correct) in rows:
+        params.extend([group_id, concept_id, attempts, correct])
+    sql = f"""
+        INSERT INTO {table} AS t (group_id, concept_id, attempts, correct)
+        VALUES {values}
+        ON CONFLICT (group_id, concept_id) DO UPDATE SET
+            attempts = t.attempts + EXCLUDED.attempts,
+            correct = t.correct + EXCLUDED.correct
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _upsert_bulk_create(rows) -> None:
+    # Igual que en counters: se leen los valores actuales para sumar
+    current = {
+        (group_id, concept_id): (attempts, correct)
+        for group_id, concept_id, attempts, correct in (
+            GroupConceptRollup.objects
+            .select_for_update()
+            .filter(group_id__in={key[0] for key, _ in rows}, concept_id__in={key[1] for key, _ in rows})
+            .values_list('group_id', 'concept_id', 'attempts', 'correct')
+        )
+    }
+    objs = []
+    for key, (attempts, correct) in rows:
+        old_attempts, old_correct = current.get(key, (0, 0))
+        objs.append(GroupConceptRollup(
+            group_id=key[0], concept_id=key[1],
+            attempts=old_attempts + attempts, correct=old_correct + correct,
+        ))
+    GroupConceptRollup.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=['group', 'concept'],
+        update_fields=['attempts', 'correct'],
+    )
+
+
+def replace(deltas: Deltas) -> None:
+    """Sustituye toda la tabla por `deltas` (rollups.rebuild, dentro de su transacción)."""
+    GroupConceptRollup.objects.all().delete()
+    GroupConceptRollup.objects.bulk_create(
+        [
+            GroupConceptRollup(group_id=group_id, concept_id=concept_id, attempts=attempts, correct=correct)
+            for (group_id, concept_id), (attempts, correct) in deltas.items()
+            if attempts or correct
+        ],
+        batch_size=2000,
+    )
+
+
+def get_vector(group) -> dict:
+    """Vector de conceptos de la asignatura del grupo con sus evaluaciones y aciertos (una consulta)."""
+    totals = GroupConceptRollup.objects.filter(group_id=group.id, concept_id=OuterRef('topic__topicisaboutconcept__concept_id'))
+    rows = (
+        SubjectIsAboutTopic.objects
+        .filter(subject_id=group.subject_id, topic__topicisaboutconcept__concept__old=False)
+        .order_by('order_id', 'topic__topicisaboutconcept__order_id', 'topic__topicisaboutconcept__concept_id')
+        .annotate(
+            attempts=Coalesce(Subquery(totals.values('attempts')), Value(0)),
+            correct=Coalesce(Subquery(totals.values('correct')), Value(0)),
+        )
+        .values_list(
+            'topic__topicisaboutconcept__concept_id',
+            'topic__topicisaboutconcept__concept__name_es',
+            'topic__topicisaboutconcept__concept__name_en',
+            'attempts',
+            'correct',
+        )
+    )
+    # Un concepto puede estar en varios temas: se queda en su primera aparición
+    unique = {}
+    for row in rows:
+        unique.setdefault(row[0], row)
+    concepts = list(unique.values())
+    return {
+        'concept_ids': [row[0] for row in concepts],
+        'names': {'es': [row[1] for row in concepts], 'en': [row[2] for row in concepts]},
+        'attempts': [row[3] for row in concepts],
+        'correct': [row[4] for row in concepts],
+    }
+
+
+def top(vector: dict, limit: int, lang: str = 'es') -> list[dict]:
+    """Los `limit` conceptos más evaluados con su dominio (porcentaje suavizado)."""
+    attempts = np.asarray(vector['attempts'], dtype=float)
+    correct = np.asarray(vector['correct'], dtype=float)
+    total = attempts.sum()
+    mean = correct.sum() / total if total else 0.5
+    strength = getattr(settings, 'GROUP_MASTERY_PRIOR_STRENGTH', 5)
+    mastery = (correct + strength * mean) / (attempts + strength) * 100
+    # Estable: a igualdad de evaluaciones se respeta el orden de la asignatura
+    order = np.argsort(-attempts, kind='stable')[:limit]
+    names = vector['names'].get(lang, vector['names']['es'])
+    return [
+        {
+            'id': vector['concept_ids'][i],
+            'name': names[i],
+            'mastery': round(float(mastery[i]), 2),
+            'attempts': int(attempts[i]),
+            'correct': int(correct[i]),
+        }
+        for i in order.tolist()
+    ]
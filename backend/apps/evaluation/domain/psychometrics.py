@@ -0,0 +1,144 @@
+"""
+Estadísticas psicométricas a partir de los exámenes guardados (ExamAttempt).
+
+Todo se calcula sobre el formato largo de AttemptMatrix con operaciones de
+NumPy (bincount, percentile), sin recorrer los exámenes uno a uno:
+
+  - Histograma y percentiles de la nota en porcentaje.
+  - Por pregunta: proporción de aciertos (p) y discriminación punto-biserial
+    corregida, es decir, la correlación entre acertar la pregunta y la nota
+    del resto del examen.
+  - Fiabilidad: alfa de Cronbach para ítems dicotómicos (KR-20). Como cada
+    examen saca preguntas distintas, se calcula con los exámenes de la
+    longitud más habitual y la suma de p·q de las preguntas de cada uno.
+"""
+import numpy as np
+
+from apps.evaluation.api.models import QuestionBelongsToTopic
+from apps.evaluation.domain import attempts
+from apps.evaluation.domain.attempts import AttemptMatrix
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10
+# Respuestas mínimas de una pregunta para dar su discriminación
+MIN_ITEM_ANSWERS = 5
+
+
+def item_statistics(matrix: AttemptMatrix) -> dict[str, np.ndarray]:
+    """Por pregunta: ids, número de respuestas, proporción de aciertos y punto-biserial corregida."""
+    question_ids, item = np.unique(matrix.question_ids, return_inverse=True)
+    x = matrix.correct.astype(float)
+    # Nota del resto del examen (sin la propia pregunta), en proporción
+    marks = matrix.marks()
+    rest_length = (matrix.lengths[matrix.attempt] - 1).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        y = np.where(rest_length > 0, (marks[matrix.attempt] - x) / rest_length, np.nan)
+    valid = ~np.isnan(y)
+    x, y, item_valid = x[valid], y[valid], item[valid]
+
+    size = len(question_ids)
+    n = np.bincount(item_valid, minlength=size).astype(float)
+    sx = np.bincount(item_valid, weights=x, minlength=size)
+    sy = np.bincount(item_valid, weights=y, minlength=size)
+    sxy = np.bincount(item_valid, weights=x * y, minlength=size)
+    syy = np.bincount(item_valid, weights=y * y, minlength=size)
+    # x es 0/1, así que la suma de x² es la suma de x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = n * sxy - sx * sy
+        variance = (n * sx - sx ** 2) * (n * syy - sy ** 2)
+        point_biserial = np.where((variance > 0) & (n >= MIN_ITEM_ANSWERS), covariance / np.sqrt(variance), np.nan)
+
+    answers = np.bincount(item, minlength=size)
+    p = np.bincount(item, weights=matrix.correct, minlength=size) / np.maximum(answers, 1)
+    return {'question_ids': question_ids, 'answers': answers, 'p': p, 'point_biserial': point_biserial}
+
+
+def cronbach_alpha(matrix: AttemptMatrix) -> float | None:
+    """KR-20 con los exámenes de la longitud más habitual; None si no hay datos suficientes."""
+    if not matrix.size:
+        return None
+    k = int(np.bincount(matrix.lengths).argmax())
+    selected = matrix.lengths == k
+    if k < 2 or selected.sum() < 2:
+        return None
+    marks = matrix.marks()[selected]
+    variance = marks.var()
+    if variance == 0:
+        return None
+    _, item = np.unique(matrix.question_ids, return_inverse=True)
+    answers = np.bincount(item)
+    p = np.bincount(item, weights=matrix.correct) / answers
+    # Suma de p·q de las preguntas de cada examen seleccionado, promediada
+    in_selected = selected[matrix.attempt]
+    pq = np.bincount(matrix.attempt[in_selected], weights=(p * (1 - p))[item[in_selected]], minlength=matrix.size)[selected]
+    return float(k / (k - 1) * (1 - pq.mean() / variance))
+
+
+def summarize(matrix: AttemptMatrix) -> dict:
+    """Histograma, percentiles, fiabilidad y estadísticas por pregunta de un conjunto de exámenes."""
+    if not matrix.size:
+        return {'attempts': 0, 'histogram': [], 'percentiles': {}, 'alpha': None, 'items': []}
+    scores = matrix.marks() / matrix.lengths * 100
+    counts, edges = np.histogram(scores, bins=HISTOGRAM_BINS, range=(0, 100))
+    items = item_statistics(matrix)
+    return {
+        'attempts': matrix.size,
+        'histogram': [
+            {'from': float(edges[i]), 'to': float(edges[i + 1]), 'count': int(counts[i])} for i in range(len(counts))
+        ],
+        'percentiles': {str(q): round(float(value), 2) for q, value in zip(PERCENTILES, np.percentile(scores, PERCENTILES))},
+        'alpha': cronbach_alpha(matrix),
+        'items': [
+            {
+                'question_id': int(question_id),
+                'answers': int(answers),
+                'p': round(float(p), 4),
+                'point_biserial': None if np.isnan(r) else round(float(r), 4),
+            }
+            for question_id, answers, p, r in zip(
+                items['question_ids'], items['answers'], items['p'], items['point_biserial']
+            )
+        ],
+    }
+
+
+def by_group(matrix: AttemptMatrix) -> dict[int, dict]:
+    """Resumen de cada grupo."""
+    results = {}
+    for group_id in np.unique(matrix.group_ids).tolist():
+        keep = np.flatnonzero(matrix.group_ids == group_id)
+        results[group_id] = summarize(_select_attempts(matrix, keep))
+    return results
+
+
+def by_topic(matrix: AttemptMatrix, topic_ids: list[int] = None) -> dict[int, dict]:
+    """Resumen de cada tema, contando en cada examen solo las preguntas del tema."""
+    links = QuestionBelongsToTopic.objects.all()
+    if topic_ids is not None:
+        links = links.filter(topic_id__in=topic_ids)
+    questions_by_topic = {}
+    for topic_id, question_id in links.values_list('topic_id', 'question_id'):
+        questions_by_topic.setdefault(topic_id, []).append(question_id)
+    return {
+        topic_id: summarize(matrix.restrict(question_ids))
+        for topic_id, question_ids in sorted(questions_by_topic.items())
+    }
+
+
+def _select_attempts(matrix: AttemptMatrix, keep: np.ndarray) -> AttemptMatrix:
+    mask = np.isin(matrix.attempt, keep)
+    remap = np.full(matrix.size, -1, dtype=np.int64)
+    remap[keep] = np.arange(len(keep))
+    return AttemptMatrix(
+        matrix.group_ids[keep], matrix.lengths[keep], remap[matrix.attempt[mask]],
+        matrix.question_ids[mask], matrix.correct[mask],
+    )
+
+
+def compute(group_ids: list[int] = None, topic_ids: list[int] = None, since=None) -> dict:
+    """Trabajo por lotes: lee los exámenes una vez y resume por grupo y por tema."""
+    matrix = attempts.load(group_ids, since)
+    return {
+        'groups': by_group(matrix),
+        'topics': by_topic(matrix, topic_ids),
+    }
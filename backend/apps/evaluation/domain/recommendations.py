@@ -0,0 +1,201 @@
+"""
+Recomendaciones de repaso tras corregir un examen.
+
+A partir de las preguntas falladas se obtienen sus conceptos
+(QuestionRelatedToConcept) y se ordenan según el acierto histórico del grupo
+en cada concepto (QuestionEvaluationGroup). Se añaden también los conceptos
+vecinos (ConceptIsRelatedToConcept) de los más débiles.
+
+Las relaciones pregunta→concepto y concepto→concepto se guardan en un índice
+disperso (CSR con arrays de NumPy) precalculado en memoria, que se reconstruye
+cada EVALUATION_RECOMMENDATIONS_INDEX_TTL segundos o al cambiar el contenido.
+Cada corrección solo hace una consulta: los contadores del grupo.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from apps.content.api.models import Concept, ConceptIsRelatedToConcept, TopicIsAboutConcept
+from apps.evaluation.api.models import QuestionEvaluationGroup, QuestionRelatedToConcept
+
+# Peso de un concepto vecino respecto al concepto débil del que procede
+NEIGHBOUR_WEIGHT = 0.5
+
+MESSAGES = {
+    'es': {
+        'weak': 'Repasa el concepto «{concept}» del tema «{topic}».',
+        'weak_no_topic': 'Repasa el concepto «{concept}».',
+        'neighbour': 'Repasa también «{concept}» del tema «{topic}», relacionado con lo que has fallado.',
+        'neighbour_no_topic': 'Repasa también «{concept}», relacionado con lo que has fallado.',
+    },
+    'en': {
+        'weak': 'Review the concept "{concept}" in the topic "{topic}".',
+        'weak_no_topic': 'Review the concept "{concept}".',
+        'neighbour': 'Also review "{concept}" in the topic "{topic}", related to what you missed.',
+        'neighbour_no_topic': 'Also review "{concept}", related to what you missed.',
+    },
+}
+
+_lock = threading.Lock()
+_index = None
+
+
+class ConceptIndex:
+    """Índice pregunta→concepto y concepto→vecinos en formato CSR."""
+
+    def __init__(self, question_concepts, concept_rows, concept_topics, concept_links):
+        self.built_at = time.monotonic()
+
+        # Conceptos activos: posición i <-> concept_ids[i]
+        concept_rows = sorted(concept_rows)
+        self.concept_ids = np.array([row[0] for row in concept_rows], dtype=np.int64)
+        self.names = {'es': [row[1] for row in concept_rows], 'en': [row[2] for row in concept_rows]}
+        topics = {}
+        for concept_id, title_es, title_en in concept_topics:
+            topics.setdefault(concept_id, (title_es, title_en))
+        self.topics = {
+            'es': [topics.get(concept_id, (None, None))[0] for concept_id in self.concept_ids.tolist()],
+            'en': [topics.get(concept_id, (None, None))[1] for concept_id in self.concept_ids.tolist()],
+        }
+
+        pairs = self._to_positions(question_concepts)
+        self.question_ids, self.question_indptr, self.question_concepts = self._csr(pairs)
+
+        links = self._to_positions(concept_links, map_source=True)
+        # Las relaciones entre conceptos se recorren en ambos sentidos
+        both = np.concatenate([links, links[:, ::-1]]) if len(links) else links
+        self.neighbour_ids, self.neighbour_indptr, self.neighbours = self._csr(both)
+
+    @property
+    def size(self) -> int:
+        return len(self.concept_ids)
+
+    def _concept_positions(self, concept_ids: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(self.concept_ids, concept_ids)
+        positions[positions == len(self.concept_ids)] = 0
+        found = self.concept_ids[positions] == concept_ids if len(self.concept_ids) else np.zeros(len(concept_ids), bool)
+        return np.where(found, positions, -1)
+
+    def _to_positions(self, pairs, map_source: bool = False) -> np.ndarray:
+        """Convierte pares (clave, concept_id) en (clave, posición) descartando conceptos inactivos."""
+        array = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+        array[:, 1] = self._concept_positions(array[:, 1])
+        if map_source:
+            array[:, 0] = self._concept_positions(array[:, 0])
+            array = array[array[:, 0] >= 0]
+        return array[array[:, 1] >= 0]
+
+    @staticmethod
+    def _csr(pairs: np.ndarray):
+        """(claves únicas ordenadas, indptr, valores) a partir de pares (clave, valor)."""
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))] if len(pairs) else pairs
+        keys, counts = np.unique(pairs[:, 0], return_counts=True)
+        indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return keys, indptr, pairs[:, 1].copy()
+
+    @staticmethod
+    def _expand(keys, indptr, values, lookup: np.ndarray, weights: np.ndarray = None):
+        """Filas de `lookup` concatenadas (y sus pesos repetidos), sin bucles de Python."""
+        rows = np.searchsorted(keys, lookup)
+        rows[rows == len(keys)] = 0
+        found = keys[rows] == lookup if len(keys) else np.zeros(len(lookup), bool)
+        rows = rows[found]
+        starts = indptr[rows]
+        lengths = indptr[rows + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        repeated = np.repeat(weights[found], lengths) if weights is not None else None
+        return values[offsets], repeated
+
+    def concepts_of_questions(self, question_ids: np.ndarray, weights: np.ndarray = None):
+        return self._expand(self.question_ids, self.question_indptr, self.question_concepts, question_ids, weights)
+
+    def neighbours_of(self, positions: np.ndarray, weights: np.ndarray = None):
+        return self._expand(self.neighbour_ids, self.neighbour_indptr, self.neighbours, positions, weights)
+
+
+def _build_index() -> ConceptIndex:
+    return ConceptIndex(
+        question_concepts=QuestionRelatedToConcept.objects.values_list('question_id', 'concept_id'),
+        concept_rows=Concept.objects.filter(old=False).values_list('id', 'name_es', 'name_en'),
+        concept_topics=(
+            TopicIsAboutConcept.objects
+            .filter(topic__old=False)
+            .order_by('order_id', 'id')
+            .values_list('concept_id', 'topic__title_es', 'topic__title_en')
+        ),
+        concept_links=ConceptIsRelatedToConcept.objects.values_list('concept_from_id', 'concept_to_id'),
+    )
+
+
+def get_index() -> ConceptIndex:
+    global _index
+    ttl = getattr(settings, 'EVALUATION_RECOMMENDATIONS_INDEX_TTL', 300)
+    with _lock:
+        index = _index
+    if index is None or time.monotonic() - index.built_at >= ttl:
+        index = _build_index()
+        with _lock:
+            _index = index
+    return index
+
+
+def invalidate_index(**kwargs) -> None:
+    """Descarta el índice precalculado. Se conecta a las señales de conceptos y preguntas."""
+    global _index
+    with _lock:
+        _index = None
+
+
+def _group_accuracy(index: ConceptIndex, group_id: int) -> np.ndarray:
+    """Acierto histórico del grupo por concepto, suavizado con (aciertos + 1) / (evaluaciones + 2)."""
+    rows = np.array(
+        list(QuestionEvaluationGroup.objects.filter(group_id=group_id).values_list('question_id', 'ev_count', 'correct_count')),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    ev = np.zeros(index.size)
+    correct = np.zeros(index.size)
+    concepts, ev_weights = index.concepts_of_questions(rows[:, 0], rows[:, 1])
+    ev += np.bincount(concepts, weights=ev_weights, minlength=index.size)
+    concepts, correct_weights = index.concepts_of_questions(rows[:, 0], rows[:, 2])
+    correct += np.bincount(concepts, weights=correct_weights, minlength=index.size)
+    return (correct + 1) / (ev + 2)
+
+
+def recommend(group_id: int, graded: list[tuple[int, bool]], lang: str = 'es') -> list[str]:
+    """Recomendaciones localizadas para las preguntas falladas de una corrección."""
+    failed = np.array([question_id for question_id, is_correct in graded if not is_correct], dtype=np.int64)
+    if not len(failed):
+        return []
+    index = get_index()
+    if not index.size:
+        return []
+
+    failed_concepts, _ = index.concepts_of_questions(failed)
+    if not len(failed_concepts):
+        return []
+    failures = np.bincount(failed_concepts, minlength=index.size).astype(float)
+    weakness = 1 - _group_accuracy(index, group_id)
+
+    weak_scores = failures * weakness
+    weak = np.flatnonzero(weak_scores)
+    neighbours, propagated = index.neighbours_of(weak, weak_scores[weak] * NEIGHBOUR_WEIGHT)
+    neighbour_scores = np.bincount(neighbours, weights=propagated, minlength=index.size) * weakness
+    # Un concepto fallado directamente no se repite como vecino
+    neighbour_scores[weak] = 0
+
+    limit = getattr(settings, 'EVALUATION_RECOMMENDATIONS_MAX', 5)
+    scores = np.concatenate([weak_scores, neighbour_scores])
+    ranked = np.argsort(-scores, kind='stable')[:limit]
+
+    messages = MESSAGES.get(lang, MESSAGES['es'])
+    recommendations = []
+    for position in ranked[scores[ranked] > 0].tolist():
+        kind = 'weak' if position < index.size else 'neighbour'
+        concept = position % index.size
+        topic = index.topics[lang][concept]
+        template = messages[kind] if topic else messages[f'{kind}_no_topic']
+        recommendations.append(template.format(concept=index.names[lang][concept], topic=topic))
+    return recommendations
@@ -0,0 +1,401 @@
+"""
+Tablas de agregados (AnalyticsRollup) para /analytics/performance/.
+
+En lugar de agregar QuestionEvaluationGroup con joins de varios saltos
+(pregunta → temas, pregunta → conceptos, grupo → asignatura) en cada carga
+del panel, se mantienen los totales (intentos y aciertos) por tema, concepto,
+grupo, asignatura y pregunta, tanto globales (subject_id = 0) como por
+asignatura. Así el panel lee unas pocas filas indexadas y su coste no depende
+del número de contadores.
+
+Cada lote de contadores (counters.apply_increments) reparte sus incrementos
+entre las dimensiones y los totales por grupo y concepto del hexágono
+(mastery) con una lectura de enlaces en su transacción, pero no escribe las
+filas compartidas ahí: al confirmarse, los deltas quedan pendientes en el
+proceso y un hilo los vuelca juntos cada ANALYTICS_ROLLUP_FLUSH_INTERVAL
+segundos (un upsert por tabla y un solo cambio de versión de analíticas por
+volcado; con 0, en cada confirmación). Los deltas pendientes de un proceso que
+cae se pierden y un borrado que llegue antes de su volcado puede dejar la fila
+de una pregunta o grupo borrados: el comando rebuild_analytics_rollups las
+recalcula desde cero. Los cambios de temas o conceptos de una pregunta y los
+borrados se corrigen por señales.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Sum, Value
+
+from apps.content.api.models import Concept, Topic
+from apps.courses.api.models import StudentGroup, Subject
+from apps.evaluation.api.models import (
+    AnalyticsRollup, Question, QuestionBelongsToTopic, QuestionEvaluationGroup, QuestionRelatedToConcept,
+)
+from apps.evaluation.domain import analytics_cache, difficulty, mastery
+
+logger = logging.getLogger(__name__)
+
+ALL_SUBJECTS = 0
+DIMENSIONS = [dimension for dimension, _ in AnalyticsRollup.DIMENSIONS]
+# Modelo y prefijo del campo traducido con el nombre de cada dimensión
+LABELS = {
+    'topic': (Topic, 'title'),
+    'concept': (Concept, 'name'),
+    'group': (StudentGroup, 'name'),
+    'subject': (Subject, 'name'),
+    'question': (Question, 'statement'),
+}
+
+# (subject_id, dimension, key_id) -> [attempts, correct]
+Deltas = dict[tuple[int, str, int], list[int]]
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_pending: Deltas = defaultdict(lambda: [0, 0])
+_pending_groups: mastery.Deltas = defaultdict(lambda: [0, 0])
+_flusher = None
+
+
+def _add(deltas: Deltas, subject_id: int, dimension: str, key_id: int, attempts: int, correct: int) -> None:
+    for subject in (ALL_SUBJECTS, subject_id) if subject_id else (ALL_SUBJECTS,):
+        totals = deltas[(subject, dimension, key_id)]
+        totals[0] += attempts
+        totals[1] += correct
+
+
+def deltas_for(counts: dict[tuple[int, int], tuple[int, int]], topics=None, concepts=None) -> tuple[Deltas, mastery.Deltas]:
+    """
+    Reparte totales {(group_id, question_id): (intentos, aciertos)} entre las
+    dimensiones y entre los pares (grupo, concepto) de mastery. Los temas y
+    conceptos de cada pregunta se leen de la BD salvo que se pasen (`topics` /
+    `concepts` como {question_id: [ids]}).
+    """
+    question_ids = {question_id for _, question_id in counts}
+    group_ids = {group_id for group_id, _ in counts}
+    # Temas y conceptos de las preguntas y asignatura de los grupos en una sola consulta
+    links = {'topic': defaultdict(list), 'concept': defaultdict(list)}
+    subjects = {}
+    groups = StudentGroup.objects.filter(id__in=group_ids).annotate(dimension=Value('subject')).values_list('dimension', 'id', 'subject_id')
+    others = []
+    if topics is None:
+        others.append(
+            QuestionBelongsToTopic.objects.filter(question_id__in=question_ids)
+            .annotate(dimension=Value('topic')).values_list('dimension', 'question_id', 'topic_id')
+        )
+    if concepts is None:
+        others.append(
+            QuestionRelatedToConcept.objects.filter(question_id__in=question_ids)
+            .annotate(dimension=Value('concept')).values_list('dimension', 'question_id', 'concept_id')
+        )
+    rows = groups.union(*others, all=True) if others else groups
+    for dimension, owner_id, key_id in rows:
+        if dimension == 'subject':
+            subjects[owner_id] = key_id
+        else:
+            links[dimension][owner_id].append(key_id)
+    topics = links['topic'] if topics is None else topics
+    concepts = links['concept'] if concepts is None else concepts
+
+    deltas = defaultdict(lambda: [0, 0])
+    group_deltas = defaultdict(lambda: [0, 0])
+    for (group_id, question_id), (attempts, correct) in counts.items():
+        subject_id = subjects.get(group_id)
+        _add(deltas, subject_id, 'group', group_id, attempts, correct)
+        _add(deltas, subject_id, 'question', question_id, attempts, correct)
+        if subject_id:
+            _add(deltas, subject_id, 'subject', subject_id, attempts, correct)
+        for topic_id in topics.get(question_id, ()):
+            _add(deltas, subject_id, 'topic', topic_id, attempts, correct)
+        for concept_id in concepts.get(question_id, ()):
+            _add(deltas, subject_id, 'concept', concept_id, attempts, correct)
+            totals = group_deltas[(group_id, concept_id)]
+            totals[0] += attempts
+            totals[1] += correct
+    return deltas, group_deltas
+
+
+def _merge(into: dict, deltas: dict) -> None:
+    for key, (attempts, correct) in deltas.items():
+        totals = into[key]
+        totals[0] += attempts
+        totals[1] += correct
+
+
+def record(increments) -> None:
+    """
+    Reparte los incrementos de counters.apply_increments con los enlaces de su
+    transacción y deja los deltas pendientes de volcado al confirmarse (las
+    que se deshacen no cuentan).
+    """
+    counts = defaultdict(lambda: [0, 0])
+    for (group_id, question_id, shard), (ev_count, correct_count) in increments.items():
+        totals = counts[(group_id, question_id)]
+        totals[0] += ev_count
+        totals[1] += correct_count
+    deltas, group_deltas = deltas_for(counts)
+    transaction.on_commit(lambda: _queue(deltas, group_deltas))
+
+
+def _queue(deltas: Deltas, group_deltas: mastery.Deltas) -> None:
+    with _lock:
+        _merge(_pending, deltas)
+        _merge(_pending_groups, group_deltas)
+    if getattr(settings, 'ANALYTICS_ROLLUP_FLUSH_INTERVAL', 5) > 0:
+        _start_flusher()
+        return
+    try:
+        flush()
+    except Exception:
+        # La corrección ya está confirmada: los deltas siguen pendientes para el siguiente volcado
+        logger.exception('No se pudieron volcar los agregados de analíticas; se reintentará')
+
+
+def pending_count() -> int:
+    with _lock:
+        return len(_pending) + len(_pending_groups)
+
+
+def flush() -> None:
+    """Vuelca en una transacción los deltas pendientes del proceso. Si falla, se quedan pendientes."""
+    global _pending, _pending_groups
+    with _flush_lock:
+        with _lock:
+            deltas, _pending = _pending, defaultdict(lambda: [0, 0])
+            group_deltas, _pending_groups = _pending_groups, defaultdict(lambda: [0, 0])
+        if not deltas and not group_deltas:
+            return
+        try:
+            apply(deltas, group_deltas)
+        except Exception:
+            with _lock:
+                _merge(_pending, deltas)
+                _merge(_pending_groups, group_deltas)
+            raise
+
+
+def _start_flusher() -> None:
+    global _flusher
+    with _lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(getattr(settings, 'ANALYTICS_ROLLUP_FLUSH_INTERVAL', 5))
+                close_old_connections()
+                try:
+                    flush()
+                except Exception:
+                    logger.exception('No se pudieron volcar los agregados de analíticas; se reintentará')
+                finally:
+                    close_old_connections()
+
+        _flusher = threading.Thread(target=run, name='analytics-rollup-flush', daemon=True)
+        _flusher.start()
+
+
+def _flush_at_exit() -> None:
+    try:
+        flush()
+    except Exception:
+        logger.exception('No se pudieron volcar los agregados de analíticas al terminar el proceso')
+
+
+atexit.register(_flush_at_exit)
+
+
+def apply(deltas: Deltas, group_deltas: mastery.Deltas = None, reset: bool = False) -> None:
+    """Suma los deltas (pueden ser negativos) creando las filas que falten. `reset` para los que vienen de borrados."""
+    with transaction.atomic():
+        _write(deltas, group_deltas, reset)
+
+
+def _changed(reset: bool = False) -> None:
+    # Los resultados guardados de /analytics/performance/ caducan al confirmarse la transacción;
+    # tras un borrado o una reconstrucción ya no se sirven mientras se recalculan
+    transaction.on_commit(lambda: analytics_cache.bump_version(reset))
+
+
+def _write(deltas: Deltas, group_deltas: mastery.Deltas = None, reset: bool = False) -> None:
+    mastery.write(group_deltas or {})
+    rows = sorted((key, totals) for key, totals in deltas.items() if totals[0] or totals[1])
+    if not rows:
+        return
+    if connection.vendor == 'postgresql':
+        _upsert_postgresql(rows)
+    else:
+        _upsert_bulk_create(rows)
+    _changed(reset)
+
+
+def _upsert_postgresql(rows) -> None:
+    table = AnalyticsRollup._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+    params = []
+    for (subject_id, dimension, key_id), (attempts, correct) in rows:
+        params.extend([subject_id, dimension, key_id, attempts, correct])
+    sql = f"""
+        INSERT INTO {table} AS t (subject_id, dimension, key_id, attempts, correct)
+        VALUES {values}
+        ON CONFLICT (subject_id, dimension, key_id) DO UPDATE SET
+            attempts = t.attempts + EXCLUDED.attempts,
+            correct = t.correct + EXCLUDED.correct
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _upsert_bulk_create(rows) -> None:
+    # Igual que en counters: se leen los valores actuales para sumar
+    current = {}
+    dimensions = {key[1] for key, _ in rows}
+    key_ids = {key[2] for key, _ in rows}
+    for subject_id, dimension, key_id, attempts, correct in (
+        AnalyticsRollup.objects
+        .select_for_update()
+        .filter(dimension__in=dimensions, key_id__in=key_ids)
+        .values_list('subject_id', 'dimension', 'key_id', 'attempts', 'correct')
+    ):
+        current[(subject_id, dimension, key_id)] = (attempts, correct)
+    objs = []
+    for key, (attempts, correct) in rows:
+        old_attempts, old_correct = current.get(key, (0, 0))
+        objs.append(AnalyticsRollup(
+            subject_id=key[0], dimension=key[1], key_id=key[2],
+            attempts=old_attempts + attempts, correct=old_correct + correct,
+        ))
+    AnalyticsRollup.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=['subject_id', 'dimension', 'key_id'],
+        update_fields=['attempts', 'correct'],
+    )
+
+
+def _totals(queryset) -> dict[tuple[int, int], tuple[int, int]]:
+    return {
+        (group_id, question_id): (attempts, correct)
+        for group_id, question_id, attempts, correct in (
+            queryset.values('group_id', 'question_id')
+            .annotate(attempts=Sum('ev_count'), correct=Sum('correct_count'))
+            .values_list('group_id', 'question_id', 'attempts', 'correct')
+        )
+    }
+
+
+def subtract(queryset) -> None:
+    """Resta de los agregados los contadores de `queryset` (antes de borrarlos)."""
+    counts = {key: (-attempts, -correct) for key, (attempts, correct) in _totals(queryset).items()}
+    if counts:
+        apply(*deltas_for(counts), reset=True)
+
+
+def relink(question_id: int, dimension: str, key_id: int, sign: int) -> None:
+    """Suma (sign=1) o resta (sign=-1) los totales de una pregunta a un tema o concepto al enlazarla o desenlazarla."""
+    counts = {
+        key: (sign * attempts, sign * correct)
+        for key, (attempts, correct) in _totals(QuestionEvaluationGroup.objects.filter(question_id=question_id)).items()
+    }
+    if not counts:
+        return
+    links = {question_id: [key_id]}
+    deltas, group_deltas = deltas_for(counts, topics=links if dimension == 'topic' else {}, concepts=links if dimension == 'concept' else {})
+    # Solo cambia el tema o concepto: el resto de dimensiones ya contaban la pregunta
+    apply({key: totals for key, totals in deltas.items() if key[1] == dimension}, group_deltas, reset=sign < 0)
+
+
+def top(dimension: str, subject_id: int = ALL_SUBJECTS, limit: int = None) -> list[dict]:
+    """Filas de una dimensión con intentos, ordenadas por fallos (las más falladas primero)."""
+    rows = (
+        AnalyticsRollup.objects
+        .filter(subject_id=subject_id or ALL_SUBJECTS, dimension=dimension, attempts__gt=0)
+        .annotate(failures=F('attempts') - F('correct'))
+        .order_by('-failures', 'key_id')
+        .values('key_id', 'attempts', 'correct', 'failures')
+    )
+    return list(rows[:limit] if limit else rows)
+
+
+def labels(dimension: str, ids, lang: str) -> dict[int, str]:
+    """Nombre en `lang` de cada id de la dimensión, en una consulta."""
+    model, prefix = LABELS[dimension]
+    field = f'{prefix}_{lang}'
+    return dict(model.objects.filter(id__in=ids).values_list('id', field))
+
+
+def delete_counters(queryset) -> int:
+    """Borra contadores de QuestionEvaluationGroup restándolos antes de los agregados."""
+    with transaction.atomic():
+        subtract(queryset)
+        count, _ = queryset.delete()
+        difficulty.on_counters_deleted()
+    return count
+
+
+def rebuild() -> int:
+    """Recalcula todos los agregados (y los de mastery) desde QuestionEvaluationGroup. Devuelve cuántas filas quedan."""
+    counts = _totals(QuestionEvaluationGroup.objects.all())
+    deltas, group_deltas = deltas_for(counts)
+    with transaction.atomic():
+        mastery.replace(group_deltas)
+        AnalyticsRollup.objects.all().delete()
+        AnalyticsRollup.objects.bulk_create(
+            [
+                AnalyticsRollup(subject_id=subject_id, dimension=dimension, key_id=key_id, attempts=attempts, correct=correct)
+                for (subject_id, dimension, key_id), (attempts, correct) in deltas.items()
+            ],
+            batch_size=2000,
+        )
+        _changed(reset=True)
+        difficulty.on_counters_deleted()
+    return len(deltas)
+
+
+# --- Señales ---
+
+def on_topic_link_saved(sender, instance, created, **kwargs):
+    if created:
+        relink(instance.question_id, 'topic', instance.topic_id, 1)
+
+
+def on_topic_link_deleted(sender, instance, **kwargs):
+    relink(instance.question_id, 'topic', instance.topic_id, -1)
+
+
+def on_concept_link_saved(sender, instance, created, **kwargs):
+    if created:
+        relink(instance.question_id, 'concept', instance.concept_id, 1)
+
+
+def on_concept_link_deleted(sender, instance, **kwargs):
+    relink(instance.question_id, 'concept', instance.concept_id, -1)
+
+
+def on_question_deleted(sender, instance, **kwargs):
+    """pre_delete de Question: sus contadores se borran en cascada, así que se restan antes."""
+    counters = QuestionEvaluationGroup.objects.filter(question_id=instance.id)
+    subtract(counters)
+    # Se borran ya para que el borrado en cascada de sus temas y conceptos no vuelva a restarlos
+    counters.delete()
+    AnalyticsRollup.objects.filter(dimension='question', key_id=instance.id).delete()
+    _changed(reset=True)
+
+
+def on_group_deleted(sender, instance, **kwargs):
+    subtract(QuestionEvaluationGroup.objects.filter(group_id=instance.id))
+    AnalyticsRollup.objects.filter(dimension='group', key_id=instance.id).delete()
+    _changed(reset=True)
+
+
+def on_key_deleted(dimension: str):
+    """post_delete de Topic, Concept o Subject: quita sus filas."""
+    def handler(sender, instance, **kwargs):
+        AnalyticsRollup.objects.filter(dimension=dimension, key_id=instance.id).delete()
+        if dimension == 'subject':
+            AnalyticsRollup.objects.filter(subject_id=instance.id).delete()
+        _changed(reset=True)
+    return handler
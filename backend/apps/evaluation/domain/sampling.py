@@ -0,0 +1,206 @@
+"""
+Muestreo estratificado de preguntas para la generación de exámenes.
+
+En lugar de ordenar aleatoriamente todas las preguntas de cada tema
+(ORDER BY RANDOM()), se calcula cuántas preguntas le tocan a cada tema
+con el mismo reparto round-robin de siempre y después se eligen posiciones
+aleatorias dentro de cada tema. Las posiciones se resuelven a ids de dos formas:
+
+- Con los arrays de ids por tema del almacén en memoria (exam_store), por
+  defecto. El coste por examen no depende del tamaño del banco.
+- Si EXAM_SAMPLING_CACHE_TTL es 0 y la BD es PostgreSQL, leyendo siempre de
+  la BD con ROW_NUMBER() OVER (PARTITION BY topic_id): un recorrido del índice
+  de la tabla intermedia, sin ordenación aleatoria, que devuelve solo los ids
+  elegidos.
+
+A diferencia del create_exam original, que tomaba todas las preguntas
+enlazadas al tema, solo se muestrean las preguntas vigentes (old=False).
+"""
+import random
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+
+from apps.evaluation.api.models import Question, QuestionBelongsToTopic
+from apps.evaluation.domain import difficulty, exam_store
+
+# Número máximo de rondas de relleno cuando los duplicados entre temas dejan huecos
+MAX_TOP_UP_ROUNDS = 8
+
+
+def round_robin_quotas(counts: list[int], num_questions: int) -> list[int]:
+    """
+    Calcula cuántas preguntas aporta cada tema si se reparten de una en una
+    en orden cíclico, retirando los temas que se quedan sin preguntas.
+    """
+    quotas = [0] * len(counts)
+    remaining = num_questions
+    active = [i for i, count in enumerate(counts) if count > 0]
+    while remaining > 0 and active:
+        per_topic = remaining // len(active)
+        if per_topic == 0:
+            # Última vuelta incompleta: la reciben los primeros temas en orden
+            for i in active[:remaining]:
+                quotas[i] += 1
+            break
+        still_active = []
+        for i in active:
+            take = min(per_topic, counts[i] - quotas[i])
+            quotas[i] += take
+            remaining -= take
+            if quotas[i] < counts[i]:
+                still_active.append(i)
+        active = still_active
+    return quotas
+
+
+def _draw_ranks(count: int, k: int, drawn: set[int], rng: random.Random) -> list[int]:
+    """Elige k posiciones aleatorias en [0, count) que no estén ya en `drawn`."""
+    available = count - len(drawn)
+    k = min(k, available)
+    if k <= 0:
+        return []
+    if not drawn:
+        return rng.sample(range(count), k)
+    if k * 2 < available:
+        # Muestreo por rechazo: barato mientras queden muchas posiciones libres
+        ranks = []
+        seen = set(drawn)
+        while len(ranks) < k:
+            rank = rng.randrange(count)
+            if rank not in seen:
+                seen.add(rank)
+                ranks.append(rank)
+        return ranks
+    return rng.sample([rank for rank in range(count) if rank not in drawn], k)
+
+
+# --- Arrays de ids del almacén en memoria ---
+
+class _ArrayBackend:
+    draw = staticmethod(_draw_ranks)
+
+    def __init__(self, topic_ids: list[int]):
+        self.decks = {topic_id: exam_store.get_topic_ids(topic_id) for topic_id in topic_ids}
+
+    def counts(self, topic_ids: list[int]) -> list[int]:
+        return [len(self.decks[topic_id]) for topic_id in topic_ids]
+
+    def resolve(self, topic_ranks: dict[int, list[int]]) -> dict[int, list[int]]:
+        return {
+            topic_id: [self.decks[topic_id][rank] for rank in ranks]
+            for topic_id, ranks in topic_ranks.items()
+        }
+
+
+# --- Modo adaptativo: mazos ordenados por dificultad ---
+
+class _DifficultyBackend(_ArrayBackend):
+    """Cada mazo se ordena según el modo de dificultad y se reparte desde el principio."""
+
+    def __init__(self, topic_ids: list[int], mode: str, target: float, rng: random.Random):
+        self.decks = {
+            topic_id: difficulty.order_deck(exam_store.get_topic_ids(topic_id), mode, target, rng).tolist()
+            for topic_id in topic_ids
+        }
+
+    @staticmethod
+    def draw(count: int, k: int, drawn: set[int], rng: random.Random) -> list[int]:
+        return [rank for rank in range(count) if rank not in drawn][:k]
+
+
+# --- PostgreSQL: ROW_NUMBER() por tema ---
+
+class _WindowBackend:
+    draw = staticmethod(_draw_ranks)
+
+    def counts(self, topic_ids: list[int]) -> list[int]:
+        rows = (
+            QuestionBelongsToTopic.objects
+            .filter(topic_id__in=topic_ids, question__in=exam_store.eligible_questions())
+            .values('topic_id')
+            .annotate(total=Count('id'))
+        )
+        by_topic = {row['topic_id']: row['total'] for row in rows}
+        return [by_topic.get(topic_id, 0) for topic_id in topic_ids]
+
+    def resolve(self, topic_ranks: dict[int, list[int]]) -> dict[int, list[int]]:
+        pairs = [(topic_id, rank + 1) for topic_id, ranks in topic_ranks.items() for rank in ranks]
+        if not pairs:
+            return {}
+        approved_only = 'AND q.approved' if getattr(settings, 'EXAM_APPROVED_QUESTIONS_ONLY', False) else ''
+        link_table = QuestionBelongsToTopic._meta.db_table
+        question_table = Question._meta.db_table
+        sql = f"""
+            SELECT s.topic_id, s.rn, s.question_id FROM (
+                SELECT l.topic_id, l.question_id,
+                       ROW_NUMBER() OVER (PARTITION BY l.topic_id ORDER BY l.question_id) AS rn
+                FROM {link_table} l
+                JOIN {question_table} q ON q.id = l.question_id
+                WHERE l.topic_id = ANY(%s) AND NOT q.old {approved_only}
+            ) s
+            WHERE (s.topic_id, s.rn) IN (SELECT * FROM unnest(%s::bigint[], %s::bigint[]))
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [list(topic_ranks), [p[0] for p in pairs], [p[1] for p in pairs]])
+            found = {(topic_id, rn): question_id for topic_id, rn, question_id in cursor.fetchall()}
+        # Respetamos el orden aleatorio en el que se sacaron las posiciones
+        return {
+            topic_id: [found[(topic_id, rank + 1)] for rank in ranks if (topic_id, rank + 1) in found]
+            for topic_id, ranks in topic_ranks.items()
+        }
+
+
+def _get_backend(topic_ids: list[int]):
+    if connection.vendor == 'postgresql' and not getattr(settings, 'EXAM_SAMPLING_CACHE_TTL', 60):
+        return _WindowBackend()
+    return _ArrayBackend(topic_ids)
+
+
+def sample_question_ids(topic_ids: list[int], num_questions: int, rng: random.Random = None,
+                        difficulty_mode: tuple[str, float] = None) -> list[int]:
+    """
+    Devuelve hasta `num_questions` ids de pregunta repartidos en round-robin entre
+    los temas dados (en su orden), sin duplicados aunque una pregunta esté en varios temas.
+    Con `difficulty_mode` (ver difficulty.parse_mode) dentro de cada tema se eligen
+    primero las preguntas que mejor encajan con la dificultad pedida.
+    """
+    rng = rng or random.Random()
+    topic_ids = list(dict.fromkeys(topic_ids))
+    if not topic_ids or num_questions <= 0:
+        return []
+
+    if difficulty_mode:
+        backend = _DifficultyBackend(topic_ids, *difficulty_mode, rng)
+    else:
+        backend = _get_backend(topic_ids)
+    counts = backend.counts(topic_ids)
+    drawn = {topic_id: set() for topic_id in topic_ids}
+    selected = []
+    seen = set()
+
+    for _ in range(MAX_TOP_UP_ROUNDS):
+        missing = num_questions - len(selected)
+        available = [count - len(drawn[topic_id]) for topic_id, count in zip(topic_ids, counts)]
+        quotas = round_robin_quotas(available, missing)
+        topic_ranks = {}
+        for topic_id, count, quota in zip(topic_ids, counts, quotas):
+            if quota:
+                ranks = backend.draw(count, quota, drawn[topic_id], rng)
+                drawn[topic_id].update(ranks)
+                topic_ranks[topic_id] = ranks
+        if not topic_ranks:
+            break
+
+        # Reparto cíclico de las "cartas" sacadas de cada mazo, saltando duplicados
+        decks = [deck for deck in backend.resolve(topic_ranks).values() if deck]
+        depth = max((len(deck) for deck in decks), default=0)
+        for position in range(depth):
+            for deck in decks:
+                if position < len(deck) and deck[position] not in seen:
+                    seen.add(deck[position])
+                    selected.append(deck[position])
+                    if len(selected) == num_questions:
+                        return selected
+    return selected
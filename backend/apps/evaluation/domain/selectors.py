@@ -2,11 +2,11 @@ from apps.evaluation.api.models import Answer, Question
 from apps.content.api.models import Subject, Topic
 from apps.evaluation.api.models import QuestionBelongsToTopic, TeacherMakeChangeQuestion, TeacherMakeChangeAnswer
 from django.db import models
-from apps.content.domain import selectors as content_selectors
 from apps.evaluation.api.models import QuestionEvaluationGroup
 import random
 
 from apps.courses.api.models import StudentGroup
+from apps.evaluation.domain import statistics
 
 def get_all_questions():
     return Question.objects.all().prefetch_related(
@@ -30,13 +30,8 @@ def get_question_by_topic(topic: Topic):
     ).distinct()
 
 def get_questions_by_subject(subject: Subject):
-    """Obtiene todas las preguntas asociadas a un subject dado."""
-    topics = content_selectors.get_topics_by_subject(subject.id)
-    questions = set()
-    for topic in topics:
-        topic_questions = get_question_by_topic(topic)
-        questions.update(topic_questions)
-    return questions
+    """Obtiene todas las preguntas asociadas a un subject dado (una sola consulta para todos sus temas)."""
+    return set(Question.objects.filter(topics__topic__subjects__subject_id=subject.id).distinct())
 
 def get_questions_for_topic(topic: Topic):
     """Obtiene todas las preguntas asociadas a un topic dado."""
@@ -44,28 +39,35 @@ def get_questions_for_topic(topic: Topic):
         topics__topic=topic,
     ).distinct()
 
-def get_random_question_from_topic(topic: Topic) -> Question:
-    return get_questions_for_topic(topic).order_by('?').first()
-
-def get_random_questions_from_topics(topics: list[Topic], num_questions: int) -> list[Question]:
-    """Obtiene un conjunto de preguntas aleatorias de los topics dados."""
-    questions = []
-    topic_list = list(topics)
-    random.shuffle(topic_list)
-    for topic in topics:
-        question = get_random_question_from_topic(topic)
-        if question and question not in questions:
-            questions.append(question)
-        if len(questions) >= num_questions:
-            break
-    return questions
+def get_random_question_from_topic(topic: Topic, seed: int = None) -> Question:
+    questions = get_random_questions_from_topics([topic], 1, seed=seed)
+    return questions[0] if questions else None
+
+def get_random_questions_from_topics(topics: list[Topic], num_questions: int, seed: int = None) -> list[Question]:
+    """Obtiene un conjunto de preguntas aleatorias de los topics dados. Con `seed` el resultado es reproducible."""
+    from apps.evaluation.domain import sampling
+    question_ids = sampling.sample_question_ids([topic.id for topic in topics], num_questions, random.Random(seed))
+    questions = Question.objects.in_bulk(question_ids)
+    return [questions[question_id] for question_id in question_ids if question_id in questions]
 
 def get_question_evaluation_group(question: Question, group: StudentGroup) -> QuestionEvaluationGroup:
-    """Obtiene la evaluación de una pregunta para un grupo específico."""
-    try:
-        return QuestionEvaluationGroup.objects.get(question=question, group=group)
-    except QuestionEvaluationGroup.DoesNotExist:
+    """
+    Obtiene la evaluación de una pregunta para un grupo específico, sumando
+    todas las sub-filas del contador. Devuelve None si no hay ninguna.
+    """
+    totals = QuestionEvaluationGroup.objects.filter(question=question, group=group).aggregate(
+        rows=models.Count('id'),
+        ev_count=models.Sum('ev_count'),
+        correct_count=models.Sum('correct_count'),
+    )
+    if not totals['rows']:
         return None
+    return QuestionEvaluationGroup(
+        question=question,
+        group_id=getattr(group, 'id', group),
+        ev_count=totals['ev_count'],
+        correct_count=totals['correct_count'],
+    )
 
 def get_question_evaluation_group_correct_count(question: Question, group_id: int) -> int:
     """Obtiene el conteo de respuestas correctas de una pregunta para un grupo específico."""
@@ -77,43 +79,21 @@ def get_question_evaluation_group_ev_count(question: Question, group_id: int) ->
     qeg = get_question_evaluation_group(question, group_id)
     return qeg.ev_count if qeg else 0
 
+# Los contadores por pregunta, grupo, concepto o tema se calculan en statistics, que acepta listas de ids
+
 def get_question_evaluation_correct_count(question: Question) -> int:
-    qeg = question.evaluations.all()
-    correct_count = 0
-    for q in qeg:
-        correct_count += q.correct_count
-    return correct_count
+    return statistics.correct_count('question', question.id)
 
 def get_question_evaluation_ev_count(question: Question) -> int:
-    qeg = question.evaluations.all()
-    ev_count = 0
-    for q in qeg:
-        ev_count += q.ev_count
-    return ev_count
+    return statistics.ev_count('question', question.id)
 
 def get_ev_count_by_group(group_id: int) -> int:
     """Obtiene la suma total de evaluaciones de todas las preguntas para un grupo específico."""
-    QuestionEvaluationGroup.objects.filter(
-        group_id=group_id
-    ).aggregate(
-        total_ev_count=models.Sum('ev_count')
-    )['total_ev_count'] or 0
+    return statistics.ev_count('group', group_id)
 
 def get_correct_count_by_group(group_id: int) -> int:
-    """Obtiene la suma total de evaluaciones de todas las preguntas para un grupo específico."""
-    QuestionEvaluationGroup.objects.filter(
-        group_id=group_id
-    ).aggregate(
-        total_correct_count=models.Sum('correct_count')
-    )['total_correct_count'] or 0
-
-def get_ev_count_by_concept(concept_id: int) -> int:
-    """Obtiene la suma total de evaluaciones de todas las preguntas para un concepto específico."""
-    return Question.objects.filter(
-        concepts__questionrelatedtoconcept__concept_id=concept_id
-    ).distinct().aggregate(
-        total_ev_count=models.Sum('evaluations__ev_count')
-    )['total_ev_count'] or 0
+    """Obtiene la suma total de respuestas correctas de todas las preguntas para un grupo específico."""
+    return statistics.correct_count('group', group_id)
 
 def get_last_change_question(question: Question):
     tmcq = TeacherMakeChangeQuestion.objects.filter(
@@ -126,36 +106,26 @@ def get_last_change_question(question: Question):
 
 def get_ev_count_by_concept(concept_id: int) -> int:
     """Obtiene la suma total de evaluaciones de todas las preguntas para un concepto específico."""
-    return Question.objects.filter(
-        concepts__questionrelatedtoconcept__concept_id=concept_id
-    ).distinct().aggregate(
-        total_ev_count=models.Sum('evaluations__ev_count')
-    )['total_ev_count'] or 0
+    return statistics.ev_count('concept', concept_id)
 
 def get_correct_count_by_concept(concept_id: int) -> int:
     """Obtiene la suma total de respuestas correctas para un concepto específico."""
-    return Question.objects.filter(
-        concepts__questionrelatedtoconcept__concept_id=concept_id
-    ).distinct().aggregate(
-        total_correct_count=models.Sum('evaluations__correct_count')
-    )['total_correct_count'] or 0
+    return statistics.correct_count('concept', concept_id)
 
 def get_correct_count_by_topic(topic_id: int) -> int:
-    """Obtiene un diccionario con el conteo de respuestas correctas por pregunta para un topic específico,
-    utilizando la relación question related to concept."""
-    concepts = content_selectors.get_concepts_by_topic(topic_id)
-    correct_count = 0
-    for concept in concepts:
-        correct_count += get_correct_count_by_concept(concept.id)
-    return {correct_count}
+    """Obtiene la suma total de respuestas correctas de las preguntas de un topic específico."""
+    return statistics.correct_count('topic', topic_id)
 
 def get_ev_count_by_topic(topic_id: int) -> int:
-    """Obtiene un diccionario con el conteo de evaluaciones por pregunta para un concepto específico."""
-    concepts = content_selectors.get_concepts_by_topic(topic_id)
-    correct_count = 0
-    for concept in concepts:
-        correct_count += get_ev_count_by_concept(concept.id)
-    return {correct_count}
+    """Obtiene la suma total de evaluaciones de las preguntas de un topic específico."""
+    return statistics.ev_count('topic', topic_id)
+
+def get_explanations_by_question_ids(question_ids: list[int]) -> dict[int, tuple[str, str]]:
+    """Devuelve {question_id: (explanation_es, explanation_en)} en una sola consulta."""
+    if not question_ids:
+        return {}
+    rows = Question.objects.filter(id__in=question_ids).values_list('id', 'explanation_es', 'explanation_en')
+    return {question_id: (explanation_es, explanation_en) for question_id, explanation_es, explanation_en in rows}
 
 def get_answers_for_question(question: Question) -> list[Answer]:
     """Obtiene todas las respuestas asociadas a una pregunta dada."""
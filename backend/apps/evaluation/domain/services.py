@@ -1,14 +1,17 @@
+import random
+import secrets
 from datetime import timezone
 from django.core.exceptions import ValidationError
-from apps.evaluation.api.models import Question, Answer, QuestionBelongsToTopic, QuestionRelatedToConcept, QuestionEvaluationGroup
+from apps.evaluation.api.models import Question, Answer, QuestionBelongsToTopic, QuestionRelatedToConcept, QuestionEvaluationGroup, EvaluationEvent
 from apps.content.api.models import Topic, Concept
 from apps.content.domain import selectors as content_selectors
 from apps.utils.audit import makeChanges
+from apps.utils.deletions import delete_in_chunks
 from apps.courses.api.models import StudentGroup
 from apps.evaluation.domain import selectors as evaluation_selectors
+from apps.evaluation.domain import sampling, counters, manifests, recommendations, exam_store, blueprints, rollups
 from apps.customauth.models import CustomTeacher as Teacher
 from django.utils import translation
-from django.db.models import F
 
 # --- Question Services ---
 def create_question(teacher: Teacher, type: str, statement_es: str = None, statement_en: str = None,
@@ -102,13 +105,15 @@ def update_question(teacher: Teacher, question: Question, type: str = None, stat
     makeChanges(teacher, old_object=old_question, new_object=question)
     return question
 
-def delete_question(teacher: Teacher, question: Question) -> None:
+def delete_question(teacher: Teacher, question: Question, progress=None) -> None:
     """
     Elimina una pregunta y limpia todas sus dependencias:
     1. Respuestas asociadas (Answers).
-    2. Relaciones con Temas (QuestionBelongsToTopic).
-    3. Relaciones con Conceptos (QuestionRelatedToConcept).
-    4. Datos estadísticos de evaluación (QuestionEvaluationGroup).
+    2. Datos estadísticos de evaluación (QuestionEvaluationGroup y EvaluationEvent),
+       por lotes y restándolos de los agregados mientras la pregunta aún tiene sus temas y conceptos.
+    3. Relaciones con Temas (QuestionBelongsToTopic).
+    4. Relaciones con Conceptos (QuestionRelatedToConcept).
+    `progress` recibe las filas borradas en cada lote (ver apps.utils.deletions).
     """
     
     # 1. Borrar Respuestas asociadas (y generar auditoría para cada una)
@@ -116,9 +121,10 @@ def delete_question(teacher: Teacher, question: Question) -> None:
     for answer in answers:
         makeChanges(user=teacher, old_object=answer, new_object=None)
     answers.delete()
+    delete_in_chunks(QuestionEvaluationGroup.objects.filter(question=question), rollups.delete_counters, progress)
+    delete_in_chunks(EvaluationEvent.objects.filter(question=question), progress=progress)
     QuestionBelongsToTopic.objects.filter(question=question).delete()
     QuestionRelatedToConcept.objects.filter(question=question).delete()
-    QuestionEvaluationGroup.objects.filter(question=question).delete()
     makeChanges(user=teacher, old_object=question, new_object=None)
     question.delete()
 
@@ -158,96 +164,247 @@ def delete_answer(teacher: Teacher, answer: Answer) -> None:
     makeChanges(teacher, old_object=answer, new_object=None)
     answer.delete()
 
+def _check_answer(question: Question, answer: Answer) -> bool:
+    """Valida en memoria que la respuesta pertenece a la pregunta y devuelve si es correcta."""
+    if answer.question_id != question.id:
+        raise ValidationError("La respuesta proporcionada no pertenece a la pregunta dada.")
+    return answer.is_correct
+
+def _pair_answers(answers: dict[int, int], questions_map: dict, answers_map: dict) -> dict[Question, Answer]:
+    """
+    Empareja {question_id: answer_id} con las preguntas y respuestas ya leídas.
+    Igual que al corregir con el manifiesto, una pregunta o respuesta que no
+    existe es un error en vez de descartarse en silencio.
+    """
+    pairs = {}
+    for question_id, answer_id in answers.items():
+        if question_id not in questions_map or answer_id not in answers_map:
+            raise ValidationError("La respuesta proporcionada no pertenece a la pregunta dada.")
+        pairs[questions_map[question_id]] = answers_map[answer_id]
+    return pairs
+
+def load_answers(answers: dict[int, int]) -> dict[Question, Answer]:
+    """Lee con un in_bulk cada una las preguntas y respuestas de {question_id: answer_id} (ver _pair_answers)."""
+    return _pair_answers(answers, Question.objects.in_bulk(answers.keys()), Answer.objects.in_bulk(answers.values()))
+
 def evaluate_question(student_group: StudentGroup, question: Question, answer: Answer) -> bool:
     """Evalúa una pregunta para un grupo de estudiantes dado y actualiza las métricas correspondientes."""
+    is_correct = _check_answer(question, answer)
+    counters.record_increments(
+        counters.merge_increments(student_group.id, [(question.id, is_correct)], shard=counters.pick_shard())
+    )
+    return is_correct
 
-    if answer.question != question:
-        raise ValidationError("La respuesta proporcionada no pertenece a la pregunta dada.")
+def new_exam_seed() -> int:
+    """Semilla para un examen pedido sin `seed`: se devuelve al cliente para poder reproducirlo."""
+    return secrets.randbits(32)
 
-    is_correct = answer.is_correct
-    qeg, created = QuestionEvaluationGroup.objects.get_or_create(
-        question=question,
-        group=student_group,
-        defaults={'ev_count': 0, 'correct_count': 0}
+def create_exam(topics: set[Topic], num_questions: int, seed: int = None, difficulty_mode: tuple[str, float] = None) -> list[Question]:
+    """
+    Genera un examen repartiendo las preguntas entre los temas en round-robin,
+    sin duplicados. Solo se leen de la BD las preguntas elegidas. Con `seed`
+    la selección es reproducible y con `difficulty_mode` se adapta a la dificultad pedida.
+    """
+    question_ids = sampling.sample_question_ids([topic.id for topic in topics], num_questions, random.Random(seed), difficulty_mode)
+    questions = Question.objects.prefetch_related('answers').in_bulk(question_ids)
+    return [questions[question_id] for question_id in question_ids if question_id in questions]
+
+def create_exam_records(topics: list[Topic], num_questions: int, seed: int = None, difficulty_mode: tuple[str, float] = None) -> list[exam_store.QuestionRecord]:
+    """
+    Como create_exam, pero sirviendo las preguntas desde el almacén en memoria, sin leer la BD.
+    Mismos temas (en el mismo orden), número de preguntas y `seed` dan el mismo examen
+    mientras no cambie el banco de preguntas.
+    """
+    question_ids = sampling.sample_question_ids([topic.id for topic in topics], num_questions, random.Random(seed), difficulty_mode)
+    return exam_store.get_questions(question_ids)
+
+def create_exam_from_blueprint(num_questions: int, topics: list[dict] = (), types: dict = None, concepts: list = (),
+                               seed: int = None, difficulty_mode: tuple[str, float] = None) -> tuple[list[exam_store.QuestionRecord], list[dict]]:
+    """
+    Genera un examen que cumple un blueprint: `topics` como [{'title' o 'id', 'min', 'max'}],
+    `types` como {type: proporción o número} y `concepts` como nombres o ids que deben salir.
+    Devuelve las preguntas y las restricciones que se han tenido que relajar.
+    """
+    if num_questions <= 0:
+        raise ValidationError("El número de preguntas debe ser positivo.")
+    topic_rows = []
+    for entry in topics:
+        topic = Topic.objects.filter(id=entry['id']).first() if entry.get('id') else content_selectors.get_topic_by_title(entry.get('title', ''))
+        if not topic:
+            raise ValidationError(f"Tema no encontrado: {entry.get('title') or entry.get('id')}")
+        topic_rows.append((topic.id, topic.title_es, int(entry.get('min', 0)), int(entry['max']) if entry.get('max') is not None else None))
+    concept_rows = []
+    for entry in concepts:
+        concept = Concept.objects.filter(id=entry).first() if isinstance(entry, int) else content_selectors.get_concept_by_name(entry)
+        if not concept:
+            raise ValidationError(f"Concepto no encontrado: {entry}")
+        concept_rows.append((concept.id, concept.name_es))
+
+    blueprint = blueprints.Blueprint(
+        num_questions,
+        topics=topic_rows,
+        types=blueprints.type_counts(num_questions, types or {}),
+        concepts=concept_rows,
+        difficulty_mode=difficulty_mode,
     )
-    qeg.ev_count = F('ev_count') + 1
-    if is_correct:
-        qeg.correct_count = F('correct_count') + 1
-    qeg.save()
-    return is_correct
+    question_ids, relaxed = blueprints.solve(blueprint, random.Random(seed))
+    return exam_store.get_questions(question_ids), relaxed
 
-def create_exam(topics: set[Topic], num_questions: int) -> list[Question]:
-    exam_questions = []
-    
-    # 1. CREAR MAZOS: Traemos TODAS las preguntas posibles de cada tema
-    # y las mezclamos aleatoriamente.
-    topic_decks = []
-    for topic in topics:
-        # Usamos tu selector base que trae todas, y añadimos order_by('?')
-        # Convertimos a list() para poder sacar cartas del mazo en Python
-        questions_queryset = evaluation_selectors.get_questions_for_topic(topic).order_by('?')
-        deck = list(questions_queryset)
-        
-        if deck:
-            topic_decks.append(deck)
-    # print("Topic Decks: ", topic_decks)
-    # Si no hay preguntas en ningún tema, salimos ya
-    if not topic_decks:
-        return []
-
-    # 2. REPARTO ROUND-ROBIN (Cíclico)
-    # Mientras nos falten preguntas para llegar al objetivo...
-    while len(exam_questions) < num_questions:
-        
-        initial_count = len(exam_questions)
-        
-        # Recorremos cada mazo (tema) disponible
-        # Usamos list(topic_decks) para poder borrar mazos vacíos mientras iteramos
-        for deck in list(topic_decks):
-            
-            if not deck:
-                topic_decks.remove(deck) # Si el tema se queda seco, lo quitamos
-                continue
-            
-            # Sacamos la primera carta (pregunta) del mazo
-            question = deck.pop(0)
-            
-            # Chequeo de duplicados (por si una pregunta pertenece a dos temas a la vez)
-            if question not in exam_questions:
-                exam_questions.append(question)
-            
-            # Si ya llegamos al número, paramos INMEDIATAMENTE
-            if len(exam_questions) == num_questions:
-                return exam_questions
-        
-        # SEGURIDAD: Si dimos una vuelta entera a todos los temas y no añadimos nada
-        # (porque se acabaron todas las preguntas de la base de datos), rompemos para no colgar el server.
-        if len(exam_questions) == initial_count and not topic_decks:
-            break
-
-    return exam_questions
-
-def getRecommendations(questions_and_answers: dict[Question, Answer]) -> list[str]:
-    recommendations = []
-    return recommendations
+def getRecommendations(student_group: StudentGroup, graded: list[tuple[int, bool]], lang: str = 'es') -> list[str]:
+    """Conceptos a repasar según las preguntas falladas y el acierto histórico del grupo."""
+    return recommendations.recommend(student_group.id, graded, lang)
 
-def correct_exam(student_group: StudentGroup, questions_and_answers: dict[Question, Answer], lang: str = 'es') -> tuple[int, list[str], list[str]]:
-    """Corrige un examen dado un conjunto de preguntas y respuestas."""
+def _explanation(explanation_es: str, explanation_en: str, lang: str) -> str:
+    """Explicación en el idioma pedido, o en el otro si no existe."""
+    if lang == 'es':
+        return explanation_es or explanation_en
+    return explanation_en or explanation_es
+
+def _current_lang() -> str:
     language_code = translation.get_language()
-    lang = 'es' if language_code and language_code.startswith('es') else 'en'
+    return 'es' if language_code and language_code.startswith('es') else 'en'
+
+def correct_exam(student_group: StudentGroup, questions_and_answers: dict[Question, Answer], lang: str = 'es') -> tuple[int, list[str], list[str]]:
+    """
+    Corrige un examen dado un conjunto de preguntas y respuestas.
+    Primero se validan todas las respuestas en memoria y después se aplican
+    todos los contadores del grupo en un lote (ver counters.apply_increments).
+    """
+    lang = _current_lang()
+    graded = [(question, _check_answer(question, answer)) for question, answer in questions_and_answers.items()]
+
+    results = [(question.id, is_correct) for question, is_correct in graded]
+    counters.record_increments(
+        counters.merge_increments(student_group.id, results, shard=counters.pick_shard()),
+        exam_attempts=[(student_group.id, results)],
+    )
+
     mark = 0
     explanations = []
-    recommendations = getRecommendations(questions_and_answers)
-    for question, answer in questions_and_answers.items():
-        is_correct = evaluate_question(student_group, question, answer)
+    exam_recommendations = getRecommendations(student_group, results, lang)
+    for question, is_correct in graded:
         if is_correct:
             mark += 1
         else:
-            exp = getattr(question, f'explanation_{lang}', None)
-            if not exp:
-                fallback_lang = 'en' if lang == 'es' else 'es'
-                exp = getattr(question, f'explanation_{fallback_lang}', None)
+            exp = _explanation(question.explanation_es, question.explanation_en, lang)
+            if exp:
+                explanations.append(exp)
+
+    return mark, explanations, exam_recommendations
+
+def correct_exam_from_manifest(student_group: StudentGroup, manifest: str, answers: dict[int, int]) -> tuple[int, list[str], list[str]] | None:
+    """
+    Corrige un examen con su manifiesto firmado, sin leer preguntas ni respuestas.
+    Solo se consultan las explicaciones de las preguntas falladas. Devuelve None
+    si el manifiesto no sirve para esta corrección y hay que usar correct_exam.
+    """
+    graded = manifests.grade(manifest, answers, student_group.id)
+    if graded is None:
+        return None
+
+    counters.record_increments(
+        counters.merge_increments(student_group.id, graded, shard=counters.pick_shard()),
+        exam_attempts=[(student_group.id, graded)],
+    )
+
+    lang = _current_lang()
+    failed = [question_id for question_id, is_correct in graded if not is_correct]
+    texts = evaluation_selectors.get_explanations_by_question_ids(failed)
+    explanations = []
+    for question_id in failed:
+        if question_id in texts:
+            exp = _explanation(*texts[question_id], lang)
             if exp:
                 explanations.append(exp)
 
-    return mark, explanations, recommendations
\ No newline at end of file
+    mark = len(graded) - len(failed)
+    return mark, explanations, getRecommendations(student_group, graded, lang)
+
+def correct_exams(submissions: list[dict]) -> list[dict]:
+    """
+    Corrige varios exámenes de golpe (sincronización de exámenes hechos sin conexión).
+    Cada envío es {'student_group_code', 'questions_and_answers', 'manifest'?}.
+    Se leen todos los grupos, preguntas y respuestas con una consulta cada uno,
+    se corrige en memoria y los contadores y exámenes corregidos de todos se
+    aplican en una sola escritura. Devuelve un resultado por envío y en el mismo orden: la
+    nota o {'detail': ...} si ese examen no se ha podido corregir.
+    """
+    lang = _current_lang()
+    codes = {submission.get('student_group_code') for submission in submissions}
+    groups = {group.groupCode: group for group in StudentGroup.objects.filter(groupCode__in=codes)}
+
+    # 1. Validamos cada envío y corregimos con su manifiesto los que lo traen
+    results = [None] * len(submissions)
+    exams = {}  # posición -> (grupo, {question_id: answer_id})
+    graded = {}  # posición -> [(question_id, is_correct), ...]
+    for position, submission in enumerate(submissions):
+        student_group = groups.get(submission.get('student_group_code'))
+        if student_group is None:
+            results[position] = {'detail': 'Student group not found'}
+            continue
+        try:
+            answers = {int(q_id): int(a_id) for q_id, a_id in submission.get('questions_and_answers', {}).items()}
+        except (AttributeError, TypeError, ValueError):
+            results[position] = {'detail': 'Invalid questions_and_answers'}
+            continue
+        exams[position] = (student_group, answers)
+        if submission.get('manifest'):
+            try:
+                result = manifests.grade(submission['manifest'], answers, student_group.id)
+            except ValidationError as e:
+                results[position] = {'detail': e.messages[0]}
+                del exams[position]
+                continue
+            if result is not None:
+                graded[position] = result
+
+    # 2. El resto se corrige contra la BD con un único in_bulk de preguntas y otro de respuestas
+    pending = [position for position in exams if position not in graded]
+    questions_map = Question.objects.in_bulk(
+        {q_id for position in pending for q_id in exams[position][1]}
+    ) if pending else {}
+    answers_map = Answer.objects.in_bulk(
+        {a_id for position in pending for a_id in exams[position][1].values()}
+    ) if pending else {}
+    for position in pending:
+        student_group, answers = exams[position]
+        try:
+            graded[position] = [
+                (question.id, _check_answer(question, answer))
+                for question, answer in _pair_answers(answers, questions_map, answers_map).items()
+            ]
+        except ValidationError as e:
+            results[position] = {'detail': e.messages[0]}
+            del exams[position]
+
+    # 3. Una sola escritura de contadores para todos los exámenes corregidos
+    increments = None
+    shard = counters.pick_shard()
+    for position, exam_graded in graded.items():
+        increments = counters.merge_increments(exams[position][0].id, exam_graded, into=increments, shard=shard)
+    counters.record_increments(
+        increments, exam_attempts=[(exams[position][0].id, exam_graded) for position, exam_graded in graded.items()]
+    )
+
+    failed = {q_id for exam_graded in graded.values() for q_id, is_correct in exam_graded if not is_correct}
+    texts = {
+        q_id: (question.explanation_es, question.explanation_en)
+        for q_id, question in questions_map.items() if q_id in failed
+    }
+    if failed - texts.keys():
+        texts.update(evaluation_selectors.get_explanations_by_question_ids(list(failed - texts.keys())))
+
+    for position, (student_group, _) in exams.items():
+        exam_graded = graded[position]
+        explanations = []
+        for q_id, is_correct in exam_graded:
+            if not is_correct and q_id in texts:
+                exp = _explanation(*texts[q_id], lang)
+                if exp:
+                    explanations.append(exp)
+        results[position] = {
+            'mark': sum(1 for _, is_correct in exam_graded if is_correct),
+            'explanations': explanations,
+            'recommendations': getRecommendations(student_group, exam_graded, lang),
+        }
+    return results
@@ -0,0 +1,138 @@
+"""
+Contadores de evaluación (evaluaciones y aciertos) por lotes de ids.
+
+Sustituye a los selectores que hacían una consulta por objeto (o recorrían
+question.evaluations en Python): para cualquier lista de preguntas, temas,
+conceptos, grupos o asignaturas se hace una sola consulta agrupada sobre
+QuestionEvaluationGroup por dimensión. Los ids sin evaluaciones salen con 0.
+
+Los temas se cuentan por las preguntas que pertenecen a ellos
+(QuestionBelongsToTopic), igual que en /analytics/performance/.
+
+crosstab cruza dos dimensiones (p. ej. temas × grupos) con una sola consulta
+agrupada por el par de ids y la pivota con NumPy en matrices densas.
+"""
+import numpy as np
+from django.db.models import F, Sum
+
+from apps.evaluation.api.models import QuestionEvaluationGroup
+
+# Ruta desde QuestionEvaluationGroup hasta el id de cada dimensión
+DIMENSIONS = {
+    'question': 'question_id',
+    'group': 'group_id',
+    'subject': 'group__subject_id',
+    'topic': 'question__topics__topic_id',
+    'concept': 'question__concepts__concept_id',
+}
+
+
+def _rows(dimension: str, ids) -> list[tuple[int, int, int]]:
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Dimensión no válida: {dimension}")
+    key = DIMENSIONS[dimension]
+    return list(
+        QuestionEvaluationGroup.objects
+        .filter(**{f'{key}__in': ids})
+        .values(key_id=F(key))
+        .annotate(ev_count=Sum('ev_count'), correct_count=Sum('correct_count'))
+        .values_list('key_id', 'ev_count', 'correct_count')
+    )
+
+
+def counts(dimension: str, ids) -> dict[int, tuple[int, int]]:
+    """{id: (evaluaciones, aciertos)} de todos los `ids` de la dimensión, en una consulta."""
+    ids = list(dict.fromkeys(ids))
+    result = {key_id: (0, 0) for key_id in ids}
+    if ids:
+        for key_id, ev_count, correct_count in _rows(dimension, ids):
+            result[key_id] = (ev_count or 0, correct_count or 0)
+    return result
+
+
+def count_arrays(dimension: str, ids) -> tuple[np.ndarray, np.ndarray]:
+    """(evaluaciones, aciertos) como arrays de NumPy alineados con `ids`."""
+    ids = np.asarray(list(ids), dtype=np.int64)
+    ev_counts = np.zeros(len(ids), dtype=np.int64)
+    correct_counts = np.zeros(len(ids), dtype=np.int64)
+    if not len(ids):
+        return ev_counts, correct_counts
+    rows = _rows(dimension, np.unique(ids).tolist())
+    if rows:
+        found = np.array(rows, dtype=np.int64)
+        order = np.argsort(found[:, 0])
+        found = found[order]
+        positions = np.searchsorted(found[:, 0], ids)
+        positions = np.minimum(positions, len(found) - 1)
+        present = found[positions, 0] == ids
+        ev_counts[present] = found[positions[present], 1]
+        correct_counts[present] = found[positions[present], 2]
+    return ev_counts, correct_counts
+
+
+def ev_count(dimension: str, key_id: int) -> int:
+    return counts(dimension, [key_id])[key_id][0]
+
+
+def correct_count(dimension: str, key_id: int) -> int:
+    return counts(dimension, [key_id])[key_id][1]
+
+
+class CrossTab:
+    """Matrices densas (filas × columnas) de evaluaciones y aciertos con los ids de cada eje."""
+
+    def __init__(self, row_ids: np.ndarray, column_ids: np.ndarray, attempts: np.ndarray, correct: np.ndarray):
+        self.row_ids = row_ids
+        self.column_ids = column_ids
+        self.attempts = attempts
+        self.correct = correct
+
+    @property
+    def failures(self) -> np.ndarray:
+        return self.attempts - self.correct
+
+    def accuracy(self) -> np.ndarray:
+        """Porcentaje de aciertos de cada celda; NaN donde no hay evaluaciones."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.attempts > 0, self.correct * 100.0 / self.attempts, np.nan)
+
+    def accuracy_rows(self) -> list[list[float | None]]:
+        """accuracy() redondeada como listas de filas, con None en lugar de NaN (para JSON)."""
+        accuracy = np.round(self.accuracy(), 2)
+        return [[None if np.isnan(value) else float(value) for value in row] for row in accuracy]
+
+    def top(self, rows: int = None, columns: int = None) -> 'CrossTab':
+        """Solo las `rows` filas y `columns` columnas con más fallos (en ese orden)."""
+        row_order = np.argsort(-self.failures.sum(axis=1), kind='stable')[:rows]
+        column_order = np.argsort(-self.failures.sum(axis=0), kind='stable')[:columns]
+        return CrossTab(
+            self.row_ids[row_order], self.column_ids[column_order],
+            self.attempts[np.ix_(row_order, column_order)], self.correct[np.ix_(row_order, column_order)],
+        )
+
+
+def crosstab(rows: str, columns: str, subject_id: int = None) -> CrossTab:
+    """Evaluaciones y aciertos de cada par (fila, columna) de dos dimensiones distintas."""
+    if rows == columns or rows not in DIMENSIONS or columns not in DIMENSIONS:
+        raise ValueError(f"Dimensiones no válidas: {rows} × {columns}")
+    row_key, column_key = DIMENSIONS[rows], DIMENSIONS[columns]
+    queryset = QuestionEvaluationGroup.objects.filter(**{f'{row_key}__isnull': False, f'{column_key}__isnull': False})
+    if subject_id:
+        queryset = queryset.filter(group__subject_id=subject_id)
+    cells = np.array(
+        list(
+            queryset
+            .values(row_id=F(row_key), column_id=F(column_key))
+            .annotate(ev_count=Sum('ev_count'), correct_count=Sum('correct_count'))
+            .values_list('row_id', 'column_id', 'ev_count', 'correct_count')
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    row_ids, row_index = np.unique(cells[:, 0], return_inverse=True)
+    column_ids, column_index = np.unique(cells[:, 1], return_inverse=True)
+    attempts = np.zeros((len(row_ids), len(column_ids)), dtype=np.int64)
+    correct = np.zeros_like(attempts)
+    # Cada par aparece una sola vez en la consulta agrupada, así que basta con asignar
+    attempts[row_index, column_index] = cells[:, 2]
+    correct[row_index, column_index] = cells[:, 3]
+    return CrossTab(row_ids, column_ids, attempts, correct)
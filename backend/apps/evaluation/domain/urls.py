@@ -1,9 +1,12 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from ..api.views import (
     QuestionViewSet,
     ExamViewSet,
     QuestionRelatedToConceptViewSet,
     AnalyticsViewSet,
+    GameViewSet,
+    PublishedExamViewSet,
 )
 
 router = DefaultRouter()
@@ -11,5 +14,10 @@ router.register(r'questions', QuestionViewSet, basename='question')
 router.register(r'exams', ExamViewSet, basename='exam')
 router.register(r'qc', QuestionRelatedToConceptViewSet, basename='questionrelatedtoconcept')
 router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+router.register(r'game', GameViewSet, basename='game')
+router.register(r'published-exams', PublishedExamViewSet, basename='published-exam')
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    # Los frontends llaman sin barra final
+    path('game/questions', GameViewSet.as_view({'get': 'questions'})),
+]
@@ -0,0 +1,154 @@
+"""
+Variantes pregeneradas de los exámenes programados (PublishedExam).
+
+Al publicar un examen para un grupo se generan sus K variantes (semillas
+seed_start .. seed_start + K - 1) en cada idioma y se guardan ya serializadas
+como JSON comprimido con gzip, junto con su clave de respuestas. Al empezar la
+clase cada alumno recibe una variante (por índice, por un hash de la clave que
+envíe o al azar) con una sola lectura por clave: de la caché de Django o, si
+no está, de la fila única (exam, lang, number). El coste de generar los
+exámenes pasa del momento de la petición al de la publicación.
+
+Solo se sirve a las peticiones que piden exactamente sus temas y su número
+de preguntas; el resto (exámenes de práctica del mismo grupo) se generan como
+siempre.
+"""
+import gzip
+import json
+import random
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from apps.evaluation.api.models import ExamVariant, PublishedExam
+from apps.evaluation.domain import difficulty, exam_store, sampling
+
+LANGS = ('es', 'en')
+HEADER = 'X-Exam-Variant'
+
+
+def _active_key(group_id: int) -> str:
+    return f'published-exam:{group_id}'
+
+
+def _variant_key(exam_id: int, lang: str, number: int) -> str:
+    return f'exam-variant:{exam_id}:{lang}:{number}'
+
+
+def _cache_ttl() -> int:
+    return getattr(settings, 'EXAM_VARIANTS_CACHE_TTL', 3600)
+
+
+def publish(teacher, student_group, topics: list, num_questions: int, variants: int,
+            seed_start: int = 0, difficulty_mode: str = None) -> PublishedExam:
+    """
+    Publica un examen para el grupo y genera todas sus variantes. El examen
+    activo anterior del grupo deja de servirse.
+    """
+    max_variants = getattr(settings, 'EXAM_VARIANTS_MAX', 200)
+    if not 1 <= variants <= max_variants:
+        raise ValidationError(f"El número de variantes debe estar entre 1 y {max_variants}.")
+    if num_questions <= 0:
+        raise ValidationError("El número de preguntas debe ser positivo.")
+    if not topics:
+        raise ValidationError("Debe indicar al menos un tema.")
+    try:
+        mode = difficulty.parse_mode(difficulty_mode) if difficulty_mode else None
+    except ValueError as e:
+        raise ValidationError(str(e))
+    topic_ids = [topic.id for topic in dict.fromkeys(topics)]
+
+    rows = []
+    for number in range(variants):
+        seed = seed_start + number
+        question_ids = sampling.sample_question_ids(topic_ids, num_questions, random.Random(seed), mode)
+        questions = exam_store.get_questions(question_ids)
+        answer_keys = [[question.id, question.answer_keys()] for question in questions]
+        for lang in LANGS:
+            payload = json.dumps([question.as_short(lang, seed=seed) for question in questions], ensure_ascii=False)
+            rows.append(ExamVariant(
+                number=number, lang=lang, seed=seed,
+                payload=gzip.compress(payload.encode(), compresslevel=9, mtime=0),
+                answer_keys=answer_keys,
+            ))
+
+    with transaction.atomic():
+        PublishedExam.objects.filter(group=student_group, active=True).update(active=False)
+        exam = PublishedExam.objects.create(
+            group=student_group, teacher=teacher, num_questions=num_questions,
+            variants=variants, seed_start=seed_start, difficulty=difficulty_mode,
+        )
+        exam.topics.set(topic_ids)
+        for row in rows:
+            row.exam = exam
+        ExamVariant.objects.bulk_create(rows, batch_size=200)
+    cache.delete(_active_key(student_group.id))
+    return exam
+
+
+def unpublish(exam: PublishedExam) -> None:
+    exam.active = False
+    exam.save(update_fields=['active'])
+    cache.delete(_active_key(exam.group_id))
+
+
+def get_active(group_id: int) -> tuple[int, int, int, list[list[str]]] | None:
+    """(exam_id, número de variantes, número de preguntas, títulos [es, en] de sus temas) del examen activo del grupo, o None."""
+    key = _active_key(group_id)
+    active = cache.get(key)
+    if active is None:
+        exam = PublishedExam.objects.filter(group_id=group_id, active=True).order_by('-id').first()
+        # Se guarda también la ausencia para no consultar en cada examen libre
+        active = [
+            exam.id, exam.variants, exam.num_questions,
+            [list(titles) for titles in exam.topics.order_by('id').values_list('title_es', 'title_en')],
+        ] if exam else []
+        cache.set(key, active, _cache_ttl())
+    return tuple(active) if active else None
+
+
+def find(group_id: int, topic_titles: list[str], num_questions: int) -> tuple[int, int] | None:
+    """
+    (exam_id, número de variantes) del examen activo del grupo si la petición
+    pide sus mismos temas (por título en cualquier idioma) y número de preguntas.
+    """
+    active = get_active(group_id)
+    if active is None:
+        return None
+    exam_id, count, exam_questions, exam_titles = active
+    if num_questions != exam_questions:
+        return None
+    matched = set()
+    for title in topic_titles:
+        positions = [i for i, titles in enumerate(exam_titles) if title in titles]
+        if not positions:
+            return None
+        matched.update(positions)
+    if len(matched) != len(exam_titles):
+        return None
+    return exam_id, count
+
+
+def pick_number(variants: int, number: int = None, key: str = None) -> int:
+    """Variante por índice, por hash estable de `key` (p. ej. el alumno) o al azar."""
+    if number is not None:
+        return number % variants
+    if key:
+        return zlib.crc32(key.encode()) % variants
+    return random.randrange(variants)
+
+
+def get_variant(exam_id: int, lang: str, number: int) -> tuple[bytes, list, int] | None:
+    """(JSON comprimido con gzip, clave de respuestas, semilla) de una variante."""
+    key = _variant_key(exam_id, lang, number)
+    variant = cache.get(key)
+    if variant is None:
+        row = ExamVariant.objects.filter(exam_id=exam_id, lang=lang, number=number).values_list('payload', 'answer_keys', 'seed').first()
+        if row is None:
+            return None
+        variant = (bytes(row[0]), row[1], row[2])
+        cache.set(key, variant, _cache_ttl())
+    return variant
@@ -0,0 +1,197 @@
+"""
+Buffer de escritura diferida (write-behind) para los contadores de evaluación.
+
+Cuando EVALUATION_WRITE_BEHIND está activo, las correcciones no escriben en
+QuestionEvaluationGroup: acumulan sus incrementos en memoria, agrupados por
+(group_id, question_id, shard), y se vuelcan en un solo lote cada
+EVALUATION_BUFFER_FLUSH_INTERVAL segundos o al superar
+EVALUATION_BUFFER_MAX_PENDING claves pendientes.
+
+Cada incremento se anota antes en un fichero de segmento (append-only, con
+fsync) dentro de EVALUATION_BUFFER_SPILL_DIR. Un segmento solo se borra cuando
+su lote está confirmado en la BD, así que si el proceso muere los segmentos
+huérfanos se reaplican con el comando flush_evaluation_counters, que
+entrypoint.sh lanza una vez antes de arrancar gunicorn (los workers no
+reaplican nada). La garantía es "al menos una vez": una caída justo entre el
+commit y el borrado del segmento volvería a sumar ese lote.
+
+Los exámenes corregidos (ExamAttempt) se guardan en el mismo lote, pero solo
+en memoria: son estadísticas y no se anotan en los segmentos.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from apps.evaluation.domain import attempts, counters
+
+logger = logging.getLogger(__name__)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+class _Segment:
+    """Fichero de spill bloqueado (flock) mientras su proceso sigue vivo."""
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, f'counters-{os.getpid()}-{uuid.uuid4().hex[:8]}.log')
+        self.file = open(self.path, 'a', encoding='utf-8')
+        fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, increments: counters.Increments) -> None:
+        line = json.dumps([[*key, ev, ok] for key, (ev, ok) in increments.items()])
+        self.file.write(line + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def discard(self) -> None:
+        os.remove(self.path)
+        self.file.close()
+
+
+def _read_segment(path: str, into: counters.Increments) -> None:
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                entries = json.loads(line)
+            except ValueError:
+                # Última línea a medio escribir cuando el proceso cayó: se descarta
+                continue
+            for group_id, question_id, shard, ev_count, correct_count in entries:
+                pending = into[(group_id, question_id, shard)]
+                pending[0] += ev_count
+                pending[1] += correct_count
+
+
+def replay_spill_files(directory: str) -> int:
+    """Reaplica los segmentos que no pertenecen a ningún proceso vivo. Devuelve cuántos se han reaplicado."""
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(directory, 'counters-*.log'))):
+        try:
+            file = open(path, 'r+', encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with file:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # Segmento de un buffer en uso
+            increments = defaultdict(lambda: [0, 0])
+            _read_segment(path, increments)
+            counters.apply_increments(increments)
+            os.remove(path)
+            replayed += 1
+    return replayed
+
+
+class CounterBuffer:
+    def __init__(self, spill_dir: str, flush_interval: float, max_pending: int):
+        self.spill_dir = spill_dir
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = defaultdict(lambda: [0, 0])
+        self._attempts = []
+        # Segmentos cuyo contenido sigue en _pending (todavía no confirmado en la BD)
+        self._segments = []
+        self._stop = threading.Event()
+
+        os.makedirs(spill_dir, exist_ok=True)
+        self._current = _Segment(spill_dir)
+        self._thread = threading.Thread(target=self._run, name='evaluation-counter-flush', daemon=True)
+        self._thread.start()
+
+    def add(self, increments: counters.Increments, exam_attempts: list = ()) -> None:
+        with self._lock:
+            self._attempts.extend(exam_attempts)
+            if increments:
+                self._current.append(increments)
+            for key, (ev_count, correct_count) in increments.items():
+                pending = self._pending[key]
+                pending[0] += ev_count
+                pending[1] += correct_count
+            should_flush = len(self._pending) + len(self._attempts) >= self.max_pending
+        if should_flush:
+            self.flush()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> None:
+        """Vuelca en un solo lote todo lo acumulado hasta ahora."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._attempts:
+                    return
+                batch, self._pending = self._pending, defaultdict(lambda: [0, 0])
+                exam_attempts, self._attempts = self._attempts, []
+                self._segments.append(self._current)
+                segments, self._segments = self._segments, []
+                self._current = _Segment(self.spill_dir)
+            try:
+                with transaction.atomic():
+                    counters.apply_increments(batch)
+                    attempts.save(exam_attempts)
+            except Exception:
+                logger.exception('No se pudo volcar el buffer de contadores; se reintentará')
+                with self._lock:
+                    for key, (ev_count, correct_count) in batch.items():
+                        pending = self._pending[key]
+                        pending[0] += ev_count
+                        pending[1] += correct_count
+                    self._attempts = exam_attempts + self._attempts
+                    self._segments = segments + self._segments
+                return
+            for segment in segments:
+                segment.discard()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+def get_buffer() -> CounterBuffer:
+    """Devuelve el buffer del proceso actual, creándolo la primera vez."""
+    global _buffer
+    with _buffer_lock:
+        # Tras un fork (workers de gunicorn) cada proceso necesita su propio buffer e hilo
+        if _buffer is None or _buffer.pid != os.getpid():
+            _buffer = CounterBuffer(
+                spill_dir=settings.EVALUATION_BUFFER_SPILL_DIR,
+                flush_interval=settings.EVALUATION_BUFFER_FLUSH_INTERVAL,
+                max_pending=settings.EVALUATION_BUFFER_MAX_PENDING,
+            )
+        return _buffer
+
+
+def flush_buffer() -> None:
+    """Vuelca y cierra el buffer del proceso si existe. Se registra con atexit para el apagado de los workers."""
+    global _buffer
+    with _buffer_lock:
+        buffer = _buffer if _buffer is not None and _buffer.pid == os.getpid() else None
+        _buffer = None
+    if buffer is not None:
+        buffer.close()
+
+
+atexit.register(flush_buffer)
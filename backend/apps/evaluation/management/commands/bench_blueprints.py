@@ -0,0 +1,46 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.evaluation.api.models import Question
+from apps.evaluation.domain import blueprints, exam_store
+from apps.evaluation.management.commands.bench_exam_store import Command as ExamStoreBench
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide lo que tarda el optimizador de blueprints en elegir un examen con cuotas por tema y mezcla '
+        'de tipos (los datos se descartan al terminar).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,50000', help='Tamaños del banco separados por comas')
+        parser.add_argument('--topics', type=int, default=8)
+        parser.add_argument('--questions', type=int, default=20, help='Preguntas por examen')
+        parser.add_argument('--runs', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'banco':>8} {'examen (ms)':>12} {'relajadas':>10}")
+        for size in [int(size) for size in options['sizes'].split(',')]:
+            with transaction.atomic():
+                topics = ExamStoreBench()._populate(size, options['topics'], 2)
+                # Un 30 % de verdadero/falso
+                ids = list(Question.objects.filter(topics__topic__in=topics).values_list('id', flat=True))
+                Question.objects.filter(id__in=random.sample(ids, len(ids) * 3 // 10)).update(type='truefalse')
+                exam_store.invalidate()
+                blueprint = blueprints.Blueprint(
+                    options['questions'],
+                    topics=[(topic.id, topic.title_es, 2, None) for topic in topics],
+                    types={'truefalse': round(options['questions'] * 0.3)},
+                )
+                blueprints.solve(blueprint)
+
+                start = time.perf_counter()
+                for _ in range(options['runs']):
+                    _, relaxed = blueprints.solve(blueprint)
+                exam = (time.perf_counter() - start) * 1000 / options['runs']
+                self.stdout.write(f"{size:>8} {exam:>12.2f} {len(relaxed):>10}")
+                transaction.set_rollback(True)
+            exam_store.invalidate()
@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError, transaction
+
+from apps.courses.api.models import Subject, StudentGroup
+from apps.evaluation.api.models import Question, QuestionEvaluationGroup
+from apps.evaluation.domain import counters, rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el rendimiento de correcciones simultáneas de un mismo grupo con 1, 4 y 16 sub-filas '
+        'por contador. Crea datos temporales y los borra al terminar. Pensado para PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', default='1,4,16')
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--exams', type=int, default=50, help='Exámenes corregidos por hilo')
+        parser.add_argument('--questions', type=int, default=10, help='Preguntas por examen')
+        parser.add_argument(
+            '--hold-ms', type=float, default=0,
+            help='Milisegundos que cada corrección mantiene abierta su transacción tras escribir (el resto de la petición)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                f'Base de datos {connection.vendor}: las escrituras se serializan y los resultados no son representativos.'
+            ))
+        subject = Subject.objects.create(name_es='bench-shards', name_en='bench-shards')
+        group = StudentGroup.objects.create(subject=subject, name_es='bench-shards', name_en='bench-shards')
+        questions = Question.objects.bulk_create(
+            [Question(type='multiple', statement_es=f'P{i}', statement_en=f'Q{i}') for i in range(options['questions'])]
+        )
+        question_ids = [question.id for question in questions]
+        try:
+            self.stdout.write(f"{'shards':>7} {'exámenes/s':>12} {'errores':>8}")
+            for shards in [int(n) for n in options['shards'].split(',')]:
+                QuestionEvaluationGroup.objects.filter(group=group).delete()
+                rate, errors = self._run(group.id, question_ids, shards, options['workers'], options['exams'], options['hold_ms'] / 1000)
+                self.stdout.write(f'{shards:>7} {rate:>12.1f} {errors:>8}')
+        finally:
+            # Los agregados pendientes se vuelcan antes para que los borrados de abajo los quiten
+            rollups.flush()
+            QuestionEvaluationGroup.objects.filter(group=group).delete()
+            Question.objects.filter(id__in=question_ids).delete()
+            group.delete()
+            subject.delete()
+
+    def _run(self, group_id, question_ids, shards, workers, exams, hold):
+        errors = []
+        barrier = threading.Barrier(workers + 1)
+        original_shards = getattr(settings, 'EVALUATION_COUNTER_SHARDS', 1)
+        settings.EVALUATION_COUNTER_SHARDS = shards
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(exams):
+                    results = [(question_id, random.random() < 0.5) for question_id in question_ids]
+                    try:
+                        with transaction.atomic():
+                            counters.apply_increments(
+                                counters.merge_increments(group_id, results, shard=counters.pick_shard())
+                            )
+                            time.sleep(hold)
+                    except OperationalError:
+                        errors.append(1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        settings.EVALUATION_COUNTER_SHARDS = original_shards
+        return (workers * exams - len(errors)) / elapsed, len(errors)
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.content.api.models import Topic
+from apps.evaluation.api.models import Question, QuestionBelongsToTopic
+from apps.evaluation.domain import exam_store, services
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el coste de create_exam según crece el banco de preguntas (los datos se descartan al terminar). '
+        'Con EXAM_SAMPLING_CACHE_TTL=0 en PostgreSQL mide la variante con ROW_NUMBER().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Tamaños del banco separados por comas')
+        parser.add_argument('--topics', type=int, default=5)
+        parser.add_argument('--questions', type=int, default=20, help='Preguntas por examen')
+        parser.add_argument('--runs', type=int, default=50)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        self.stdout.write(f"{'banco':>8} {'1ª llamada (ms)':>16} {'media (ms)':>12} {'p95 (ms)':>10}")
+        for size in sizes:
+            with transaction.atomic():
+                topics = self._populate(size, options['topics'])
+                exam_store.invalidate()
+
+                start = time.perf_counter()
+                services.create_exam(topics, options['questions'])
+                cold = (time.perf_counter() - start) * 1000
+
+                timings = []
+                for _ in range(options['runs']):
+                    start = time.perf_counter()
+                    services.create_exam(topics, options['questions'])
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                mean = sum(timings) / len(timings)
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                self.stdout.write(f"{size:>8} {cold:>16.2f} {mean:>12.2f} {p95:>10.2f}")
+                transaction.set_rollback(True)
+            exam_store.invalidate()
+
+    def _populate(self, size, n_topics):
+        topics = [
+            Topic.objects.create(title_es=f'bench-tema-{size}-{i}', title_en=f'bench-topic-{size}-{i}')
+            for i in range(n_topics)
+        ]
+        questions = Question.objects.bulk_create(
+            [Question(type='multiple', statement_es=f'P{i}', statement_en=f'Q{i}') for i in range(size)],
+            batch_size=5000,
+        )
+        QuestionBelongsToTopic.objects.bulk_create(
+            [QuestionBelongsToTopic(question=q, topic=topics[i % n_topics]) for i, q in enumerate(questions)],
+            batch_size=5000,
+        )
+        if connection.vendor == 'postgresql':
+            # Sin estadísticas el planificador supone tablas vacías y elige bucles anidados
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Question._meta.db_table}, {QuestionBelongsToTopic._meta.db_table}')
+        return topics
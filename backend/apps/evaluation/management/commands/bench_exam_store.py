@@ -0,0 +1,81 @@
+import gc
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.content.api.models import Topic
+from apps.evaluation.api.models import Answer, Question, QuestionBelongsToTopic
+from apps.evaluation.domain import exam_store, services
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la memoria del almacén de exámenes por cada 10k preguntas y el coste de servir un examen '
+        'desde él (los datos se descartan al terminar).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,50000', help='Tamaños del banco separados por comas')
+        parser.add_argument('--topics', type=int, default=5)
+        parser.add_argument('--answers', type=int, default=4, help='Respuestas por pregunta')
+        parser.add_argument('--questions', type=int, default=20, help='Preguntas por examen')
+        parser.add_argument('--runs', type=int, default=200)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'banco':>8} {'construcción (ms)':>18} {'MiB':>8} {'MiB / 10k':>10} {'examen (ms)':>12}")
+        for size in [int(size) for size in options['sizes'].split(',')]:
+            with transaction.atomic():
+                topics = self._populate(size, options['topics'], options['answers'])
+                exam_store.invalidate()
+                gc.collect()
+
+                tracemalloc.start()
+                start = time.perf_counter()
+                exam_store.get_store()
+                build = (time.perf_counter() - start) * 1000
+                used = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+
+                start = time.perf_counter()
+                for _ in range(options['runs']):
+                    services.create_exam_records(topics, options['questions'])
+                exam = (time.perf_counter() - start) * 1000 / options['runs']
+
+                mib = used / 2 ** 20
+                self.stdout.write(f"{size:>8} {build:>18.1f} {mib:>8.1f} {mib * 10000 / size:>10.2f} {exam:>12.3f}")
+                transaction.set_rollback(True)
+            exam_store.invalidate()
+
+    def _populate(self, size, n_topics, n_answers):
+        topics = [
+            Topic.objects.create(title_es=f'bench-tema-{size}-{i}', title_en=f'bench-topic-{size}-{i}')
+            for i in range(n_topics)
+        ]
+        # Textos de longitud parecida a los reales
+        questions = Question.objects.bulk_create(
+            [
+                Question(
+                    type='multiple',
+                    statement_es=f'Enunciado de la pregunta número {i} sobre el temario de la asignatura',
+                    statement_en=f'Statement of question number {i} about the subject syllabus',
+                    explanation_es=f'Explicación de la respuesta correcta de la pregunta {i}',
+                    explanation_en=f'Explanation of the correct answer to question {i}',
+                )
+                for i in range(size)
+            ],
+            batch_size=5000,
+        )
+        Answer.objects.bulk_create(
+            [
+                Answer(question=q, text_es=f'Respuesta {j} de {q.id}', text_en=f'Answer {j} of {q.id}', is_correct=j == 0)
+                for q in questions for j in range(n_answers)
+            ],
+            batch_size=5000,
+        )
+        QuestionBelongsToTopic.objects.bulk_create(
+            [QuestionBelongsToTopic(question=q, topic=topics[i % n_topics]) for i, q in enumerate(questions)],
+            batch_size=5000,
+        )
+        return topics
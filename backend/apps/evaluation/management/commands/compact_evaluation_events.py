@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.evaluation.domain import events
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta el registro de correcciones (franjas horarias antiguas a diarias y diarias a semanales), '
+        'crea las particiones de los próximos meses en PostgreSQL y borra la historia más antigua que '
+        'EVALUATION_EVENTS_RETENTION_DAYS. Pensado para ejecutarse a diario.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, help='Días de historia que se conservan (0 = toda)')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        created = events.ensure_partitions(now)
+        if created:
+            self.stdout.write(f"Particiones creadas: {', '.join(created)}")
+
+        compacted = events.compact(now)
+        self.stdout.write(f"Franjas compactadas: {compacted['hour']} horarias, {compacted['day']} diarias")
+
+        retention = options['retention_days']
+        if retention is None:
+            retention = getattr(settings, 'EVALUATION_EVENTS_RETENTION_DAYS', 0)
+        if retention:
+            dropped = events.drop_before(events.bucket_start(now - timedelta(days=retention), 'day'))
+            self.stdout.write(f"Historia anterior a {retention} días borrada ({dropped} particiones)")
+        self.stdout.write(self.style.SUCCESS("Registro de correcciones compactado"))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.evaluation.domain import concept_links
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula, a partir de los resultados de los grupos, la correlación de aciertos y el co-fallo de cada '
+        'par de conceptos y guarda las mejores relaciones sugeridas por concepto (ConceptLinkSuggestion).'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = concept_links.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f"Sugerencias de relaciones entre conceptos: {count} ({time.perf_counter() - started:.1f} s)"
+        ))
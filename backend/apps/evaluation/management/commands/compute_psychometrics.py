@@ -0,0 +1,36 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.evaluation.domain import psychometrics
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula a partir de los exámenes guardados el histograma y los percentiles de notas, la '
+        'discriminación punto-biserial de cada pregunta y el alfa de Cronbach, por grupo y por tema.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', help='Ids de grupo separados por comas (por defecto todos)')
+        parser.add_argument('--topics', help='Ids de tema separados por comas (por defecto todos)')
+        parser.add_argument('--days', type=int, help='Solo los exámenes de los últimos N días')
+        parser.add_argument('--output', help='Fichero JSON de salida (por defecto la salida estándar)')
+
+    def handle(self, *args, **options):
+        group_ids = [int(i) for i in options['groups'].split(',')] if options['groups'] else None
+        topic_ids = [int(i) for i in options['topics'].split(',')] if options['topics'] else None
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+
+        results = psychometrics.compute(group_ids, topic_ids, since)
+        data = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(data)
+            self.stdout.write(self.style.SUCCESS(
+                f"Estadísticas de {len(results['groups'])} grupos y {len(results['topics'])} temas en {options['output']}"
+            ))
+        else:
+            self.stdout.write(data)
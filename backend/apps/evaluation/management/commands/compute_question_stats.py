@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.evaluation.domain import item_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula la p suavizada, su intervalo de confianza, la discriminación y los avisos de calidad '
+        'de cada pregunta y sustituye la tabla QuestionStats. Pensado para lanzarse periódicamente (cron).'
+    )
+
+    def handle(self, *args, **options):
+        count = item_stats.refresh()
+        summary = item_stats.summary()
+        flagged = ', '.join(f"{flag}: {total}" for flag, total in summary['flags'].items() if flag and total)
+        self.stdout.write(self.style.SUCCESS(
+            f"Estadísticas de {count} preguntas" + (f" ({flagged})" if flagged else "")
+        ))
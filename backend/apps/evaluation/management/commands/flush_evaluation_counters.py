@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.evaluation.domain import write_behind
+
+
+class Command(BaseCommand):
+    help = 'Reaplica los ficheros de spill del buffer de contadores que hayan quedado huérfanos'
+
+    def handle(self, *args, **options):
+        replayed = write_behind.replay_spill_files(settings.EVALUATION_BUFFER_SPILL_DIR)
+        self.stdout.write(self.style.SUCCESS(f'Segmentos reaplicados: {replayed}'))
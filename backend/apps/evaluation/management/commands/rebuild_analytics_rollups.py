@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.evaluation.domain import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde cero los agregados de analíticas (AnalyticsRollup y GroupConceptRollup) a partir de '
+        'QuestionEvaluationGroup. Útil tras importar datos o si los agregados se desincronizan.'
+    )
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Agregados recalculados: {count} filas"))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Índices declarados en los modelos desde antes de los contadores por sub-filas y sin migración propia."""
+
+    dependencies = [
+        ('evaluation', '0004_alter_answer_text_en_alter_answer_text_es_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question'], name='evaluation__questio_fc2937_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['type'], name='evaluation__type_bf6f15_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['approved'], name='evaluation__approve_0b4137_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionbelongstotopic',
+            index=models.Index(fields=['topic'], name='evaluation__topic_i_06a74e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionbelongstotopic',
+            index=models.Index(fields=['question'], name='evaluation__questio_897ac8_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0006_alter_concept_name_en_alter_concept_name_es_and_more'),
+        ('courses', '0001_initial'),
+        ('evaluation', '0005_pending_model_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='questionevaluationgroup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='questionevaluationgroup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='questionevaluationgroup',
+            unique_together={('group', 'question', 'shard')},
+        ),
+    ]
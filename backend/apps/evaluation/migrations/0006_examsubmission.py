@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluation', '0005_questionevaluationgroup_shard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submission_id', models.CharField(max_length=64, unique=True)),
+                ('result', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('evaluation', '0006_examsubmission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('n_questions', models.PositiveSmallIntegerField()),
+                ('mark', models.PositiveSmallIntegerField()),
+                ('question_ids', models.BinaryField()),
+                ('correct', models.BinaryField()),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='courses.studentgroup')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', 'created_at'], name='evaluation__group_i_723395_idx')],
+            },
+        ),
+    ]
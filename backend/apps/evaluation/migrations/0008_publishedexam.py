@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0006_alter_concept_name_en_alter_concept_name_es_and_more'),
+        ('courses', '0001_initial'),
+        ('evaluation', '0007_examattempt'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishedExam',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_questions', models.PositiveSmallIntegerField()),
+                ('variants', models.PositiveSmallIntegerField()),
+                ('seed_start', models.BigIntegerField(default=0)),
+                ('difficulty', models.CharField(blank=True, max_length=20, null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='published_exams', to='courses.studentgroup')),
+                ('teacher', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='published_exams', to=settings.AUTH_USER_MODEL)),
+                ('topics', models.ManyToManyField(related_name='published_exams', to='content.topic')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExamVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveSmallIntegerField()),
+                ('lang', models.CharField(max_length=2)),
+                ('seed', models.BigIntegerField()),
+                ('payload', models.BinaryField()),
+                ('answer_keys', models.JSONField()),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variant_set', to='evaluation.publishedexam')),
+            ],
+            options={
+                'unique_together': {('exam', 'lang', 'number')},
+            },
+        ),
+    ]
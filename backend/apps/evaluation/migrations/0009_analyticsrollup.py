@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluation', '0008_publishedexam'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_id', models.PositiveIntegerField(default=0)),
+                ('dimension', models.CharField(choices=[('topic', 'Topic'), ('concept', 'Concept'), ('group', 'Group'), ('subject', 'Subject'), ('question', 'Question')], max_length=10)),
+                ('key_id', models.PositiveIntegerField()),
+                ('attempts', models.BigIntegerField(default=0)),
+                ('correct', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('subject_id', 'dimension', 'key_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.backends.ddl_references import Statement
+
+TABLE = 'evaluation_evaluationevent'
+
+
+def partition_by_month(apps, schema_editor):
+    """
+    En PostgreSQL se rehace la tabla (aún vacía) particionada por rango de
+    bucket_start, para poder borrar los meses antiguos con DROP TABLE. La
+    clave primaria tiene que incluir bucket_start. Las claves ajenas se
+    declaran aquí, con ON DELETE CASCADE para que borrar un grupo o una
+    pregunta fuera del ORM no deje filas huérfanas, y se quitan las que
+    CreateModel había dejado pendientes para la tabla borrada. La restricción
+    única y los índices los crea después el propio schema_editor (los deja
+    para el final de la migración). Las particiones de cada mes las crea
+    events.ensure_partitions y heredan las claves ajenas; lo que caiga fuera
+    va a la partición por defecto.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    groups = apps.get_model('courses', 'StudentGroup')._meta.db_table
+    questions = apps.get_model('evaluation', 'Question')._meta.db_table
+    schema_editor.execute(f'DROP TABLE {TABLE}')
+    schema_editor.execute(f'CREATE SEQUENCE {TABLE}_id_seq')
+    schema_editor.execute(f"""
+        CREATE TABLE {TABLE} (
+            id bigint NOT NULL DEFAULT nextval('{TABLE}_id_seq'),
+            granularity varchar(4) NOT NULL,
+            bucket_start timestamp with time zone NOT NULL,
+            attempts integer NOT NULL CHECK (attempts >= 0),
+            correct integer NOT NULL CHECK (correct >= 0),
+            group_id bigint NOT NULL,
+            question_id bigint NOT NULL,
+            PRIMARY KEY (id, bucket_start),
+            CONSTRAINT {TABLE}_group_id_fk FOREIGN KEY (group_id)
+                REFERENCES {groups} (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+            CONSTRAINT {TABLE}_question_id_fk FOREIGN KEY (question_id)
+                REFERENCES {questions} (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED
+        ) PARTITION BY RANGE (bucket_start)
+    """)
+    schema_editor.execute(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+    schema_editor.execute(f'CREATE TABLE {TABLE}_pdefault PARTITION OF {TABLE} DEFAULT')
+    schema_editor.deferred_sql = [
+        statement for statement in schema_editor.deferred_sql
+        if not (isinstance(statement, Statement) and statement.references_table(TABLE) and 'FOREIGN KEY' in str(statement))
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('evaluation', '0009_analyticsrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvaluationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('week', 'Week')], default='hour', max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evaluation_events', to='courses.studentgroup')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evaluation_events', to='evaluation.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket_start'], name='evaluation__bucket__5c9476_idx')],
+                'unique_together': {('granularity', 'bucket_start', 'group', 'question')},
+            },
+        ),
+        migrations.RunPython(partition_by_month, migrations.RunPython.noop),
+    ]
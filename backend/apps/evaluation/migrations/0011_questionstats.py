@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluation', '0010_evaluationevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='evaluation.question')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('groups', models.PositiveIntegerField(default=0)),
+                ('p_value', models.FloatField()),
+                ('ci_low', models.FloatField()),
+                ('ci_high', models.FloatField()),
+                ('discrimination', models.FloatField(blank=True, null=True)),
+                ('flag', models.CharField(blank=True, choices=[('', 'OK'), ('too_hard', 'Too hard'), ('too_easy', 'Too easy'), ('negative_discrimination', 'Negative discrimination'), ('insufficient_data', 'Insufficient data')], default='', max_length=24)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['flag'], name='evaluation__flag_e80e8d_idx'), models.Index(fields=['p_value'], name='evaluation__p_value_2c9c50_idx')],
+            },
+        ),
+    ]
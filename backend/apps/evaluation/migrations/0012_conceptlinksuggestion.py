@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0006_alter_concept_name_en_alter_concept_name_es_and_more'),
+        ('evaluation', '0011_questionstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConceptLinkSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('correlation', models.FloatField()),
+                ('co_failure', models.FloatField()),
+                ('groups', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('concept_from', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_links', to='content.concept')),
+                ('concept_to', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='content.concept')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['concept_from', '-score'], name='evaluation__concept_3a54d3_idx')],
+                'unique_together': {('concept_from', 'concept_to')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluation', '0012_conceptlinksuggestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=1)),
+                ('reset_version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def fill_group_concepts(apps, schema_editor):
+    # Totales de los contadores que ya existían; los nuevos los suma rollups
+    QuestionEvaluationGroup = apps.get_model('evaluation', 'QuestionEvaluationGroup')
+    GroupConceptRollup = apps.get_model('evaluation', 'GroupConceptRollup')
+    rows = (
+        QuestionEvaluationGroup.objects
+        .filter(question__concepts__isnull=False)
+        .values('group_id', concept_id=F('question__concepts__concept_id'))
+        .annotate(attempts=Sum('ev_count'), correct=Sum('correct_count'))
+        .values_list('group_id', 'concept_id', 'attempts', 'correct')
+    )
+    GroupConceptRollup.objects.bulk_create(
+        [
+            GroupConceptRollup(group_id=group_id, concept_id=concept_id, attempts=attempts, correct=correct)
+            for group_id, concept_id, attempts, correct in rows
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0006_alter_concept_name_en_alter_concept_name_es_and_more'),
+        ('courses', '0001_initial'),
+        ('evaluation', '0013_analyticsversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupConceptRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.BigIntegerField(default=0)),
+                ('correct', models.BigIntegerField(default=0)),
+                ('concept', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='content.concept')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.studentgroup')),
+            ],
+            options={
+                'unique_together': {('group', 'concept')},
+            },
+        ),
+        migrations.RunPython(fill_group_concepts, migrations.RunPython.noop),
+    ]
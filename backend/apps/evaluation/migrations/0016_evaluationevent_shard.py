@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('evaluation', '0015_deletionjob'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='evaluationevent',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='evaluationevent',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='evaluationevent',
+            unique_together={('granularity', 'bucket_start', 'group', 'question', 'shard')},
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from apps.courses.api.models import StudentGroup, Subject
+from apps.content.api.models import Topic, Concept, ConceptIsRelatedToConcept, TopicIsAboutConcept
+from apps.evaluation.api.models import Question, Answer, QuestionBelongsToTopic, QuestionRelatedToConcept
+from apps.evaluation.domain import difficulty, exam_store, recommendations, rollups
+
+# Los cambios en preguntas, respuestas o sus temas recargan solo esa pregunta en el almacén de exámenes
+for model in (Question, Answer, QuestionBelongsToTopic):
+    post_save.connect(exam_store.mark_question_changed, sender=model, dispatch_uid=f'exam_store_{model.__name__}_save')
+    post_delete.connect(exam_store.mark_question_changed, sender=model, dispatch_uid=f'exam_store_{model.__name__}_delete')
+post_save.connect(exam_store.invalidate, sender=Topic, dispatch_uid='exam_store_Topic_save')
+post_delete.connect(exam_store.invalidate, sender=Topic, dispatch_uid='exam_store_Topic_delete')
+
+# Cambios en conceptos o en sus relaciones invalidan el índice de recomendaciones
+for model in (Concept, ConceptIsRelatedToConcept, TopicIsAboutConcept, Topic, QuestionRelatedToConcept):
+    post_save.connect(recommendations.invalidate_index, sender=model, dispatch_uid=f'recommendations_{model.__name__}_save')
+    post_delete.connect(recommendations.invalidate_index, sender=model, dispatch_uid=f'recommendations_{model.__name__}_delete')
+
+# Agregados de analíticas: cambios de temas o conceptos de una pregunta y borrados
+post_save.connect(rollups.on_topic_link_saved, sender=QuestionBelongsToTopic, dispatch_uid='rollups_QuestionBelongsToTopic_save')
+post_delete.connect(rollups.on_topic_link_deleted, sender=QuestionBelongsToTopic, dispatch_uid='rollups_QuestionBelongsToTopic_delete')
+post_save.connect(rollups.on_concept_link_saved, sender=QuestionRelatedToConcept, dispatch_uid='rollups_QuestionRelatedToConcept_save')
+post_delete.connect(rollups.on_concept_link_deleted, sender=QuestionRelatedToConcept, dispatch_uid='rollups_QuestionRelatedToConcept_delete')
+pre_delete.connect(rollups.on_question_deleted, sender=Question, dispatch_uid='rollups_Question_delete')
+pre_delete.connect(rollups.on_group_deleted, sender=StudentGroup, dispatch_uid='rollups_StudentGroup_delete')
+for model, dimension in ((Topic, 'topic'), (Concept, 'concept'), (Subject, 'subject')):
+    post_delete.connect(rollups.on_key_deleted(dimension), sender=model, weak=False, dispatch_uid=f'rollups_{model.__name__}_delete')
+
+# Al borrar una pregunta o un grupo sus contadores desaparecen: el índice de dificultad se reconstruye
+for model in (Question, StudentGroup):
+    post_delete.connect(difficulty.on_counters_deleted, sender=model, dispatch_uid=f'difficulty_{model.__name__}_delete')
@@ -1,10 +1,15 @@
 import pytest
 from django.core.exceptions import ValidationError
 from unittest.mock import patch
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import translation, timezone
+from datetime import timedelta
 
-from apps.evaluation.domain import services, selectors
-from apps.evaluation.api.models import Question, Answer, QuestionBelongsToTopic, QuestionRelatedToConcept
+from apps.evaluation.domain import services, selectors, sampling, counters, manifests, recommendations, exam_store, difficulty, dedup, attempts, psychometrics, blueprints, rollups, events, analytics_cache, statistics, item_stats, mastery, exports, concept_links
+from apps.evaluation.api.models import Question, Answer, QuestionBelongsToTopic, QuestionRelatedToConcept, QuestionEvaluationGroup, ExamSubmission, ExamAttempt, AnalyticsRollup, EvaluationEvent, QuestionStats, ConceptLinkSuggestion, GroupConceptRollup
 from apps.content.api.models import Topic, Concept, Subject
+from apps.courses.api.models import StudentGroup
 from apps.courses.domain import services as course_services
 from apps.content.domain import services as content_services
 from apps.customauth.models import CustomTeacher
@@ -434,4 +439,994 @@ def test_correct_exam_no_questions(student_groupA):
     mark, explanations, recommendations =services.correct_exam(student_groupA, questions_and_answers)
     assert mark == 0
 
-    
\ No newline at end of file
+    
+# --- Sampling Tests ---
+
+def test_round_robin_quotas_matches_cyclic_deal():
+    assert sampling.round_robin_quotas([5, 5, 5], 7) == [3, 2, 2]
+    assert sampling.round_robin_quotas([1, 10, 10], 9) == [1, 4, 4]
+    assert sampling.round_robin_quotas([0, 2], 5) == [0, 2]
+
+def test_create_exam_is_balanced_between_topics(teacher, topic1, topic2):
+    for i in range(6):
+        q1 = services.create_question(teacher=teacher, type='multiple', statement_es=f'T1-{i}', statement_en=f'T1-{i}')
+        q2 = services.create_question(teacher=teacher, type='multiple', statement_es=f'T2-{i}', statement_en=f'T2-{i}')
+        QuestionBelongsToTopic.objects.create(question=q1, topic=topic1)
+        QuestionBelongsToTopic.objects.create(question=q2, topic=topic2)
+
+    exam_questions = services.create_exam([topic1, topic2], 4)
+
+    assert len(exam_questions) == 4
+    assert len(set(exam_questions)) == 4
+    from_topic1 = [q for q in exam_questions if q.topics.filter(topic=topic1).exists()]
+    assert len(from_topic1) == 2
+
+def test_create_exam_sees_new_questions_after_cache_is_built(teacher, topic1, question_with_answers):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    assert len(services.create_exam([topic1], 5)) == 1
+
+    QuestionBelongsToTopic.objects.create(question=services.create_question(teacher=teacher, type='multiple', statement_es='Q3', statement_en='Q3'), topic=topic1)
+    assert len(services.create_exam([topic1], 5)) == 2
+
+def correction_queries(with_concepts: bool = False) -> int:
+    """
+    Consultas de una corrección sin write-behind (ver counters.apply_increments):
+    savepoint, contadores, temas/conceptos/asignatura, franjas, fin del
+    savepoint y el examen guardado. Los agregados se vuelcan después (ver
+    rollups.flush). Si las preguntas tienen conceptos se suma el acierto del
+    grupo que leen las recomendaciones. En SQLite los upserts leen antes las
+    filas con bloqueo.
+    """
+    queries = 6 if connection.vendor == 'postgresql' else 8
+    if with_concepts:
+        queries += 1
+    return queries
+
+def test_correct_exam_query_count_does_not_depend_on_exam_length(teacher, student_groupA, concept1, django_assert_num_queries):
+    for size in (10, 30):
+        questions_and_answers = {}
+        for i in range(size):
+            question = services.create_question(teacher=teacher, type='multiple', statement_es=f'P{i}', statement_en=f'Q{i}')
+            QuestionRelatedToConcept.objects.create(question=question, concept=concept1)
+            questions_and_answers[question] = services.create_answer(teacher=teacher, question=question, text_es='A', text_en='A', is_correct=i % 2 == 0)
+        # El índice de recomendaciones se construye una vez por proceso, fuera de la corrección
+        recommendations.get_index()
+
+        with django_assert_num_queries(correction_queries(with_concepts=True)):
+            mark, explanations, exam_recommendations = services.correct_exam(student_groupA, questions_and_answers)
+
+        assert mark == size // 2
+        assert sum(selectors.get_question_evaluation_ev_count(q) for q in questions_and_answers) == size
+        assert sum(selectors.get_question_evaluation_correct_count(q) for q in questions_and_answers) == size // 2
+
+def test_correct_exam_validates_every_answer_before_writing(teacher, student_groupA, question_with_answers, question_with_answers_2):
+    questions_and_answers = {
+        question_with_answers: question_with_answers.answers.get(is_correct=True),
+        question_with_answers_2: question_with_answers.answers.get(is_correct=False),
+    }
+
+    with pytest.raises(ValidationError):
+        services.correct_exam(student_groupA, questions_and_answers)
+
+    assert selectors.get_question_evaluation_ev_count(question_with_answers) == 0
+
+def test_sharded_counters_are_summed_on_read(settings, student_groupA, question_with_answers):
+    settings.EVALUATION_COUNTER_SHARDS = 4
+    correct_answer = question_with_answers.answers.get(is_correct=True)
+    incorrect_answer = question_with_answers.answers.get(is_correct=False)
+    for shard in range(4):
+        counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, shard % 2 == 0)], shard=shard))
+    services.evaluate_question(student_groupA, question_with_answers, correct_answer)
+    services.evaluate_question(student_groupA, question_with_answers, incorrect_answer)
+
+    assert QuestionEvaluationGroup.objects.filter(question=question_with_answers).count() > 1
+    assert selectors.get_question_evaluation_ev_count(question_with_answers) == 6
+    assert selectors.get_question_evaluation_correct_count(question_with_answers) == 3
+    qeg = selectors.get_question_evaluation_group(question_with_answers, student_groupA)
+    assert (qeg.ev_count, qeg.correct_count) == (6, 3)
+
+# --- Signed Manifest Tests ---
+
+def _manifest_for(*questions, group=None):
+    answer_keys = [(q.id, q.answers.values_list('id', 'is_correct')) for q in questions]
+    return manifests.sign_exam(answer_keys, group_id=group.id if group else None)
+
+def test_correct_exam_from_manifest_does_not_read_questions(student_groupA, question_with_answers, question_with_answers_2, django_assert_num_queries):
+    question_with_answers_2.explanation_es = 'Explicación'
+    question_with_answers_2.save()
+    manifest = _manifest_for(question_with_answers, question_with_answers_2, group=student_groupA)
+    answers = {
+        question_with_answers.id: question_with_answers.answers.get(is_correct=True).id,
+        question_with_answers_2.id: question_with_answers_2.answers.get(is_correct=False).id,
+    }
+
+    # Las consultas de la corrección más la lectura de las explicaciones de las falladas
+    recommendations.invalidate_index()
+    recommendations.get_index()
+    with django_assert_num_queries(correction_queries() + 1) as captured:
+        mark, explanations, exam_recommendations = services.correct_exam_from_manifest(student_groupA, manifest, answers)
+
+    sql = [query['sql'] for query in captured.captured_queries]
+    assert not any(Answer._meta.db_table in statement for statement in sql)
+    assert sum(f'FROM "{Question._meta.db_table}"' in statement for statement in sql) == 1
+
+    assert mark == 1
+    assert explanations == ['Explicación']
+    assert selectors.get_question_evaluation_ev_count(question_with_answers) == 1
+    assert selectors.get_question_evaluation_correct_count(question_with_answers_2) == 0
+
+def test_manifest_does_not_expose_answer_ids(question_with_answers):
+    from django.core import signing
+    manifest = _manifest_for(question_with_answers)
+    payload = signing.TimestampSigner(salt=manifests.SALT).unsign_object(manifest)
+    correct_answer = question_with_answers.answers.get(is_correct=True)
+    assert payload['q'][0][1] != [correct_answer.id]
+    assert all(len(answer_hash) == 10 for answer_hash in payload['q'][0][1])
+    assert payload['q'][0][0] == question_with_answers.id
+
+def test_correct_exam_from_manifest_falls_back_when_not_usable(student_groupA, student_groupB, question_with_answers, question_with_answers_2):
+    answers = {question_with_answers.id: question_with_answers.answers.get(is_correct=True).id}
+    manifest = _manifest_for(question_with_answers, group=student_groupA)
+
+    assert services.correct_exam_from_manifest(student_groupA, manifest[:-2] + 'xx', answers) is None
+    assert services.correct_exam_from_manifest(student_groupB, manifest, answers) is None
+    other = {question_with_answers_2.id: question_with_answers_2.answers.get(is_correct=True).id}
+    assert services.correct_exam_from_manifest(student_groupA, manifest, other) is None
+    assert selectors.get_question_evaluation_ev_count(question_with_answers) == 0
+
+def test_correct_exam_from_manifest_rejects_foreign_answer(student_groupA, question_with_answers, question_with_answers_2):
+    manifest = _manifest_for(question_with_answers, question_with_answers_2)
+    answers = {question_with_answers.id: question_with_answers_2.answers.get(is_correct=True).id}
+
+    with pytest.raises(ValidationError):
+        services.correct_exam_from_manifest(student_groupA, manifest, answers)
+
+# --- Recommendation Tests ---
+
+def test_correct_exam_recommends_weak_and_related_concepts(teacher, topic1, student_groupA, concept1, concept2, question_with_answers, question_with_answers_2):
+    content_services.link_concepts(concept1, concept2)
+    QuestionRelatedToConcept.objects.create(question=question_with_answers, concept=concept1)
+    QuestionRelatedToConcept.objects.create(question=question_with_answers_2, concept=concept2)
+    questions_and_answers = {
+        question_with_answers: question_with_answers.answers.get(is_correct=False),
+        question_with_answers_2: question_with_answers_2.answers.get(is_correct=True),
+    }
+
+    with translation.override('es'):
+        mark, explanations, exam_recommendations = services.correct_exam(student_groupA, questions_and_answers)
+
+    assert exam_recommendations[0] == 'Repasa el concepto «Concepto 1» del tema «Tema 1».'
+    assert 'Concepto 2' in exam_recommendations[1]
+    assert len(exam_recommendations) == 2
+
+def test_recommendations_rank_by_group_accuracy(teacher, student_groupA, concept1, concept2, question_with_answers, question_with_answers_2):
+    QuestionRelatedToConcept.objects.create(question=question_with_answers, concept=concept1)
+    QuestionRelatedToConcept.objects.create(question=question_with_answers_2, concept=concept2)
+    # El grupo suele acertar el concepto 1 y fallar el concepto 2
+    counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)] * 8 + [(question_with_answers_2.id, False)] * 8))
+
+    result = recommendations.recommend(student_groupA.id, [(question_with_answers.id, False), (question_with_answers_2.id, False)], 'en')
+
+    assert result[0] == 'Review the concept "Concept 2" in the topic "Topic 1".'
+    assert 'Concept 1' in result[1]
+
+def test_recommendations_empty_when_everything_is_correct(student_groupA, concept1, question_with_answers):
+    QuestionRelatedToConcept.objects.create(question=question_with_answers, concept=concept1)
+    assert recommendations.recommend(student_groupA.id, [(question_with_answers.id, True)]) == []
+
+# --- Exam Store Tests ---
+
+def test_exam_store_matches_short_question_serializer(topic1, question_with_answers):
+    from apps.evaluation.api.serializers import ShortQuestionSerializer
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+
+    records = services.create_exam_records([topic1], 1)
+
+    question = Question.objects.prefetch_related('answers').get(id=question_with_answers.id)
+    assert [record.as_short('es') for record in records] == [dict(ShortQuestionSerializer(question).data)]
+
+def test_exam_store_applies_question_changes_incrementally(teacher, topic1, question_with_answers):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    store = exam_store.get_store()
+    assert list(store.topic_ids(topic1.id)) == [question_with_answers.id]
+
+    services.update_question(teacher, question_with_answers, statement_es='Editada')
+    services.create_answer(teacher=teacher, question=question_with_answers, text_es='A3', text_en='A3', is_correct=False)
+    [record] = services.create_exam_records([topic1], 1)
+
+    assert exam_store.get_store() is store
+    assert record.statement_es == 'Editada'
+    assert len(record.answers) == 3
+
+    services.delete_question(teacher, question_with_answers)
+    assert services.create_exam_records([topic1], 1) == []
+
+def test_expired_exam_store_is_rebuilt_in_background(settings, teacher, topic1, question_with_answers, question_with_answers_2, monkeypatch):
+    started = []
+
+    class DeferredThread:
+        def __init__(self, target, args=(), **kwargs):
+            self.run = lambda: target(*args)
+
+        def start(self):
+            started.append(self)
+
+    monkeypatch.setattr(exam_store.threading, 'Thread', DeferredThread)
+    monkeypatch.setattr(exam_store, 'close_old_connections', lambda: None)
+    exam_store.invalidate()
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    store = exam_store.get_store()
+    store.built_at -= settings.EXAM_SAMPLING_CACHE_TTL
+
+    # Caducado: se sigue sirviendo el mismo y se lanza una sola reconstrucción
+    # bulk_create no envía señales, como un cambio hecho desde otro proceso
+    QuestionBelongsToTopic.objects.bulk_create([QuestionBelongsToTopic(question=question_with_answers_2, topic=topic1)])
+    assert exam_store.get_store() is store
+    assert list(store.topic_ids(topic1.id)) == [question_with_answers.id]
+    services.update_question(teacher, question_with_answers, statement_es='Editada')
+    assert exam_store.get_store() is store
+    assert len(started) == 1
+    assert store.records[question_with_answers.id].statement_es == 'Editada'
+
+    started[0].run()
+    rebuilt = exam_store.get_store()
+    assert rebuilt is not store
+    assert list(rebuilt.topic_ids(topic1.id)) == sorted([question_with_answers.id, question_with_answers_2.id])
+    assert rebuilt.records[question_with_answers.id].statement_es == 'Editada'
+    exam_store.invalidate()
+
+def test_exam_store_approved_only(settings, topic1, question_with_answers, question_with_answers_2):
+    settings.EXAM_APPROVED_QUESTIONS_ONLY = True
+    exam_store.invalidate()
+    question_with_answers.approved = True
+    question_with_answers.save()
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    QuestionBelongsToTopic.objects.create(question=question_with_answers_2, topic=topic1)
+
+    assert [record.id for record in services.create_exam_records([topic1], 2)] == [question_with_answers.id]
+    exam_store.invalidate()
+
+# --- Seeded Exam Tests ---
+
+def test_create_exam_records_is_reproducible_with_seed(teacher, topic1, topic2):
+    for i in range(10):
+        question = services.create_question(teacher=teacher, type='multiple', statement_es=f'S{i}', statement_en=f'S{i}')
+        for j in range(4):
+            services.create_answer(teacher=teacher, question=question, text_es=f'R{j}', text_en=f'A{j}', is_correct=j == 0)
+        QuestionBelongsToTopic.objects.create(question=question, topic=topic1 if i % 2 else topic2)
+
+    first = [record.as_short('es', seed=42) for record in services.create_exam_records([topic1, topic2], 6, seed=42)]
+    second = [record.as_short('es', seed=42) for record in services.create_exam_records([topic1, topic2], 6, seed=42)]
+
+    assert first == second
+    assert len(first) == 6
+    # Las respuestas se barajan, pero siguen siendo las mismas
+    assert any([answer['text'] for answer in question['answers']] != ['R0', 'R1', 'R2', 'R3'] for question in first)
+    assert all(sorted(answer['text'] for answer in question['answers']) == ['R0', 'R1', 'R2', 'R3'] for question in first)
+    assert services.create_exam([topic1, topic2], 6, seed=42) == services.create_exam([topic1, topic2], 6, seed=42)
+
+# --- Adaptive Difficulty Tests ---
+
+@pytest.fixture
+def graded_bank(teacher, topic1, student_groupA):
+    """Seis preguntas de topic1: tres que casi todos aciertan y tres que casi todos fallan."""
+    easy, hard = [], []
+    for i in range(6):
+        question = services.create_question(teacher=teacher, type='multiple', statement_es=f'D{i}', statement_en=f'D{i}')
+        QuestionBelongsToTopic.objects.create(question=question, topic=topic1)
+        (easy if i < 3 else hard).append(question.id)
+    results = [(qid, True) for qid in easy] * 30 + [(qid, False) for qid in hard] * 30
+    counters.apply_increments(counters.merge_increments(student_groupA.id, results))
+    difficulty.invalidate()
+    return easy, hard
+
+def test_parse_difficulty_mode():
+    assert difficulty.parse_mode('easy') == ('easy', None)
+    assert difficulty.parse_mode('target:0.25') == ('target', 0.25)
+    for value in ('', 'medium', 'target:2', 'target:x'):
+        with pytest.raises(ValueError):
+            difficulty.parse_mode(value)
+
+def test_difficulty_is_smoothed_towards_bank_mean(graded_bank):
+    easy, hard = graded_bank
+    index = difficulty.get_index()
+
+    p_easy, p_hard, p_unseen = index.probabilities([easy[0], hard[0], 10 ** 9])
+    assert index.mean == pytest.approx(0.5)
+    assert p_easy == pytest.approx((30 + 10 * 0.5) / (30 + 10))
+    assert p_hard == pytest.approx(5 / 40)
+    assert p_unseen == pytest.approx(0.5)
+
+def test_difficulty_index_applies_new_counters_without_queries(settings, student_groupA, graded_bank, django_assert_num_queries, django_capture_on_commit_callbacks):
+    settings.EXAM_DIFFICULTY_REFRESH_INTERVAL = 0
+    easy, hard = graded_bank
+    index = difficulty.get_index()
+    with django_capture_on_commit_callbacks(execute=True):
+        counters.apply_increments(counters.merge_increments(student_groupA.id, [(hard[0], True)] * 60))
+
+    with django_assert_num_queries(0):
+        assert difficulty.get_index().probabilities([hard[0]])[0] == pytest.approx((60 + 10 * index.mean) / (90 + 10))
+
+def test_difficulty_index_ignores_rolled_back_counters(settings, student_groupA, graded_bank):
+    settings.EXAM_DIFFICULTY_REFRESH_INTERVAL = 0
+    easy, hard = graded_bank
+    before = difficulty.get_index().probabilities([hard[0]])[0]
+
+    with pytest.raises(RuntimeError), transaction.atomic():
+        counters.apply_increments(counters.merge_increments(student_groupA.id, [(hard[0], True)] * 60))
+        raise RuntimeError('la corrección falla después de escribir los contadores')
+
+    assert difficulty.get_index().probabilities([hard[0]])[0] == pytest.approx(before)
+
+def test_difficulty_index_is_dropped_when_counters_are_deleted(student_groupA, graded_bank, django_capture_on_commit_callbacks):
+    easy, hard = graded_bank
+    assert difficulty.get_index().probabilities([easy[0]])[0] > 0.7
+
+    with django_capture_on_commit_callbacks(execute=True):
+        rollups.delete_counters(QuestionEvaluationGroup.objects.filter(question_id=easy[0]))
+    assert difficulty.get_index().probabilities([easy[0]])[0] == pytest.approx(difficulty.get_index().mean)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Question.objects.filter(id=hard[0]).delete()
+    assert hard[0] not in difficulty.get_index().arrays[0]
+
+def test_create_exam_records_by_difficulty(topic1, graded_bank, django_assert_num_queries):
+    easy, hard = graded_bank
+    exam_store.get_store()
+    difficulty.get_index()
+
+    with django_assert_num_queries(0):
+        easy_exam = services.create_exam_records([topic1], 3, seed=1, difficulty_mode=('easy', None))
+    hard_exam = services.create_exam_records([topic1], 3, seed=1, difficulty_mode=('hard', None))
+    target_exam = services.create_exam_records([topic1], 2, seed=1, difficulty_mode=('target', 0.1))
+    mixed_exam = services.create_exam_records([topic1], 2, seed=1, difficulty_mode=('mixed', None))
+
+    assert {record.id for record in easy_exam} == set(easy)
+    assert {record.id for record in hard_exam} == set(hard)
+    assert {record.id for record in target_exam} <= set(hard)
+    assert len({record.id for record in mixed_exam} & set(easy)) == 1
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = dedup.BloomFilter(1000)
+    keys = [f'envio-{i}' for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f'otro-{i}' in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_rotating_bloom_filter_forgets_after_two_windows():
+    bloom = dedup.RotatingBloomFilter(100, window=60)
+    bloom.add('envio')
+    bloom.rotated_at -= 60
+    assert bloom.rotate_if_needed()
+    assert 'envio' in bloom
+    bloom.rotated_at -= 60
+    bloom.rotate_if_needed()
+    assert 'envio' not in bloom
+
+def test_run_once_returns_stored_result_without_evaluating(student_groupA):
+    calls = []
+    evaluate = lambda positions: calls.append(positions) or {position: {'mark': 1} for position in positions}
+
+    assert dedup.run_once(['a'], evaluate) == [{'mark': 1}]
+    assert dedup.run_once(['a', 'b', 'b'], evaluate) == [{'mark': 1}] * 3
+    assert calls == [[0], [1]]
+
+def test_run_once_detects_submission_stored_by_another_process(student_groupA, question_with_answers):
+    # Guardada por otro proceso: no está en el filtro de este
+    ExamSubmission.objects.create(submission_id='remoto', result={'mark': 7})
+
+    def evaluate(positions):
+        evaluation_counters = counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)])
+        counters.apply_increments(evaluation_counters)
+        return {position: {'mark': 1} for position in positions}
+
+    assert dedup.run_once(['remoto'], evaluate) == [{'mark': 7}]
+    # La corrección repetida se deshizo junto con sus contadores
+    assert not QuestionEvaluationGroup.objects.exists()
+
+def test_collect_garbage_removes_expired_submissions(settings):
+    settings.EVALUATION_DEDUP_WINDOW = 60
+    old = ExamSubmission.objects.create(submission_id='viejo', result={})
+    ExamSubmission.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(seconds=120))
+    ExamSubmission.objects.create(submission_id='nuevo', result={})
+
+    assert dedup.collect_garbage() == 1
+    assert list(ExamSubmission.objects.values_list('submission_id', flat=True)) == ['nuevo']
+
+def test_failed_purge_does_not_abort_the_correction(student_groupA, question_with_answers):
+    def failing_delete(queryset):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT * FROM tabla_que_no_existe')
+
+    with transaction.atomic():
+        with patch('django.db.models.query.QuerySet.delete', failing_delete):
+            assert dedup.collect_garbage() == 0
+        counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)]))
+
+    assert QuestionEvaluationGroup.objects.get(question=question_with_answers).ev_count == 1
+
+def test_purge_waits_for_the_correction_to_commit(settings, monkeypatch, django_capture_on_commit_callbacks):
+    settings.EVALUATION_DEDUP_WINDOW = 60
+    old = ExamSubmission.objects.create(submission_id='viejo', result={})
+    ExamSubmission.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(seconds=120))
+    monkeypatch.setattr(dedup, '_filter', None)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        dedup.get_filter()
+        assert ExamSubmission.objects.exists()
+    assert not ExamSubmission.objects.exists()
+
+def test_attempt_encoding_round_trip():
+    graded = [(70000, True), (5, False), (12, True), (9, True)]
+    rows = [
+        (1, len(graded), *attempts.encode(graded)),
+        (2, 2, *attempts.encode([(7, False), (3, True)])),
+    ]
+
+    matrix = attempts.AttemptMatrix.from_rows(rows)
+
+    assert matrix.attempt.tolist() == [0, 0, 0, 0, 1, 1]
+    assert matrix.question_ids.tolist() == [5, 9, 12, 70000, 3, 7]
+    assert matrix.correct.tolist() == [False, True, True, True, True, False]
+    assert matrix.marks().tolist() == [3, 1]
+
+def test_attempt_storage_stays_compact():
+    graded = [(question_id, question_id % 3 == 0) for question_id in range(1000, 1020)]
+    question_ids, correct = attempts.encode(graded)
+    assert len(question_ids) + len(correct) <= 2.2 * len(graded)
+
+def test_correct_exam_records_attempt(student_groupA, question_with_answers, question_with_answers_2):
+    services.correct_exam(student_groupA, {
+        question_with_answers: question_with_answers.answers.get(is_correct=True),
+        question_with_answers_2: question_with_answers_2.answers.get(is_correct=False),
+    })
+
+    attempt = ExamAttempt.objects.get()
+    assert (attempt.group_id, attempt.n_questions, attempt.mark) == (student_groupA.id, 2, 1)
+    matrix = attempts.load([student_groupA.id])
+    assert dict(zip(matrix.question_ids.tolist(), matrix.correct.tolist())) == {
+        question_with_answers.id: True, question_with_answers_2.id: False,
+    }
+
+def test_psychometrics_summary():
+    # Pregunta 1 la aciertan los que sacan buena nota; la 4 al revés
+    exams = [
+        [(1, True), (2, True), (3, True), (4, False)],
+        [(1, True), (2, True), (3, False), (4, False)],
+        [(1, True), (2, False), (3, True), (4, False)],
+        [(1, False), (2, False), (3, False), (4, True)],
+        [(1, False), (2, True), (3, False), (4, True)],
+        [(1, True), (2, True), (3, True), (4, True)],
+    ]
+    matrix = attempts.AttemptMatrix.from_rows([(1, 4, *attempts.encode(exam)) for exam in exams])
+
+    summary = psychometrics.summarize(matrix)
+
+    assert summary['attempts'] == 6
+    assert sum(bucket['count'] for bucket in summary['histogram']) == 6
+    assert summary['percentiles']['50'] == 50.0
+    items = {item['question_id']: item for item in summary['items']}
+    assert items[1]['p'] == round(4 / 6, 4)
+    assert items[1]['point_biserial'] > 0 > items[4]['point_biserial']
+    assert summary['alpha'] is not None and summary['alpha'] <= 1
+
+def test_psychometrics_by_group_and_topic(student_groupA, student_groupB, topic1, question_with_answers, question_with_answers_2):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    attempts.save([
+        (student_groupA.id, [(question_with_answers.id, True), (question_with_answers_2.id, False)]),
+        (student_groupB.id, [(question_with_answers.id, False)]),
+    ])
+
+    results = psychometrics.compute()
+
+    assert results['groups'][student_groupA.id]['attempts'] == 1
+    assert results['groups'][student_groupB.id]['attempts'] == 1
+    topic = results['topics'][topic1.id]
+    assert topic['attempts'] == 2
+    assert [item['question_id'] for item in topic['items']] == [question_with_answers.id]
+
+# --- Blueprint Tests ---
+
+@pytest.fixture
+def blueprint_bank(teacher, topic1, topic2, concept1):
+    """topic1: 6 de opción múltiple y 4 de verdadero/falso; topic2: 5 de opción múltiple, una con concept1."""
+    bank = {'topic1': [], 'topic2': [], 'truefalse': [], 'concept1': []}
+    for i in range(15):
+        question_type = 'truefalse' if 6 <= i < 10 else 'multiple'
+        question = services.create_question(teacher=teacher, type=question_type, statement_es=f'B{i}', statement_en=f'B{i}')
+        topic = topic1 if i < 10 else topic2
+        QuestionBelongsToTopic.objects.create(question=question, topic=topic)
+        bank['topic1' if i < 10 else 'topic2'].append(question.id)
+        if question_type == 'truefalse':
+            bank['truefalse'].append(question.id)
+        if i == 14:
+            QuestionRelatedToConcept.objects.create(question=question, concept=concept1)
+            bank['concept1'].append(question.id)
+    exam_store.invalidate()
+    recommendations.invalidate_index()
+    return bank
+
+def test_blueprint_meets_quotas_type_mix_and_coverage(topic1, topic2, concept1, blueprint_bank):
+    question_ids, relaxed = blueprints.solve(blueprints.Blueprint(
+        10,
+        topics=[(topic1.id, 'Tema 1', 2, None), (topic2.id, 'Tema 2', 3, None)],
+        types={'truefalse': 3},
+        concepts=[(concept1.id, 'Concepto 1')],
+    ))
+
+    assert relaxed == []
+    assert len(set(question_ids)) == 10
+    assert sum(q in blueprint_bank['topic2'] for q in question_ids) >= 3
+    assert sum(q in blueprint_bank['truefalse'] for q in question_ids) == 3
+    assert blueprint_bank['concept1'][0] in question_ids
+
+def test_blueprint_reports_relaxed_constraints(topic1, topic2, blueprint_bank):
+    question_ids, relaxed = blueprints.solve(blueprints.Blueprint(
+        8,
+        topics=[(topic2.id, 'Tema 2', 6, None)],
+        types={'truefalse': 2},
+    ))
+
+    assert len(question_ids) == 5
+    assert {entry['constraint'] for entry in relaxed} == {'topic', 'type', 'num_questions'}
+    topic = next(entry for entry in relaxed if entry['constraint'] == 'topic')
+    assert (topic['required'], topic['achieved']) == (6, 5)
+
+def test_blueprint_is_reproducible_with_seed(topic1, topic2, blueprint_bank):
+    def exam(seed):
+        return services.create_exam_from_blueprint(
+            6, topics=[{'title': 'Tema 1', 'min': 3}, {'id': topic2.id, 'max': 1}], types={'truefalse': 0.5}, seed=seed,
+        )
+
+    questions, relaxed = exam(7)
+    assert [q.id for q in questions] == [q.id for q in exam(7)[0]]
+    assert relaxed == []
+    assert sum(q.id in blueprint_bank['topic2'] for q in questions) <= 1
+    assert sum(q.type == 'truefalse' for q in questions) == 3
+
+def test_blueprint_type_mix_cannot_exceed_exam():
+    with pytest.raises(ValidationError):
+        blueprints.type_counts(4, {'truefalse': 3, 'multiple': 2})
+
+# --- Analytics Rollups ---
+
+@pytest.fixture
+def write_counters(django_capture_on_commit_callbacks):
+    """counters.apply_increments con sus agregados ya volcados (ver rollups.flush)."""
+    def write(increments):
+        with django_capture_on_commit_callbacks(execute=True):
+            counters.apply_increments(increments)
+    return write
+
+def _rollup(dimension, key_id, subject_id=0):
+    row = AnalyticsRollup.objects.filter(subject_id=subject_id, dimension=dimension, key_id=key_id).first()
+    return (row.attempts, row.correct) if row else None
+
+def test_rollups_follow_counter_increments(subject, student_groupA, topic1, concept1, question_with_answers, question_with_answers_2, write_counters):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    QuestionRelatedToConcept.objects.create(question=question_with_answers_2, concept=concept1)
+    write_counters(counters.merge_increments(
+        student_groupA.id, [(question_with_answers.id, True), (question_with_answers.id, False), (question_with_answers_2.id, False)],
+    ))
+
+    assert _rollup('topic', topic1.id) == (2, 1)
+    assert _rollup('topic', topic1.id, subject.id) == (2, 1)
+    assert _rollup('concept', concept1.id) == (1, 0)
+    assert _rollup('group', student_groupA.id) == (3, 1)
+    assert _rollup('subject', subject.id) == (3, 1)
+    assert _rollup('question', question_with_answers.id, subject.id) == (2, 1)
+
+def test_rollups_are_written_after_commit_in_one_batch(settings, subject, student_groupA, question_with_answers, question_with_answers_2, django_capture_on_commit_callbacks):
+    settings.ANALYTICS_ROLLUP_FLUSH_INTERVAL = 3600
+    version = analytics_cache.get_version()
+    with patch.object(rollups, '_start_flusher'):
+        with django_capture_on_commit_callbacks(execute=True):
+            counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)]))
+            counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers_2.id, False)], shard=1))
+        with pytest.raises(RuntimeError), transaction.atomic():
+            counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)] * 10))
+            raise RuntimeError('la corrección falla después de escribir los contadores')
+
+    # Las correcciones no tocan las filas compartidas ni la versión
+    assert not AnalyticsRollup.objects.exists()
+    assert analytics_cache.get_version() == version
+    assert rollups.pending_count() > 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        rollups.flush()
+    assert _rollup('group', student_groupA.id) == (2, 1)
+    assert _rollup('subject', subject.id) == (2, 1)
+    assert analytics_cache.get_version() == version + 1
+    assert rollups.pending_count() == 0
+
+def test_rollups_follow_topic_links_and_deletes(subject, student_groupA, topic1, question_with_answers, question_with_answers_2, write_counters):
+    write_counters(counters.merge_increments(
+        student_groupA.id, [(question_with_answers.id, True), (question_with_answers_2.id, False)],
+    ))
+    link = QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    assert _rollup('topic', topic1.id) == (1, 1)
+
+    link.delete()
+    assert _rollup('topic', topic1.id) == (0, 0)
+
+    QuestionBelongsToTopic.objects.create(question=question_with_answers_2, topic=topic1)
+    question_with_answers_2.delete()
+    assert _rollup('topic', topic1.id) == (0, 0)
+    assert _rollup('group', student_groupA.id) == (1, 1)
+    assert _rollup('question', question_with_answers_2.id) is None
+
+def test_rollups_rebuild_matches_incremental(subject, student_groupA, student_groupB, topic1, concept1, question_with_answers, question_with_answers_2, write_counters):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    QuestionRelatedToConcept.objects.create(question=question_with_answers, concept=concept1)
+    write_counters(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)] * 3, shard=1))
+    write_counters(counters.merge_increments(student_groupB.id, [(question_with_answers_2.id, False), (question_with_answers.id, False)]))
+    incremental = set(AnalyticsRollup.objects.values_list('subject_id', 'dimension', 'key_id', 'attempts', 'correct'))
+
+    rollups.rebuild()
+
+    assert set(AnalyticsRollup.objects.values_list('subject_id', 'dimension', 'key_id', 'attempts', 'correct')) == incremental
+    assert [row['key_id'] for row in rollups.top('group', subject.id)] == [student_groupB.id, student_groupA.id]
+
+def test_rollups_delete_counters_subtracts(subject, student_groupA, student_groupB, topic1, question_with_answers, write_counters):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    write_counters(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)] * 2))
+    write_counters(counters.merge_increments(student_groupB.id, [(question_with_answers.id, False)]))
+
+    assert rollups.delete_counters(QuestionEvaluationGroup.objects.filter(group=student_groupA)) == 1
+
+    assert _rollup('topic', topic1.id) == (1, 0)
+    assert _rollup('group', student_groupA.id) == (0, 0)
+    assert [row['key_id'] for row in rollups.top('group')] == [student_groupB.id]
+
+# --- Evaluation Event Log ---
+
+def test_events_record_hourly_buckets(student_groupA, question_with_answers):
+    now = timezone.now()
+    counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)], shard=1))
+    counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, False)]))
+
+    # Cada corrección escribe en la sub-fila de sus contadores y las consultas las suman
+    rows = EvaluationEvent.objects.order_by('shard').values_list('shard', 'granularity', 'attempts', 'correct', 'bucket_start')
+    assert list(rows) == [(0, 'hour', 1, 0, events.bucket_start(now, 'hour')), (1, 'hour', 1, 1, events.bucket_start(now, 'hour'))]
+    assert events.top('question', None, now - timedelta(hours=1), now + timedelta(hours=1)) == [
+        {'key_id': question_with_answers.id, 'attempts': 2, 'correct': 1, 'failures': 1},
+    ]
+
+def test_events_compaction_keeps_totals(student_groupA, question_with_answers):
+    now = timezone.now()
+    old = now - timedelta(days=200)
+    recent = now - timedelta(days=20)
+    for moment in (old, old + timedelta(hours=1), recent, recent + timedelta(hours=2), now):
+        events.record({(student_groupA.id, question_with_answers.id, 0): [2, 1]}, now=moment)
+    events.record({(student_groupA.id, question_with_answers.id, 3): [2, 1]}, now=old)
+
+    compacted = events.compact(now)
+
+    assert compacted == {'hour': 5, 'day': 1}
+    granularities = sorted(EvaluationEvent.objects.values_list('granularity', flat=True))
+    assert granularities == ['day', 'hour', 'week']
+    assert EvaluationEvent.objects.aggregate(total=Sum('attempts'))['total'] == 12
+    week = EvaluationEvent.objects.get(granularity='week')
+    assert (week.shard, week.attempts) == (0, 6)
+    assert week.bucket_start == events.bucket_start(old, 'week')
+    assert week.bucket_start.weekday() == 0
+
+def test_events_window_and_series(student_groupA, topic1, question_with_answers, question_with_answers_2):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    now = timezone.now()
+    events.record({(student_groupA.id, question_with_answers.id, 0): [4, 1]}, now=now - timedelta(days=10))
+    events.record({(student_groupA.id, question_with_answers.id, 0): [2, 2]}, now=now - timedelta(days=2))
+    events.record({(student_groupA.id, question_with_answers_2.id, 0): [1, 0]}, now=now - timedelta(days=2))
+
+    rows = events.top('topic', 0, now - timedelta(days=7), now)
+    assert [(row['key_id'], row['attempts'], row['correct']) for row in rows] == [(topic1.id, 2, 2)]
+
+    trend = events.series('question', [question_with_answers.id], 0, now - timedelta(days=30), now, 'week')[question_with_answers.id]
+    assert sum(point['attempts'] for point in trend) == 6
+
+def test_events_parse_window_rejects_bad_input():
+    with pytest.raises(ValidationError):
+        events.parse_window('2026-02-01', '2026-01-01')
+    with pytest.raises(ValidationError):
+        events.parse_window(bucket='month')
+    start, end, bucket = events.parse_window('2026-01-01', '2026-01-08T12:00:00Z', 'day')
+    assert (end - start).days == 7 and bucket == 'day'
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason="Particiones solo en PostgreSQL")
+def test_events_partitions_move_default_rows_and_drop(student_groupA, question_with_answers):
+    now = timezone.now()
+    events.record({(student_groupA.id, question_with_answers.id, 0): [3, 1]}, now=now)
+
+    created = events.ensure_partitions(now, months_ahead=1)
+
+    assert len(created) == 2
+    assert EvaluationEvent.objects.get().attempts == 3
+    assert events.ensure_partitions(now, months_ahead=1) == []
+    # Las claves ajenas diferidas de las filas de esta misma transacción impedirían el DROP TABLE
+    with connection.cursor() as cursor:
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    assert events.drop_before(events._month(now, 2)) == 2
+    assert not EvaluationEvent.objects.exists()
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason="Particiones solo en PostgreSQL")
+def test_events_partitions_keep_cascading_foreign_keys(student_groupA, question_with_answers):
+    events.ensure_partitions(timezone.now(), months_ahead=0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.conrelid::regclass::text, c.confrelid::regclass::text, c.confdeltype FROM pg_constraint c "
+            "WHERE c.contype = 'f' AND c.conrelid::regclass::text LIKE %s",
+            [f'{events.TABLE}%'],
+        )
+        foreign_keys = cursor.fetchall()
+
+    partitions = {events.TABLE, f'{events.TABLE}_pdefault', *events._partitions()}
+    for table in partitions:
+        # 'c' = ON DELETE CASCADE
+        assert (table, StudentGroup._meta.db_table, 'c') in foreign_keys
+        assert (table, Question._meta.db_table, 'c') in foreign_keys
+    assert len(foreign_keys) == 2 * len(partitions)
+
+# --- Analytics Cache ---
+
+def test_analytics_cache_serves_stale_and_revalidates_once(settings):
+    from django.core.cache import cache
+    cache.clear()
+    settings.ANALYTICS_CACHE_BACKGROUND_REFRESH = False
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert analytics_cache.get_or_compute({'group_by': 'topic'}, compute) == (1, 'miss')
+    assert analytics_cache.get_or_compute({'group_by': 'topic'}, compute) == (1, 'hit')
+    assert analytics_cache.get_or_compute({'group_by': 'group'}, compute) == (2, 'miss')
+
+    analytics_cache.bump_version()
+    cache.add(analytics_cache._entry_key({'group_by': 'topic'}) + ':lock', True)
+    # Otra petición está recalculando: se sirve el resultado anterior sin esperar
+    assert analytics_cache.get_or_compute({'group_by': 'topic'}, compute) == (1, 'stale')
+    assert len(calls) == 2
+
+    cache.delete(analytics_cache._entry_key({'group_by': 'topic'}) + ':lock')
+    assert analytics_cache.get_or_compute({'group_by': 'topic'}, compute) == (3, 'stale')
+    assert analytics_cache.get_or_compute({'group_by': 'topic'}, compute) == (3, 'hit')
+    assert analytics_cache.stats()['miss'] == 2
+
+def test_analytics_cache_version_is_shared_between_processes(settings):
+    from django.core.cache import cache
+    from django.db.models import F
+    from apps.evaluation.api.models import AnalyticsVersion
+    cache.clear()
+    settings.ANALYTICS_CACHE_BACKGROUND_REFRESH = False
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert analytics_cache.get_or_compute({'group_by': 'topic'}, compute) == (1, 'miss')
+    # Otro worker vuelca contadores: solo cambia la fila de la BD, no la caché de este proceso
+    AnalyticsVersion.objects.filter(pk=1).update(version=F('version') + 1)
+    assert analytics_cache.get_or_compute({'group_by': 'topic'}, compute) == (2, 'stale')
+    assert analytics_cache.get_or_compute({'group_by': 'topic'}, compute) == (2, 'hit')
+
+    # Tras un borrado no se sirve lo anterior: se espera al recálculo
+    analytics_cache.bump_version(reset=True)
+    assert analytics_cache.get_or_compute({'group_by': 'topic'}, compute) == (3, 'miss')
+
+# --- Batched Statistics ---
+
+def test_statistics_counts_every_dimension_in_one_query(subject, student_groupA, student_groupB, topic1, concept1, question_with_answers, question_with_answers_2, django_assert_num_queries):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    QuestionRelatedToConcept.objects.create(question=question_with_answers_2, concept=concept1)
+    counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True), (question_with_answers_2.id, False)]))
+    counters.apply_increments(counters.merge_increments(student_groupB.id, [(question_with_answers.id, False)], shard=2))
+
+    with django_assert_num_queries(1):
+        by_question = statistics.counts('question', [question_with_answers.id, question_with_answers_2.id, 999])
+    assert by_question == {question_with_answers.id: (2, 1), question_with_answers_2.id: (1, 0), 999: (0, 0)}
+    assert statistics.counts('group', [student_groupA.id, student_groupB.id]) == {student_groupA.id: (2, 1), student_groupB.id: (1, 0)}
+    assert statistics.counts('subject', [subject.id]) == {subject.id: (3, 1)}
+    assert statistics.counts('topic', [topic1.id]) == {topic1.id: (2, 1)}
+    assert statistics.counts('concept', [concept1.id]) == {concept1.id: (1, 0)}
+
+    ev_counts, correct_counts = statistics.count_arrays('question', [999, question_with_answers.id, question_with_answers_2.id])
+    assert ev_counts.tolist() == [0, 2, 1]
+    assert correct_counts.tolist() == [0, 1, 0]
+
+def test_count_selectors_return_totals(student_groupA, topic1, concept1, question_with_answers):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    QuestionRelatedToConcept.objects.create(question=question_with_answers, concept=concept1)
+    counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)] * 2))
+
+    assert selectors.get_ev_count_by_group(student_groupA.id) == 2
+    assert selectors.get_correct_count_by_group(student_groupA.id) == 2
+    assert selectors.get_ev_count_by_topic(topic1.id) == 2
+    assert selectors.get_correct_count_by_concept(concept1.id) == 2
+
+def test_get_questions_by_subject_uses_subject_topics(subject, topic1, topic2, question_with_answers, question_with_answers_2):
+    from apps.courses.api.models import SubjectIsAboutTopic
+    SubjectIsAboutTopic.objects.create(subject=subject, topic=topic1, order_id=1)
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    QuestionBelongsToTopic.objects.create(question=question_with_answers_2, topic=topic2)
+
+    assert selectors.get_questions_by_subject(subject) == {question_with_answers}
+
+def test_statistics_crosstab_pivots_and_trims(subject, student_groupA, student_groupB, topic1, topic2, question_with_answers, question_with_answers_2):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    QuestionBelongsToTopic.objects.create(question=question_with_answers_2, topic=topic2)
+    counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True), (question_with_answers_2.id, False)]))
+    counters.apply_increments(counters.merge_increments(student_groupB.id, [(question_with_answers_2.id, False)] * 3))
+
+    table = statistics.crosstab('topic', 'group')
+
+    assert table.row_ids.tolist() == [topic1.id, topic2.id]
+    assert table.column_ids.tolist() == [student_groupA.id, student_groupB.id]
+    assert table.attempts.tolist() == [[1, 0], [1, 3]]
+    assert table.accuracy_rows() == [[100.0, None], [0.0, 0.0]]
+
+    trimmed = table.top(rows=1, columns=1)
+    assert (trimmed.row_ids.tolist(), trimmed.column_ids.tolist(), trimmed.attempts.tolist()) == ([topic2.id], [student_groupB.id], [[3]])
+    with pytest.raises(ValueError):
+        statistics.crosstab('group', 'group')
+
+def test_item_stats_smooths_and_flags_outliers(settings, teacher, student_groupA, student_groupB, question_with_answers, question_with_answers_2):
+    settings.QUESTION_STATS_MIN_ATTEMPTS = 20
+    rare = services.create_question(teacher=teacher, type='multiple', statement_es='Poco vista', statement_en='Rarely seen')
+    counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)] * 30))
+    counters.apply_increments(counters.merge_increments(student_groupA.id, [(question_with_answers_2.id, False)] * 20))
+    counters.apply_increments(counters.merge_increments(student_groupB.id, [(question_with_answers_2.id, False)] * 10, shard=1))
+    counters.apply_increments(counters.merge_increments(student_groupB.id, [(question_with_answers_2.id, False)] * 10, shard=2))
+    counters.apply_increments(counters.merge_increments(student_groupB.id, [(rare.id, True), (rare.id, False)]))
+
+    assert item_stats.refresh() == 3
+    easy = QuestionStats.objects.get(question=question_with_answers)
+    hard = QuestionStats.objects.get(question=question_with_answers_2)
+    unknown = QuestionStats.objects.get(question=rare)
+
+    assert (easy.attempts, easy.correct, easy.groups, easy.flag) == (30, 30, 1, 'too_easy')
+    # Los contadores repartidos del grupo B cuentan como un solo grupo
+    assert (hard.attempts, hard.correct, hard.groups, hard.flag) == (40, 0, 2, 'too_hard')
+    assert unknown.flag == 'insufficient_data'
+    # La prior acerca la p a la media del banco (31/72) sin llegar a 0 o 1
+    assert 0 < hard.ci_low <= hard.p_value <= hard.ci_high < 31 / 72 < easy.p_value < 1
+    assert unknown.ci_high - unknown.ci_low > easy.ci_high - easy.ci_low
+    assert item_stats.summary()['flags'] == {'': 0, 'too_hard': 1, 'too_easy': 1, 'negative_discrimination': 0, 'insufficient_data': 1}
+
+    # Recalcular sustituye la tabla y deja fuera las preguntas antiguas
+    Question.objects.filter(pk=rare.pk).update(old=True)
+    assert item_stats.refresh() == 2
+    assert not QuestionStats.objects.filter(question=rare).exists()
+
+def test_mastery_vector_applies_deltas_from_writes(settings, subject, student_groupA, topic1, concept1, concept2, question_with_answers, question_with_answers_2, django_assert_num_queries, write_counters):
+    from apps.courses.api.models import SubjectIsAboutTopic
+    settings.GROUP_MASTERY_PRIOR_STRENGTH = 2
+    SubjectIsAboutTopic.objects.create(subject=subject, topic=topic1, order_id=1)
+    QuestionRelatedToConcept.objects.create(question=question_with_answers, concept=concept1)
+    QuestionRelatedToConcept.objects.create(question=question_with_answers_2, concept=concept2)
+    write_counters(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True)] * 3))
+
+    vector = mastery.get_vector(student_groupA)
+    assert (vector['concept_ids'], vector['attempts'], vector['correct']) == ([concept1.id, concept2.id], [3, 0], [3, 0])
+    # Sin evaluaciones el concepto sale con el acierto global del grupo
+    assert [item['mastery'] for item in mastery.top(vector, 6)] == [100.0, 100.0]
+
+    # Cada lote suma sus deltas a la tabla (compartida por todos los procesos) y leer el vector es una consulta
+    write_counters(counters.merge_increments(student_groupA.id, [(question_with_answers_2.id, False)] * 3))
+    write_counters(counters.merge_increments(student_groupA.id, [(question_with_answers.id, False)], shard=1))
+    assert dict(GroupConceptRollup.objects.values_list('concept_id', 'attempts')) == {concept1.id: 4, concept2.id: 3}
+    with django_assert_num_queries(1):
+        vector = mastery.get_vector(student_groupA)
+    assert (vector['attempts'], vector['correct']) == ([4, 3], [3, 0])
+    items = mastery.top(vector, 1, 'en')
+    assert items == [{'id': concept1.id, 'name': 'Concept 1', 'mastery': 64.29, 'attempts': 4, 'correct': 3}]
+
+    # Quitar un concepto de una pregunta o borrar contadores resta sus totales
+    QuestionRelatedToConcept.objects.filter(question=question_with_answers_2).delete()
+    assert mastery.get_vector(student_groupA)['attempts'] == [4, 0]
+    rollups.delete_counters(QuestionEvaluationGroup.objects.filter(shard=1))
+    assert mastery.get_vector(student_groupA)['attempts'] == [3, 0]
+
+    # La reconstrucción deja la misma tabla
+    GroupConceptRollup.objects.update(attempts=0, correct=0)
+    rollups.rebuild()
+    assert list(GroupConceptRollup.objects.values_list('concept_id', 'attempts', 'correct')) == [(concept1.id, 3, 3)]
+
+def test_exports_read_in_keyset_chunks(settings, subject, student_groupA, student_groupB, topic1, question_with_answers, question_with_answers_2, django_assert_num_queries, write_counters):
+    settings.ANALYTICS_EXPORT_CHUNK_SIZE = 2
+    write_counters(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True), (question_with_answers_2.id, False)]))
+    write_counters(counters.merge_increments(student_groupB.id, [(question_with_answers.id, False)], shard=1))
+
+    records = exports.rows('raw', 'question')
+    # Nada se consulta hasta consumir el generador; luego una consulta por trozo de 2 filas
+    with django_assert_num_queries(2):
+        raw = list(records)
+    assert [(row['group_id'], row['question_id'], row['shard'], row['attempts'], row['correct']) for row in raw] == [
+        (student_groupA.id, question_with_answers.id, 0, 1, 1),
+        (student_groupA.id, question_with_answers_2.id, 0, 1, 0),
+        (student_groupB.id, question_with_answers.id, 1, 1, 0),
+    ]
+
+    aggregate = list(exports.rows('aggregate', 'question', subject_id=subject.id))
+    assert [(row['id'], row['attempts'], row['failures'], row['accuracy']) for row in aggregate] == [
+        (question_with_answers.id, 2, 1, 50.0), (question_with_answers_2.id, 1, 1, 0.0),
+    ]
+    window = events.parse_window('2000-01-01', '2000-02-01')
+    assert list(exports.rows('raw', 'question', window=window)) == []
+
+    lines = list(exports.stream('csv', ['id', 'label'], [{'id': 1, 'label': 'a,b'}]))
+    assert lines == ['id,label\r\n', '1,"a,b"\r\n']
+
+def test_delete_in_chunks_uses_short_batches_and_reports_progress(settings, subject, student_groupA, student_groupB, question_with_answers, question_with_answers_2, write_counters):
+    from apps.utils.deletions import delete_in_chunks
+    settings.DELETION_CHUNK_SIZE = 2
+    for group in (student_groupA, student_groupB):
+        write_counters(counters.merge_increments(group.id, [(question_with_answers.id, True), (question_with_answers_2.id, False)]))
+    write_counters(counters.merge_increments(student_groupA.id, [(question_with_answers.id, False)], shard=1))
+
+    batches = []
+    deleted = delete_in_chunks(QuestionEvaluationGroup.objects.filter(group=student_groupA), rollups.delete_counters, batches.append)
+
+    assert (deleted, batches) == (3, [2, 1])
+    assert not QuestionEvaluationGroup.objects.filter(group=student_groupA).exists()
+    # Cada lote resta sus contadores de los agregados
+    assert _rollup('group', student_groupA.id) == (0, 0)
+    assert _rollup('subject', subject.id) == (2, 1)
+
+def test_delete_question_subtracts_counters_from_rollups(subject, teacher, student_groupA, topic1, question_with_answers, question_with_answers_2, write_counters):
+    QuestionBelongsToTopic.objects.create(question=question_with_answers, topic=topic1)
+    write_counters(counters.merge_increments(student_groupA.id, [(question_with_answers.id, True), (question_with_answers_2.id, False)]))
+
+    services.delete_question(teacher, question_with_answers)
+
+    assert _rollup('group', student_groupA.id) == (1, 0)
+    assert _rollup('topic', topic1.id) == (0, 0)
+    assert not EvaluationEvent.objects.filter(question_id=question_with_answers.id).exists()
+
+def test_concept_links_compute_matches_pairwise_statistics():
+    import numpy as np
+    rng = np.random.default_rng(7)
+    attempts = rng.integers(0, 12, size=(30, 300)).astype(float)
+    correct = np.floor(attempts * rng.random((30, 300)))
+    pairs = concept_links.compute(attempts, correct)
+
+    source, target, score, correlation, co_failure, groups = pairs[0]
+    shared = (attempts[:, source] >= 3) & (attempts[:, target] >= 3)
+    x = correct[shared, source] / attempts[shared, source]
+    y = correct[shared, target] / attempts[shared, target]
+    assert groups == shared.sum()
+    assert correlation == pytest.approx(np.corrcoef(x, y)[0, 1])
+    assert co_failure == pytest.approx(np.dot(1 - x, 1 - y) / np.linalg.norm(1 - x) / np.linalg.norm(1 - y))
+    assert score == pytest.approx((max(correlation, 0) + co_failure) / 2)
+    # Como mucho CONCEPT_LINKS_TOP_K por concepto y nunca consigo mismo
+    assert max(np.bincount([pair[0] for pair in pairs])) <= 5
+    assert all(pair[0] != pair[1] for pair in pairs)
+
+def test_concept_links_refresh_suggests_concepts_failed_together(settings, teacher, subject, concept1, concept2):
+    settings.CONCEPT_LINKS_MIN_GROUPS = 3
+    unrelated = content_services.create_concept(name_es="Concepto 3", name_en="Concept 3", teacher=teacher)
+    questions = {}
+    for concept in (concept1, concept2, unrelated):
+        questions[concept.id] = services.create_question(teacher=teacher, type='multiple', statement_es=f'P {concept.id}', statement_en=f'Q {concept.id}')
+        QuestionRelatedToConcept.objects.create(question=questions[concept.id], concept=concept)
+    # Los conceptos 1 y 2 suben y bajan juntos entre grupos; el 3 al revés
+    for i, hits in enumerate([1, 2, 3, 4]):
+        group = course_services.create_student_group(subject=subject, name_es=f"G{i}", name_en=f"G{i}", teacher=teacher)
+        graded = []
+        for concept, correct in ((concept1, hits), (concept2, hits), (unrelated, 5 - hits)):
+            graded += [(questions[concept.id], True)] * correct + [(questions[concept.id], False)] * (5 - correct)
+        counters.apply_increments(counters.merge_increments(group.id, [(question.id, ok) for question, ok in graded]))
+
+    assert concept_links.refresh() > 0
+    best = ConceptLinkSuggestion.objects.filter(concept_from=concept1).order_by('-score').first()
+    assert (best.concept_to_id, best.groups, best.correlation) == (concept2.id, 4, 1.0)
+    assert list(concept_links.suggestions(concept1.id).values_list('concept_to_id', flat=True))[0] == concept2.id
+
+    # Las relaciones ya creadas no se sugieren
+    content_services.link_concepts(concept2, concept1)
+    assert concept2.id not in concept_links.suggestions(concept1.id).values_list('concept_to_id', flat=True)
+    concept_links.refresh()
+    assert not ConceptLinkSuggestion.objects.filter(concept_from=concept1, concept_to=concept2).exists()
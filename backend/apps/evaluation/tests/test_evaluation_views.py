@@ -0,0 +1,662 @@
+import gzip
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+from apps.content.domain import services as content_services
+from apps.courses.api.models import Subject, StudentGroup, SubjectIsAboutTopic
+from apps.evaluation.api.models import QuestionBelongsToTopic, QuestionRelatedToConcept, QuestionEvaluationGroup, ExamAttempt, ExamVariant, QuestionStats, DeletionJob
+from apps.evaluation.domain import services, manifests, recommendations, variants, counters, item_stats
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+CustomTeacher = get_user_model()
+
+class ExamViewSetTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = CustomTeacher.objects.create(
+            email="admin@admin.com",
+            password="admin123",
+            is_super=True,
+            username="admin"
+        )
+        self.subject = Subject.objects.create(
+            name_es="Matemáticas",
+            name_en="Mathematics",
+            description_es="Descripción en español",
+            description_en="Description in English"
+        )
+        self.student_group = StudentGroup.objects.create(
+            subject=self.subject,
+            teacher=self.teacher,
+            name_es="Grupo Inicial",
+            name_en="Initial Group",
+            groupCode="EXA-001"
+        )
+        self.topic = content_services.create_topic(
+            teacher=self.teacher, title_es="Tema 1", title_en="Topic 1",
+            description_es="Descripción", description_en="Description"
+        )
+        self.questions = []
+        for i in range(3):
+            question = services.create_question(teacher=self.teacher, type='multiple', statement_es=f'P{i}', statement_en=f'Q{i}',
+                                                explanation_es=f'Explicación {i}')
+            services.create_answer(teacher=self.teacher, question=question, text_es='Sí', text_en='Yes', is_correct=True)
+            services.create_answer(teacher=self.teacher, question=question, text_es='No', text_en='No', is_correct=False)
+            QuestionBelongsToTopic.objects.create(question=question, topic=self.topic)
+            self.questions.append(question)
+
+    def _answers(self, exam, correct):
+        """Responde bien las `correct` primeras preguntas y mal el resto."""
+        answers = {}
+        for i, question in enumerate(exam):
+            answer = next(a for a in question['answers'] if a['is_correct'] == (i < correct))
+            answers[str(question['id'])] = str(answer['id'])
+        return answers
+
+    def test_generate_exam_returns_signed_manifest(self):
+        response = self.client.get(f"/exams/generate-exam/?topics=Tema 1&nQuestions=3&code={self.student_group.groupCode}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+        self.assertTrue(response[manifests.HEADER])
+
+    def test_evaluate_exam_with_manifest(self):
+        response = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3")
+        answers = self._answers(response.data, correct=2)
+
+        response = self.client.post("/exams/evaluate-exam/", {
+            "student_group_code": self.student_group.groupCode,
+            "questions_and_answers": answers,
+            "manifest": response[manifests.HEADER],
+        }, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['mark'], 2)
+        self.assertEqual(len(response.data['explanations']), 1)
+        self.assertEqual(QuestionEvaluationGroup.objects.filter(group=self.student_group).count(), 3)
+
+    def test_evaluate_exam_with_invalid_manifest_uses_database(self):
+        response = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3")
+        answers = self._answers(response.data, correct=3)
+
+        response = self.client.post("/exams/evaluate-exam/", {
+            "student_group_code": self.student_group.groupCode,
+            "questions_and_answers": answers,
+            "manifest": "manipulado",
+        }, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['mark'], 3)
+
+    def test_evaluate_exam_rejects_answers_outside_the_exam_on_both_paths(self):
+        other = services.create_question(teacher=self.teacher, type='multiple', statement_es='Otra', statement_en='Other')
+        foreign = services.create_answer(teacher=self.teacher, question=other, text_es='Sí', text_en='Yes', is_correct=True)
+        response = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3")
+        answers = self._answers(response.data, correct=3)
+        tampered = dict(answers, **{str(response.data[0]['id']): str(foreign.id)})
+        unknown = dict(answers, **{str(response.data[0]['id']): "999999"})
+
+        for body in (
+            {"questions_and_answers": tampered, "manifest": response[manifests.HEADER]},
+            {"questions_and_answers": tampered},
+            {"questions_and_answers": unknown, "manifest": response[manifests.HEADER]},
+            {"questions_and_answers": unknown},
+            {"questions_and_answers": {"x": "1"}},
+        ):
+            rejected = self.client.post("/exams/evaluate-exam/", dict(body, student_group_code=self.student_group.groupCode), format="json")
+            self.assertEqual(rejected.status_code, status.HTTP_400_BAD_REQUEST, body)
+            self.assertIn("detail", rejected.data)
+        self.assertFalse(QuestionEvaluationGroup.objects.exists())
+
+    def test_generate_exam_with_seed_is_reproducible_and_cacheable(self):
+        url = "/exams/generate-exam/?topics=Tema 1&nQuestions=2&seed=1234"
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first[manifests.SEED_HEADER], "1234")
+        self.assertIn("max-age", first["Cache-Control"])
+        self.assertIn("Accept-Language", first["Vary"])
+
+    def test_generate_exam_without_seed_echoes_generated_seed(self):
+        response = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3")
+        seed = response[manifests.SEED_HEADER]
+
+        replay = self.client.get(f"/exams/generate-exam/?topics=Tema 1&nQuestions=3&seed={seed}")
+        self.assertEqual(response.data, replay.data)
+        self.assertFalse(response.has_header("Cache-Control") and "max-age" in response["Cache-Control"])
+
+    def test_generate_exam_with_invalid_seed(self):
+        response = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3&seed=abc")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_generate_exam_with_difficulty(self):
+        response = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=2&difficulty=hard")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+        response = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=2&difficulty=imposible")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_evaluate_exams_in_batch(self):
+        with_manifest = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3")
+        without_manifest = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3")
+        exams = [
+            {
+                "student_group_code": self.student_group.groupCode,
+                "questions_and_answers": self._answers(with_manifest.data, correct=1),
+                "manifest": with_manifest[manifests.HEADER],
+            },
+            {"student_group_code": "NO-EXISTE", "questions_and_answers": {}},
+            {
+                "student_group_code": self.student_group.groupCode,
+                "questions_and_answers": self._answers(without_manifest.data, correct=3),
+            },
+        ]
+
+        recommendations.get_index()
+        # Grupos, preguntas, respuestas, la escritura de contadores, agregados, franjas y exámenes (más los savepoints)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/exams/evaluate-exams/", {"exams": exams}, format="json")
+        self.assertLessEqual(len(queries), 15)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([result.get('mark') for result in results], [1, None, 3])
+        self.assertEqual(len(results[0]['explanations']), 2)
+        self.assertIn('detail', results[1])
+        counts = QuestionEvaluationGroup.objects.filter(group=self.student_group)
+        self.assertEqual(sum(counts.values_list('ev_count', flat=True)), 6)
+        self.assertEqual(sum(counts.values_list('correct_count', flat=True)), 4)
+        self.assertEqual(sorted(ExamAttempt.objects.values_list('mark', flat=True)), [1, 3])
+
+    def test_evaluate_exams_rejects_foreign_answer_only_in_its_exam(self):
+        other = services.create_question(teacher=self.teacher, type='multiple', statement_es='Otra', statement_en='Other')
+        foreign = services.create_answer(teacher=self.teacher, question=other, text_es='Sí', text_en='Yes', is_correct=True)
+        exam = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3").data
+        exams = [
+            {"student_group_code": self.student_group.groupCode, "questions_and_answers": {str(exam[0]['id']): str(foreign.id)}},
+            {"student_group_code": self.student_group.groupCode, "questions_and_answers": self._answers(exam, correct=3)},
+        ]
+
+        response = self.client.post("/exams/evaluate-exams/", {"exams": exams}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('detail', response.data['results'][0])
+        self.assertEqual(response.data['results'][1]['mark'], 3)
+
+    def test_evaluate_exam_retry_with_submission_id_counts_once(self):
+        exam = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3").data
+        body = {
+            "student_group_code": self.student_group.groupCode,
+            "questions_and_answers": self._answers(exam, correct=2),
+            "submission_id": "movil-1",
+        }
+
+        first = self.client.post("/exams/evaluate-exam/", body, format="json")
+        retry = self.client.post("/exams/evaluate-exam/", body, format="json")
+
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, first.data)
+        counts = QuestionEvaluationGroup.objects.filter(group=self.student_group)
+        self.assertEqual(sum(counts.values_list('ev_count', flat=True)), 3)
+
+    def test_evaluate_exams_skips_already_submitted(self):
+        exam = self.client.get("/exams/generate-exam/?topics=Tema 1&nQuestions=3").data
+        submission = {
+            "student_group_code": self.student_group.groupCode,
+            "questions_and_answers": self._answers(exam, correct=1),
+            "submission_id": "movil-2",
+        }
+        self.client.post("/exams/evaluate-exam/", submission, format="json")
+
+        response = self.client.post("/exams/evaluate-exams/", {"exams": [submission, submission]}, format="json")
+
+        self.assertEqual([result['mark'] for result in response.data['results']], [1, 1])
+        counts = QuestionEvaluationGroup.objects.filter(group=self.student_group)
+        self.assertEqual(sum(counts.values_list('ev_count', flat=True)), 3)
+
+    def test_generate_exam_from_blueprint(self):
+        response = self.client.post("/exams/generate-from-blueprint/", {
+            "nQuestions": 4,
+            "topics": [{"title": "Tema 1", "min": 2}],
+            "seed": 3,
+        }, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['questions']), 3)
+        self.assertEqual(response.data['relaxed'], [{'constraint': 'num_questions', 'required': 4, 'achieved': 3}])
+        self.assertTrue(response[manifests.HEADER])
+
+    def test_generate_exam_from_blueprint_with_unknown_topic(self):
+        response = self.client.post("/exams/generate-from-blueprint/", {
+            "nQuestions": 2, "topics": [{"title": "No existe"}],
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_evaluate_exams_requires_a_list(self):
+        response = self.client.post("/exams/evaluate-exams/", {"exams": "x"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GameViewSetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomTeacher.objects.create(email="admin@admin.com", password="admin123", is_super=True, username="admin")
+        self.subject = Subject.objects.create(name_es="Matemáticas", name_en="Mathematics")
+        self.other_subject = Subject.objects.create(name_es="Física", name_en="Physics")
+        self.student_group = StudentGroup.objects.create(subject=self.subject, teacher=self.teacher, name_es="Grupo", name_en="Group", groupCode="GAM-001")
+        topic = content_services.create_topic(teacher=self.teacher, title_es="Tema 1", title_en="Topic 1")
+        other_topic = content_services.create_topic(teacher=self.teacher, title_es="Tema 2", title_en="Topic 2")
+        SubjectIsAboutTopic.objects.create(subject=self.subject, topic=topic, order_id=1)
+        SubjectIsAboutTopic.objects.create(subject=self.other_subject, topic=other_topic, order_id=1)
+        self.question_ids = set()
+        for i in range(25):
+            question = services.create_question(teacher=self.teacher, type='multiple', statement_es=f'P{i}', statement_en=f'Q{i}')
+            services.create_answer(teacher=self.teacher, question=question, text_es='Sí', text_en='Yes', is_correct=True)
+            QuestionBelongsToTopic.objects.create(question=question, topic=topic)
+            self.question_ids.add(question.id)
+        other = services.create_question(teacher=self.teacher, type='multiple', statement_es='Otra', statement_en='Other')
+        QuestionBelongsToTopic.objects.create(question=other, topic=other_topic)
+
+    def test_game_questions_without_params(self):
+        response = self.client.get("/game/questions")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(0 < len(response.data['results']) <= 10)
+        self.assertIn("cursor=", response.data['next'])
+
+    def test_game_cursor_walks_the_whole_subject_deck(self):
+        response = self.client.get(f"/game/questions/?code={self.student_group.groupCode}")
+        seen = [question['id'] for question in response.data['results']]
+        for _ in range(2):
+            with self.assertNumQueries(1):  # solo el grupo del ?code=
+                response = self.client.get(response.data['next'])
+            seen += [question['id'] for question in response.data['results']]
+
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(set(seen), self.question_ids)
+
+    def test_new_games_do_not_query_the_database(self):
+        self.client.get(f"/game/questions/?subject={self.subject.id}")
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/game/questions/?subject={self.subject.id}")
+        self.assertTrue(set(question['id'] for question in response.data['results']) <= self.question_ids)
+
+    def test_game_cursor_needs_no_server_state(self):
+        first = self.client.get(f"/game/questions/?subject={self.subject.id}")
+        # Los lotes siguientes leen su tramo del mazo guardado sin volver a derivarlo
+        with patch('apps.evaluation.domain.game.deck') as deck:
+            second = self.client.get(first.data['next'])
+        deck.assert_not_called()
+        # Otro worker (o la caché vaciada) deriva el mismo mazo desde el cursor
+        cache.clear()
+        self.assertEqual(self.client.get(first.data['next']).data['results'], second.data['results'])
+        third = self.client.get(second.data['next'])
+
+        seen = [question['id'] for response in (first, second, third) for question in response.data['results']]
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(set(seen), self.question_ids)
+
+    def test_game_ignores_tampered_cursor(self):
+        response = self.client.get(f"/game/questions/?subject={self.subject.id}&cursor=manipulado")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['results'])
+
+
+class PublishedExamTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomTeacher.objects.create(email="admin@admin.com", password="admin123", is_super=True, username="admin")
+        self.subject = Subject.objects.create(name_es="Matemáticas", name_en="Mathematics")
+        self.student_group = StudentGroup.objects.create(
+            subject=self.subject, teacher=self.teacher, name_es="Grupo", name_en="Group", groupCode="PUB-001"
+        )
+        topic = content_services.create_topic(
+            teacher=self.teacher, title_es="Tema 1", title_en="Topic 1", description_es="D", description_en="D"
+        )
+        other_topic = content_services.create_topic(
+            teacher=self.teacher, title_es="Tema 2", title_en="Topic 2", description_es="D", description_en="D"
+        )
+        practice = services.create_question(teacher=self.teacher, type='multiple', statement_es='Práctica', statement_en='Practice')
+        services.create_answer(teacher=self.teacher, question=practice, text_es='Sí', text_en='Yes', is_correct=True)
+        QuestionBelongsToTopic.objects.create(question=practice, topic=other_topic)
+        for i in range(6):
+            question = services.create_question(teacher=self.teacher, type='multiple', statement_es=f'P{i}', statement_en=f'Q{i}')
+            services.create_answer(teacher=self.teacher, question=question, text_es='Sí', text_en='Yes', is_correct=True)
+            services.create_answer(teacher=self.teacher, question=question, text_es='No', text_en='No', is_correct=False)
+            QuestionBelongsToTopic.objects.create(question=question, topic=topic)
+
+    def _publish(self, **data):
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.post("/published-exams/", {
+            "code": "PUB-001", "topics": ["Tema 1"], "nQuestions": 3, "variants": 4, **data,
+        }, format="json")
+        self.client.force_authenticate(user=None)
+        return response
+
+    def test_publish_creates_variants_per_language(self):
+        response = self._publish()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ExamVariant.objects.filter(exam_id=response.data['id']).count(), 8)
+
+    def test_publish_requires_group_owner(self):
+        other = CustomTeacher.objects.create(email="otro@admin.com", password="x", username="otro")
+        self.client.force_authenticate(user=other)
+        response = self.client.post("/published-exams/", {
+            "code": "PUB-001", "topics": ["Tema 1"], "nQuestions": 3, "variants": 4,
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_student_gets_variant_with_single_lookup(self):
+        self._publish(seed=100)
+        first = self.client.get("/studentgroups/exam/?code=PUB-001&topics=Tema 1&nQuestions=3&variant=2")
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first[variants.HEADER], "2")
+        self.assertEqual(first[manifests.SEED_HEADER], "102")
+        self.assertEqual(len(json.loads(first.content)), 3)
+
+        # Solo se busca el grupo: el examen activo y la variante salen de la caché
+        with self.assertNumQueries(1):
+            again = self.client.get("/studentgroups/exam/?code=PUB-001&topics=Tema 1&nQuestions=3&variant=2")
+        self.assertEqual(again.content, first.content)
+
+        by_key = self.client.get("/studentgroups/exam/?code=PUB-001&topics=Tema 1&nQuestions=3&key=alumno-7")
+        self.assertEqual(by_key[variants.HEADER], self.client.get("/studentgroups/exam/?code=PUB-001&topics=Tema 1&nQuestions=3&key=alumno-7")[variants.HEADER])
+
+    def test_variant_is_sent_compressed_and_graded_with_manifest(self):
+        self._publish()
+        response = self.client.get("/studentgroups/exam/?code=PUB-001&topics=Tema 1&nQuestions=3&variant=0", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response['Content-Encoding'], "gzip")
+        exam = json.loads(gzip.decompress(response.content))
+
+        answers = {str(q['id']): str(next(a['id'] for a in q['answers'] if a['is_correct'])) for q in exam}
+        result = self.client.post("/exams/evaluate-exam/", {
+            "student_group_code": "PUB-001", "questions_and_answers": answers, "manifest": response[manifests.HEADER],
+        }, format="json")
+        self.assertEqual(result.data['mark'], 3)
+
+    def test_practice_exams_of_the_group_are_still_generated(self):
+        self._publish()
+        # Mismos temas (en cualquier idioma) y número de preguntas: variante publicada
+        published = self.client.get("/studentgroups/exam/?code=PUB-001&topics=Topic 1&nQuestions=3&variant=1")
+        self.assertEqual(published[variants.HEADER], "1")
+
+        for query, size in (("topics=Tema 2&nQuestions=1", 1), ("topics=Tema 1,Tema 2&nQuestions=3", 3), ("topics=Tema 1&nQuestions=2", 2)):
+            response = self.client.get(f"/studentgroups/exam/?code=PUB-001&{query}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(response.has_header(variants.HEADER))
+            self.assertEqual(len(response.data), size)
+
+    def test_unpublished_exam_falls_back_to_generation(self):
+        exam_id = self._publish().data['id']
+        self.client.force_authenticate(user=self.teacher)
+        self.assertEqual(self.client.delete(f"/published-exams/{exam_id}/").status_code, status.HTTP_204_NO_CONTENT)
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get("/studentgroups/exam/?code=PUB-001&topics=Tema 1&nQuestions=2")
+        self.assertEqual(len(response.data), 2)
+        self.assertFalse(response.has_header(variants.HEADER))
+
+
+@override_settings(ANALYTICS_CACHE_BACKGROUND_REFRESH=False)
+class AnalyticsViewSetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomTeacher.objects.create(email="admin@admin.com", password="admin123", is_super=True, username="admin")
+        self.subject = Subject.objects.create(name_es="Matemáticas", name_en="Mathematics")
+        self.other_subject = Subject.objects.create(name_es="Física", name_en="Physics")
+        self.group = StudentGroup.objects.create(subject=self.subject, teacher=self.teacher, name_es="Grupo A", name_en="Group A")
+        self.other_group = StudentGroup.objects.create(subject=self.other_subject, teacher=self.teacher, name_es="Grupo B", name_en="Group B")
+        self.topic = content_services.create_topic(
+            teacher=self.teacher, title_es="Derivadas e integrales", title_en="Derivatives", description_es="D", description_en="D"
+        )
+        self.question = services.create_question(teacher=self.teacher, type='multiple', statement_es='P1', statement_en='Q1')
+        self.other_question = services.create_question(teacher=self.teacher, type='multiple', statement_es='P2', statement_en='Q2')
+        QuestionBelongsToTopic.objects.create(question=self.question, topic=self.topic)
+        # Los agregados se vuelcan al confirmarse (ver rollups.flush)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.apply_increments(counters.merge_increments(self.group.id, [(self.question.id, True), (self.question.id, False)]))
+            counters.apply_increments(counters.merge_increments(self.other_group.id, [(self.other_question.id, False)] * 3))
+
+    def test_performance_by_topic_reads_rollups(self):
+        response = self.client.get("/analytics/performance/", {"group_by": "topic"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{
+            'id': self.topic.id, 'label': 'Derivadas e int...', 'full_label': 'Derivadas e integrales',
+            'value': 50.0, 'attempts': 2, 'total_failures': 1.0,
+        }])
+
+    def test_performance_by_question_filters_subject_and_orders_by_failures(self):
+        response = self.client.get("/analytics/performance/", {"group_by": "question"}, HTTP_ACCEPT_LANGUAGE='en')
+        self.assertEqual([item['id'] for item in response.data], [self.other_question.id, self.question.id])
+        self.assertEqual(response.data[0]['full_label'], f"Q{self.other_question.id}: Q2")
+
+        response = self.client.get("/analytics/performance/", {"group_by": "question", "subject_id": self.subject.id})
+        self.assertEqual([item['id'] for item in response.data], [self.question.id])
+
+    def test_reset_analytics_by_subject_updates_rollups(self):
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.delete(f"/analytics/reset-analytics/?scope=subject&subject_id={self.other_subject.id}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get("/analytics/performance/", {"group_by": "group"})
+        self.assertEqual([item['id'] for item in response.data], [self.group.id])
+        self.assertFalse(QuestionEvaluationGroup.objects.filter(group=self.other_group).exists())
+
+    @override_settings(DELETION_SYNC_MAX_ROWS=1)
+    def test_large_reset_runs_in_background_job(self):
+        class InlineThread:
+            def __init__(self, target, **kwargs):
+                self.target = target
+
+            def start(self):
+                self.target()
+
+        self.client.force_authenticate(user=self.teacher)
+        with patch('apps.utils.deletions.threading.Thread', InlineThread), \
+                patch('apps.utils.deletions.close_old_connections'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete("/analytics/reset-analytics/?scope=global")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual((response.data['job']['status'], response.data['job']['total']), ('running', 2))
+
+        # El trabajo está en la BD: otro worker (sin nada en su caché local) lo ve igual
+        cache.clear()
+        job = self.client.get(f"/analytics/deletion-jobs/{response.data['job']['id']}/").data
+        self.assertEqual((job['status'], job['deleted']), ('done', 2))
+        self.assertFalse(QuestionEvaluationGroup.objects.exists())
+        self.assertEqual(self.client.get("/analytics/deletion-jobs/unknown/").status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(DELETION_JOB_STALE_AFTER=60)
+    def test_deletion_job_of_a_dead_worker_is_reported_failed(self):
+        self.client.force_authenticate(user=self.teacher)
+        DeletionJob.objects.create(id='alive', kind='topic', total=10, deleted=5)
+        DeletionJob.objects.create(id='dead', kind='topic', total=10, deleted=5, updated_at=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(self.client.get("/analytics/deletion-jobs/alive/").data['status'], 'running')
+        job = self.client.get("/analytics/deletion-jobs/dead/").data
+        self.assertEqual((job['status'], job['deleted'], job['error']), ('failed', 5, 'Interrupted'))
+        self.assertIsNotNone(job['finished_at'])
+
+    def test_performance_time_window_with_trend(self):
+        response = self.client.get("/analytics/performance/", {"group_by": "group", "bucket": "day"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data], [self.other_group.id, self.group.id])
+        self.assertEqual([point['attempts'] for point in response.data[1]['series']], [2])
+
+        response = self.client.get("/analytics/performance/", {"group_by": "group", "from": "2000-01-01", "to": "2000-02-01"})
+        self.assertEqual(response.data, [])
+
+    def test_performance_rejects_invalid_window(self):
+        response = self.client.get("/analytics/performance/", {"from": "2026-13-45"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_performance_is_cached_until_counters_change(self):
+        first = self.client.get("/analytics/performance/", {"group_by": "group"})
+        self.assertEqual(first['X-Analytics-Cache'], 'MISS')
+        with self.assertNumQueries(1):  # solo la versión compartida de las analíticas
+            second = self.client.get("/analytics/performance/", {"group_by": "group"})
+        self.assertEqual(second['X-Analytics-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.apply_increments(counters.merge_increments(self.group.id, [(self.question.id, False)] * 5))
+        # Sin recálculo en segundo plano la propia petición revalida el resultado caducado
+        stale = self.client.get("/analytics/performance/", {"group_by": "group"})
+        self.assertEqual(stale['X-Analytics-Cache'], 'STALE')
+        self.assertEqual(stale.data[0]['id'], self.group.id)
+
+        stats = self.client.get("/analytics/cache-stats/").data
+        self.assertEqual((stats['hit'], stats['stale'], stats['miss']), (1, 1, 1))
+
+    def test_performance_is_not_served_stale_after_reset(self):
+        self.client.get("/analytics/performance/", {"group_by": "group"})
+        self.client.force_authenticate(user=self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/analytics/reset-analytics/?scope=subject&subject_id={self.other_subject.id}")
+
+        response = self.client.get("/analytics/performance/", {"group_by": "group"})
+        self.assertEqual(response['X-Analytics-Cache'], 'MISS')
+        self.assertEqual([item['id'] for item in response.data], [self.group.id])
+
+    def test_export_streams_csv_and_ndjson(self):
+        response = self.client.get("/analytics/export/", {"group_by": "question"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,label,attempts,correct,failures,accuracy')
+        self.assertEqual(lines[1:], [f'{self.question.id},P1,2,1,1,50.0', f'{self.other_question.id},P2,3,0,3,0.0'])
+
+        response = self.client.get("/analytics/export/", {"output": "ndjson", "level": "raw", "subject_id": self.subject.id})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows, [{
+            'group_id': self.group.id, 'subject_id': self.subject.id, 'question_id': self.question.id,
+            'shard': 0, 'attempts': 2, 'correct': 1,
+        }])
+
+        response = self.client.get("/analytics/export/", {"output": "ndjson", "level": "raw", "from": "2000-01-01", "to": "2000-02-01"})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_export_rejects_invalid_params(self):
+        for params in ({"output": "xlsx"}, {"level": "all"}, {"group_by": "teacher"}, {"from": "2026-13-45"}):
+            self.assertEqual(self.client.get("/analytics/export/", params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_crosstab_returns_columnar_matrix(self):
+        response = self.client.get("/analytics/crosstab/", {"rows": "topic", "columns": "group"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rows'], {'dimension': 'topic', 'ids': [self.topic.id], 'labels': ['Derivadas e integrales']})
+        self.assertEqual(response.data['columns']['ids'], [self.group.id])
+        self.assertEqual(response.data['attempts'], [[2]])
+        self.assertEqual(response.data['accuracy'], [[50.0]])
+
+        response = self.client.get("/analytics/crosstab/", {"rows": "question", "columns": "group", "top_rows": 1})
+        self.assertEqual(response.data['rows']['ids'], [self.other_question.id])
+        self.assertEqual(response.data['columns']['ids'], [self.other_group.id, self.group.id])
+        self.assertEqual(response.data['attempts'], [[3, 0]])
+
+        response = self.client.get("/analytics/crosstab/", {"rows": "group", "columns": "group"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(QUESTION_STATS_MIN_ATTEMPTS=5)
+class QuestionStatsViewTests(APITestCase):
+
+    def setUp(self):
+        self.teacher = CustomTeacher.objects.create(email="admin@admin.com", password="admin123", is_super=True, username="admin")
+        self.subject = Subject.objects.create(name_es="Matemáticas", name_en="Mathematics")
+        self.group = StudentGroup.objects.create(subject=self.subject, teacher=self.teacher, name_es="Grupo A", name_en="Group A")
+        self.easy = services.create_question(teacher=self.teacher, type='multiple', statement_es='Fácil', statement_en='Easy')
+        self.hard = services.create_question(teacher=self.teacher, type='multiple', statement_es='Difícil', statement_en='Hard')
+        self.new = services.create_question(teacher=self.teacher, type='multiple', statement_es='Nueva', statement_en='New')
+        counters.apply_increments(counters.merge_increments(self.group.id, [(self.easy.id, True)] * 10))
+        counters.apply_increments(counters.merge_increments(self.group.id, [(self.hard.id, False)] * 10))
+
+    def test_refresh_requires_teacher_and_returns_summary(self):
+        response = self.client.post("/questions/stats/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.post("/questions/stats/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(response.data['flags']['too_hard'], 1)
+        self.assertEqual(self.client.get("/questions/stats/").data['flags']['too_easy'], 1)
+
+    def test_long_questions_filter_and_order_by_stats(self):
+        item_stats.refresh()
+        response = self.client.get("/questions/long-questions/", {"flag": "too_hard"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([question['id'] for question in response.data], [self.hard.id])
+        self.assertEqual(response.data[0]['stats']['attempts'], 10)
+
+        response = self.client.get("/questions/long-questions/", {"ordering": "-p_value"})
+        self.assertEqual([question['id'] for question in response.data], [self.easy.id, self.new.id, self.hard.id])
+
+        # Las preguntas sin estadísticas van siempre al final
+        QuestionStats.objects.filter(question=self.new).delete()
+        response = self.client.get("/questions/long-questions/", {"ordering": "p_value"})
+        self.assertEqual([question['id'] for question in response.data], [self.hard.id, self.easy.id, self.new.id])
+        self.assertIsNone(response.data[2]['stats'])
+
+    def test_long_questions_rejects_unknown_flag_or_ordering(self):
+        self.assertEqual(self.client.get("/questions/long-questions/", {"flag": "weird"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get("/questions/long-questions/", {"ordering": "statement"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GroupMasteryViewTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomTeacher.objects.create(email="admin@admin.com", password="admin123", is_super=True, username="admin")
+        self.subject = Subject.objects.create(name_es="Matemáticas", name_en="Mathematics")
+        self.group = StudentGroup.objects.create(subject=self.subject, teacher=self.teacher, name_es="Grupo A", name_en="Group A", groupCode="HEX-001")
+        self.topic = content_services.create_topic(teacher=self.teacher, title_es="Tema 1", title_en="Topic 1", description_es="D", description_en="D")
+        SubjectIsAboutTopic.objects.create(subject=self.subject, topic=self.topic, order_id=1)
+        self.concepts = []
+        for i in range(3):
+            concept = content_services.create_concept(teacher=self.teacher, name_es=f"Concepto {i}", name_en=f"Concept {i}", description_es="D", description_en="D")
+            content_services.link_concept_to_topic(self.topic, concept, order_id=i)
+            question = services.create_question(teacher=self.teacher, type='multiple', statement_es=f'P{i}', statement_en=f'Q{i}')
+            QuestionRelatedToConcept.objects.create(question=question, concept=concept)
+            with self.captureOnCommitCallbacks(execute=True):
+                counters.apply_increments(counters.merge_increments(self.group.id, [(question.id, i % 2 == 0)] * (i + 1)))
+            self.concepts.append(concept)
+
+    def test_hexagon_returns_most_evaluated_concepts_from_rollups(self):
+        response = self.client.get("/studentgroups/hexagon/", {"code": "HEX-001", "n": 2}, HTTP_ACCEPT_LANGUAGE='en')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['concepts']], [self.concepts[2].id, self.concepts[1].id])
+        self.assertEqual(response.data['concepts'][0]['name'], 'Concept 2')
+        self.assertEqual(response.data['concepts'][1]['attempts'], 2)
+
+        # Solo se busca el grupo y se leen sus filas precalculadas
+        with self.assertNumQueries(2):
+            self.client.get("/studentgroups/hexagon/", {"code": "HEX-001"})
+
+    def test_hexagon_sees_writes_without_process_state(self):
+        self.client.get("/studentgroups/hexagon/", {"code": "HEX-001"})
+        question = QuestionRelatedToConcept.objects.get(concept=self.concepts[0]).question
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.apply_increments(counters.merge_increments(self.group.id, [(question.id, True)] * 5))
+        # Como otro worker: nada guardado en la caché local
+        cache.clear()
+
+        response = self.client.get("/studentgroups/hexagon/", {"code": "HEX-001", "n": 1})
+        self.assertEqual(response.data['concepts'][0]['id'], self.concepts[0].id)
+        self.assertEqual(response.data['concepts'][0]['attempts'], 6)
+
+    def test_hexagon_validates_code_and_n(self):
+        self.assertEqual(self.client.get("/studentgroups/hexagon/").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get("/studentgroups/hexagon/", {"code": "HEX-001", "n": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get("/studentgroups/hexagon/", {"code": "NOPE"}).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,98 @@
+import json
+import pytest
+from io import StringIO
+from django.core.management import call_command
+
+from apps.evaluation.domain import counters, write_behind, selectors, services
+from apps.evaluation.api.models import QuestionEvaluationGroup
+from apps.courses.domain import services as course_services
+from apps.customauth.models import CustomTeacher
+
+pytestmark = pytest.mark.django_db
+
+@pytest.fixture
+def teacher():
+    return CustomTeacher.objects.create_user(username="testteacher", password="password")
+
+@pytest.fixture
+def student_group(teacher):
+    subject = course_services.create_subject(name_es="Asignatura", name_en="Subject", teacher=teacher)
+    return course_services.create_student_group(subject=subject, name_es="Grupo 1", name_en="Group 1", teacher=teacher)
+
+@pytest.fixture
+def question(teacher):
+    question = services.create_question(teacher=teacher, type='multiple', statement_es='Q1', statement_en='Q1')
+    services.create_answer(teacher=teacher, question=question, text_es='A1', text_en='A1', is_correct=True)
+    return question
+
+@pytest.fixture
+def buffer(tmp_path):
+    buffer = write_behind.CounterBuffer(spill_dir=str(tmp_path), flush_interval=3600, max_pending=100)
+    yield buffer
+    buffer.close()
+
+def test_buffer_merges_increments_until_flush(buffer, student_group, question):
+    for is_correct in (True, False, True):
+        buffer.add(counters.merge_increments(student_group.id, [(question.id, is_correct)]))
+
+    assert buffer.pending_count() == 1
+    assert not QuestionEvaluationGroup.objects.filter(question=question).exists()
+
+    buffer.flush()
+
+    assert selectors.get_question_evaluation_ev_count(question) == 3
+    assert selectors.get_question_evaluation_correct_count(question) == 2
+    assert buffer.pending_count() == 0
+
+def test_buffer_flushes_when_threshold_is_reached(tmp_path, student_group, question):
+    buffer = write_behind.CounterBuffer(spill_dir=str(tmp_path), flush_interval=3600, max_pending=1)
+    try:
+        buffer.add(counters.merge_increments(student_group.id, [(question.id, True)]))
+        assert selectors.get_question_evaluation_ev_count(question) == 1
+    finally:
+        buffer.close()
+
+def test_orphan_spill_files_are_replayed(tmp_path, student_group, question):
+    orphan = tmp_path / 'counters-99999-dead.log'
+    orphan.write_text(json.dumps([[student_group.id, question.id, 0, 2, 1]]) + '\n' + '[[1, 2')
+
+    assert write_behind.replay_spill_files(str(tmp_path)) == 1
+
+    assert selectors.get_question_evaluation_ev_count(question) == 2
+    assert selectors.get_question_evaluation_correct_count(question) == 1
+    assert not orphan.exists()
+
+def test_orphan_spill_files_are_replayed_at_startup_not_by_workers(settings, tmp_path, student_group, question):
+    settings.EVALUATION_BUFFER_SPILL_DIR = str(tmp_path)
+    orphan = tmp_path / 'counters-99999-dead.log'
+    orphan.write_text(json.dumps([[student_group.id, question.id, 0, 2, 1]]) + '\n')
+
+    buffer = write_behind.CounterBuffer(spill_dir=str(tmp_path), flush_interval=3600, max_pending=100)
+    buffer.close()
+    assert orphan.exists()
+    assert selectors.get_question_evaluation_ev_count(question) == 0
+
+    # entrypoint.sh lo lanza antes de arrancar gunicorn
+    call_command('flush_evaluation_counters', stdout=StringIO())
+    assert selectors.get_question_evaluation_ev_count(question) == 2
+    assert not orphan.exists()
+
+def test_live_buffer_segments_are_not_replayed(buffer, tmp_path, student_group, question):
+    buffer.add(counters.merge_increments(student_group.id, [(question.id, True)]))
+
+    assert write_behind.replay_spill_files(str(tmp_path)) == 0
+    assert selectors.get_question_evaluation_ev_count(question) == 0
+
+def test_correct_exam_is_deferred_in_write_behind_mode(settings, tmp_path, student_group, question, django_capture_on_commit_callbacks):
+    settings.EVALUATION_WRITE_BEHIND = True
+    settings.EVALUATION_BUFFER_SPILL_DIR = str(tmp_path)
+    settings.EVALUATION_BUFFER_FLUSH_INTERVAL = 3600
+
+    with django_capture_on_commit_callbacks(execute=True):
+        mark, _, _ = services.correct_exam(student_group, {question: question.answers.get()})
+
+    assert mark == 1
+    assert selectors.get_question_evaluation_ev_count(question) == 0
+
+    write_behind.flush_buffer()
+    assert selectors.get_question_evaluation_ev_count(question) == 1
@@ -0,0 +1,154 @@
+"""
+Borrados por lotes y trabajos de borrado en segundo plano.
+
+Borrar de una vez los contadores de una asignatura (o los enlaces de un tema)
+es un único DELETE que bloquea miles de filas de QuestionEvaluationGroup
+mientras dura, y las correcciones de exámenes de esos grupos esperan. Aquí se
+borra por tramos de ids de DELETION_CHUNK_SIZE filas, cada uno en su propia
+transacción corta, avanzando por clave (id > último) para que el recorrido
+termine aunque entren filas nuevas.
+
+run() ejecuta una tarea de borrado en la propia petición si afecta a pocas
+filas (DELETION_SYNC_MAX_ROWS) o en un hilo aparte si no, y devuelve el
+trabajo: un diccionario con su estado y las filas borradas hasta el momento.
+Los de segundo plano se guardan en la BD (DeletionJob), así que get_job()
+responde igual en cualquier worker. Cada lote renueva el trabajo; si uno
+sigue 'running' sin lotes en DELETION_JOB_STALE_AFTER segundos, el proceso
+que lo ejecutaba murió y get_job() lo da por fallido.
+"""
+import logging
+import threading
+import uuid
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.evaluation.api.models import DeletionJob
+
+logger = logging.getLogger(__name__)
+
+# Se llama con las filas borradas en cada lote
+Progress = Callable[[int], None]
+
+
+def _default_delete(queryset) -> int:
+    return queryset.delete()[0]
+
+
+def delete_in_chunks(queryset, delete: Callable = None, progress: Progress = None) -> int:
+    """
+    Borra las filas de `queryset` por tramos de ids, una transacción por tramo.
+    `delete` recibe el queryset de cada tramo y devuelve las filas borradas
+    (por defecto queryset.delete()); sirve para restar antes los agregados.
+    """
+    delete = delete or _default_delete
+    size = getattr(settings, 'DELETION_CHUNK_SIZE', 500)
+    total = 0
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        ids = list(page.order_by('pk').values_list('pk', flat=True)[:size])
+        if not ids:
+            return total
+        with transaction.atomic():
+            count = delete(queryset.filter(pk__gte=ids[0], pk__lte=ids[-1]))
+        total += count
+        if progress:
+            progress(count)
+        if len(ids) < size:
+            return total
+        last = ids[-1]
+
+
+def _as_dict(job: DeletionJob) -> dict:
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'total': job.total,
+        'deleted': job.deleted,
+        'error': job.error,
+        'started_at': job.started_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def get_job(job_id: str) -> dict | None:
+    job = DeletionJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return None
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'DELETION_JOB_STALE_AFTER', 600))
+    if job.status == 'running' and job.updated_at < stale_before:
+        # Ningún hilo va a terminarlo (reinicio del worker, OOM...); solo si nadie lo ha renovado entretanto
+        DeletionJob.objects.filter(pk=job.pk, status='running', updated_at__lt=stale_before).update(
+            status='failed', error='Interrupted', finished_at=timezone.now(),
+        )
+        job.refresh_from_db()
+    return _as_dict(job)
+
+
+def _execute(job: dict, task: Callable[[Progress], object], reraise: bool, stored: bool) -> None:
+    def progress(count: int) -> None:
+        job['deleted'] += count
+        if stored:
+            DeletionJob.objects.filter(pk=job['id']).update(deleted=F('deleted') + count, updated_at=timezone.now())
+
+    try:
+        task(progress)
+        job['status'] = 'done'
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+        if reraise:
+            raise
+        logger.exception('Falló el trabajo de borrado %s', job['id'])
+    finally:
+        finished_at = timezone.now()
+        job['finished_at'] = finished_at.isoformat()
+        if stored:
+            DeletionJob.objects.filter(pk=job['id']).update(
+                status=job['status'], error=job['error'], finished_at=finished_at, updated_at=finished_at,
+            )
+
+
+def run(kind: str, task: Callable[[Progress], object], total: int) -> dict:
+    """
+    Ejecuta `task(progress)` y devuelve su trabajo. Con más de
+    DELETION_SYNC_MAX_ROWS filas estimadas (`total`) se guarda en la BD, se
+    lanza en un hilo y el trabajo vuelve en estado 'running'; si no, termina
+    antes de volver.
+    """
+    background = total > getattr(settings, 'DELETION_SYNC_MAX_ROWS', 5000) and getattr(settings, 'DELETION_BACKGROUND', True)
+    if not background:
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'status': 'running',
+            'total': total,
+            'deleted': 0,
+            'error': None,
+            'started_at': timezone.now().isoformat(),
+            'finished_at': None,
+        }
+        # En la petición los errores se propagan como hasta ahora
+        _execute(job, task, reraise=True, stored=False)
+        return job
+
+    # Los trabajos viejos se limpian al crear uno nuevo
+    DeletionJob.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=getattr(settings, 'DELETION_JOB_TTL', 24 * 3600))).delete()
+    job = _as_dict(DeletionJob.objects.create(id=uuid.uuid4().hex, kind=kind, total=total))
+
+    def target():
+        close_old_connections()
+        try:
+            _execute(job, task, reraise=False, stored=True)
+        finally:
+            close_old_connections()
+
+    # Se lanza al confirmar la petición (que también guarda el trabajo) para que el hilo vea lo que esta haya escrito
+    transaction.on_commit(lambda: threading.Thread(target=target, name=f'deletion-{job["id"]}', daemon=True).start())
+    return dict(job)
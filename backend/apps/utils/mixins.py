@@ -1,9 +1,12 @@
+def get_request_lang(request) -> str:
+    """Idioma ('es' o 'en') a partir de la cabecera Accept-Language."""
+    lang = request.headers.get('Accept-Language', 'es')[:2]
+    return 'en' if lang == 'en' else 'es'
 
 # Utility mixin for language-aware fields
 class LanguageSerializerMixin:
     def get_lang(self):
         request = self.context.get('request')
         if request:
-            lang = request.headers.get('Accept-Language', 'es')[:2]
-            return 'en' if lang == 'en' else 'es'
-        return 'es'
\ No newline at end of file
+            return get_request_lang(request)
+        return 'es'
@@ -67,6 +67,13 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+# Cabeceras de respuesta que el frontend puede leer
+CORS_EXPOSE_HEADERS = [
+    'x-exam-manifest',
+    'x-exam-seed',
+    'x-exam-variant',
+]
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -127,6 +134,18 @@ DATABASES = {
     )
 }
 
+# Cache
+# Caché en memoria por proceso. Los lotes del modo juego son muchas claves pequeñas,
+# así que se sube el límite de entradas por defecto (300).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 20000)),
+        },
+    }
+}
+
 # # This production code might break development mode, so we check whether we're in DEBUG mode
 if not DEBUG:
     # Tell Django to copy static assets into a path called `staticfiles` (this is specific to Render)
@@ -215,3 +234,82 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+
+# Evaluation
+# Segundos entre reconstrucciones completas del almacén de exámenes en memoria, en segundo plano (entre
+# medias se actualiza por señales). Con 0 no hay almacén y en PostgreSQL se consulta con ROW_NUMBER() por tema.
+EXAM_SAMPLING_CACHE_TTL = int(os.getenv('EXAM_SAMPLING_CACHE_TTL', 60))
+# Solo las preguntas aprobadas pueden salir en los exámenes. Desactivado por defecto: las preguntas se crean
+# sin aprobar y los exámenes siempre las han incluido
+EXAM_APPROVED_QUESTIONS_ONLY = os.getenv('EXAM_APPROVED_QUESTIONS_ONLY', 'False') == 'True'
+# Escritura diferida de los contadores de QuestionEvaluationGroup (False = escritura síncrona)
+EVALUATION_WRITE_BEHIND = os.getenv('EVALUATION_WRITE_BEHIND', 'False') == 'True'
+EVALUATION_BUFFER_FLUSH_INTERVAL = float(os.getenv('EVALUATION_BUFFER_FLUSH_INTERVAL', 5))
+EVALUATION_BUFFER_MAX_PENDING = int(os.getenv('EVALUATION_BUFFER_MAX_PENDING', 500))
+EVALUATION_BUFFER_SPILL_DIR = os.getenv('EVALUATION_BUFFER_SPILL_DIR', os.path.join(BASE_DIR, 'var', 'counters'))
+# Sub-filas por (grupo, pregunta) en QuestionEvaluationGroup para repartir los bloqueos en correcciones simultáneas
+EVALUATION_COUNTER_SHARDS = int(os.getenv('EVALUATION_COUNTER_SHARDS', 1))
+# Segundos durante los que se acepta el manifiesto firmado de un examen generado
+EXAM_MANIFEST_MAX_AGE = int(os.getenv('EXAM_MANIFEST_MAX_AGE', 4 * 3600))
+# Segundos que se reutiliza el índice pregunta→concepto de las recomendaciones y máximo de recomendaciones por examen
+EVALUATION_RECOMMENDATIONS_INDEX_TTL = int(os.getenv('EVALUATION_RECOMMENDATIONS_INDEX_TTL', 300))
+EVALUATION_RECOMMENDATIONS_MAX = int(os.getenv('EVALUATION_RECOMMENDATIONS_MAX', 5))
+# max-age (segundos) de Cache-Control en los exámenes pedidos con ?seed=, que son reproducibles.
+# Debe ser bastante menor que EXAM_MANIFEST_MAX_AGE porque el manifiesto cacheado caduca igual.
+EXAM_SEEDED_CACHE_MAX_AGE = int(os.getenv('EXAM_SEEDED_CACHE_MAX_AGE', 300))
+# Exámenes adaptativos (?difficulty=): peso de la media del banco al estimar la dificultad de cada pregunta,
+# cada cuántos segundos se suman las correcciones recientes y cada cuántos se reconstruye el índice desde la BD
+EXAM_DIFFICULTY_PRIOR_STRENGTH = float(os.getenv('EXAM_DIFFICULTY_PRIOR_STRENGTH', 10))
+EXAM_DIFFICULTY_REFRESH_INTERVAL = float(os.getenv('EXAM_DIFFICULTY_REFRESH_INTERVAL', 30))
+EXAM_DIFFICULTY_REBUILD_INTERVAL = float(os.getenv('EXAM_DIFFICULTY_REBUILD_INTERVAL', 600))
+# Máximo de exámenes por petición en /exams/evaluate-exams/ (sincronización sin conexión)
+EVALUATION_BATCH_MAX_EXAMS = int(os.getenv('EVALUATION_BATCH_MAX_EXAMS', 100))
+# Correcciones con submission_id: segundos que se recuerdan (y se guarda su resultado) y envíos
+# esperados por ventana, con los que se dimensiona el filtro de Bloom de cada proceso
+EVALUATION_DEDUP_WINDOW = int(os.getenv('EVALUATION_DEDUP_WINDOW', 24 * 3600))
+EVALUATION_DEDUP_CAPACITY = int(os.getenv('EVALUATION_DEDUP_CAPACITY', 100000))
+# Exámenes publicados: máximo de variantes por examen y segundos que se guardan en caché
+EXAM_VARIANTS_MAX = int(os.getenv('EXAM_VARIANTS_MAX', 200))
+EXAM_VARIANTS_CACHE_TTL = int(os.getenv('EXAM_VARIANTS_CACHE_TTL', 3600))
+# Registro de correcciones por franjas: días que se guardan por horas, días que se guardan por días
+# (después, por semanas), días de historia que se conservan (0 = toda) y meses de particiones creados por adelantado
+EVALUATION_EVENTS_HOURLY_DAYS = int(os.getenv('EVALUATION_EVENTS_HOURLY_DAYS', 14))
+EVALUATION_EVENTS_DAILY_DAYS = int(os.getenv('EVALUATION_EVENTS_DAILY_DAYS', 120))
+EVALUATION_EVENTS_RETENTION_DAYS = int(os.getenv('EVALUATION_EVENTS_RETENTION_DAYS', 0))
+EVALUATION_EVENTS_PARTITIONS_AHEAD = int(os.getenv('EVALUATION_EVENTS_PARTITIONS_AHEAD', 2))
+# Caché de /analytics/performance/: segundos que un resultado se da por fresco, segundos que se sigue
+# sirviendo caducado mientras se recalcula y si el recálculo se hace en un hilo aparte
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', 60))
+ANALYTICS_CACHE_STALE_TTL = int(os.getenv('ANALYTICS_CACHE_STALE_TTL', 24 * 3600))
+ANALYTICS_CACHE_BACKGROUND_REFRESH = os.getenv('ANALYTICS_CACHE_BACKGROUND_REFRESH', 'True') == 'True'
+# Segundos entre volcados de los agregados de analíticas (y del hexágono) pendientes de cada proceso
+# (0 = se escriben al confirmarse cada corrección)
+ANALYTICS_ROLLUP_FLUSH_INTERVAL = float(os.getenv('ANALYTICS_ROLLUP_FLUSH_INTERVAL', 5))
+# Filas por consulta al exportar analíticas (/analytics/export/); cada trozo es una consulta independiente
+ANALYTICS_EXPORT_CHUNK_SIZE = int(os.getenv('ANALYTICS_EXPORT_CHUNK_SIZE', 2000))
+# Calidad de las preguntas (compute_question_stats): evaluaciones mínimas para dar aviso y límites de
+# p por debajo/encima de los que una pregunta se marca como demasiado difícil/fácil
+QUESTION_STATS_MIN_ATTEMPTS = int(os.getenv('QUESTION_STATS_MIN_ATTEMPTS', 20))
+QUESTION_STATS_HARD_P = float(os.getenv('QUESTION_STATS_HARD_P', 0.2))
+QUESTION_STATS_EASY_P = float(os.getenv('QUESTION_STATS_EASY_P', 0.9))
+# Hexágono de la app de alumnos (/studentgroups/hexagon/): conceptos por defecto y peso de la prior (acierto
+# global del grupo)
+GROUP_MASTERY_CONCEPTS = int(os.getenv('GROUP_MASTERY_CONCEPTS', 6))
+GROUP_MASTERY_PRIOR_STRENGTH = float(os.getenv('GROUP_MASTERY_PRIOR_STRENGTH', 5))
+# Borrados grandes (reset de analíticas, grupos de una asignatura, preguntas, temas): filas por lote y
+# transacción, filas a partir de las que se borra en segundo plano devolviendo un trabajo, segundos que se
+# guarda el trabajo, segundos sin lotes tras los que un trabajo 'running' se da por interrumpido y si se usa
+# un hilo (False = siempre en la petición)
+DELETION_CHUNK_SIZE = int(os.getenv('DELETION_CHUNK_SIZE', 500))
+DELETION_SYNC_MAX_ROWS = int(os.getenv('DELETION_SYNC_MAX_ROWS', 5000))
+DELETION_JOB_TTL = int(os.getenv('DELETION_JOB_TTL', 24 * 3600))
+DELETION_JOB_STALE_AFTER = int(os.getenv('DELETION_JOB_STALE_AFTER', 600))
+DELETION_BACKGROUND = os.getenv('DELETION_BACKGROUND', 'True') == 'True'
+# Relaciones sugeridas entre conceptos (compute_concept_links): evaluaciones mínimas de un grupo en un concepto,
+# grupos en común mínimos de un par y sugerencias guardadas por concepto
+CONCEPT_LINKS_MIN_ATTEMPTS = int(os.getenv('CONCEPT_LINKS_MIN_ATTEMPTS', 3))
+CONCEPT_LINKS_MIN_GROUPS = int(os.getenv('CONCEPT_LINKS_MIN_GROUPS', 3))
+CONCEPT_LINKS_TOP_K = int(os.getenv('CONCEPT_LINKS_TOP_K', 5))
+# Modo juego: preguntas por lote y segundos que se reutiliza la lista de temas de cada asignatura al empezar partidas
+GAME_BATCH_SIZE = int(os.getenv('GAME_BATCH_SIZE', 10))
+GAME_DECK_TTL = int(os.getenv('GAME_DECK_TTL', 300))
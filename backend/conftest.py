@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def rollups_flush_on_commit(settings):
+    """Los agregados de analíticas se vuelcan al confirmarse cada corrección, sin el hilo de rollups."""
+    settings.ANALYTICS_ROLLUP_FLUSH_INTERVAL = 0
@@ -49,6 +49,11 @@ echo "Ejecutando tareas de mantenimiento (cron_jobs.sh)..."
 # Ejecutamos el script como django
 gosu django /cron_jobs.sh
 
+# 4. Contadores que quedaron en ficheros de spill si algún worker murió (EVALUATION_WRITE_BEHIND).
+# Se reaplican aquí, una sola vez y antes de que haya workers, para que las analíticas no esperen a la próxima corrección
+echo "Reaplicando contadores pendientes del buffer de escritura diferida..."
+gosu django python manage.py flush_evaluation_counters
+
 echo "Arrancando servidor Gunicorn modo gevent..."
 # --- EXPLICACIÓN DE LA CONFIGURACIÓN ---
 # --workers 5: (Num_Cores + 1). La Pi tiene 4 cores. 5 workers mantienen la CPU ocupada.
@@ -1,5 +1,10 @@
 import { apiClient } from './apiClient';
 
+// Manifiesto firmado del último examen generado (cabecera X-Exam-Manifest)
+let examManifest = null;
+// Id de la corrección del examen en curso: los reintentos lo repiten y el servidor no vuelve a contarla
+let examSubmissionId = null;
+
 export const mockApi = {
   validateStudentGroupCode: async (code) => {
     try {
@@ -41,6 +46,17 @@ export const mockApi = {
     }
   },
 
+  // Dominio del grupo en los conceptos más evaluados de la asignatura: { code, concepts: [{ id, name, mastery, attempts, correct }] }
+  getHexagon: async (code, n) => {
+    try {
+      const response = await apiClient.get('/studentgroups/hexagon/', { params: { code, n } });
+      return response.data;
+    } catch (error) {
+      console.error('Error obteniendo el hexágono de conceptos:', error);
+      throw error;
+    }
+  },
+
   getTopicDetails: async (title) => {
     try {
       const response = await apiClient.get(`/studentgroups/topic/`, {params: { title: title }});
@@ -68,6 +84,9 @@ export const mockApi = {
     }
     try {
       const response = await apiClient.get('/exams/generate-exam/?topics=' + topicTitles + '&nQuestions=' + nQuestions);
+      // Manifiesto firmado del examen: permite corregirlo sin releer las preguntas
+      examManifest = response.headers['x-exam-manifest'] || null;
+      examSubmissionId = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
       return response.data;
     } catch (error) {
       console.error('Error generando examen:', error);
@@ -80,7 +99,9 @@ export const mockApi = {
       // apiClient ya tiene la baseURL, así que solo ponemos la ruta relativa
       const response = await apiClient.post('/exams/evaluate-exam/', {
         student_group_code: studentGroupCode,
-        questions_and_answers: answers
+        questions_and_answers: answers,
+        manifest: examManifest,
+        submission_id: examSubmissionId,
       });
 
       // Axios devuelve los datos directamente en la propiedad .data
@@ -97,6 +118,18 @@ export const mockApi = {
     }
   },
 
+  // Envía de una vez los exámenes hechos sin conexión: [{ student_group_code, questions_and_answers, manifest }]
+  evaluateExams: async (exams) => {
+    try {
+      const response = await apiClient.post('/exams/evaluate-exams/', { exams });
+      return response.data.results;
+    } catch (error) {
+      console.error("Error en evaluateExams:", error);
+      const errorMessage = error.response?.data?.detail || 'Error evaluando los exámenes';
+      throw new Error(errorMessage);
+    }
+  },
+
   getQuestion: async (id) => {
     try {
       const response = await apiClient.get('/studentgroups/question-translate/', {
@@ -77,3 +77,6 @@ export const unlinkConceptFromConcept = async (parentId, childConceptId) => {
   })).data;
 };
 
+
+// Conceptos que los grupos suelen fallar junto a este; se aceptan con linkConceptToConcept
+export const getSuggestedConcepts = async (id) => (await apiClient.get(`/concepts/${id}/suggested-concepts/`)).data;
@@ -2,7 +2,15 @@ import { apiClient } from './api'
 
 // --- PREGUNTAS ---
 
-export const getQuestions = async () => (await apiClient.get('/questions/long-questions/')).data;
+// params (opcionales): { flag: 'too_hard'|'too_easy'|'negative_discrimination'|'insufficient_data'|'',
+//                        ordering: 'p_value'|'-p_value'|'discrimination'|'-discrimination'|'attempts'|'ci_width'|... }
+// Cada pregunta trae 'stats' (p suavizada, intervalo, discriminación y aviso) o null si aún no se ha calculado
+export const getQuestions = async (params) => (await apiClient.get('/questions/long-questions/', { params })).data;
+
+// Preguntas por aviso de calidad y fecha del último cálculo; refresh las recalcula
+export const getQuestionStats = async () => (await apiClient.get('/questions/stats/')).data;
+
+export const refreshQuestionStats = async () => (await apiClient.post('/questions/stats/')).data;
 
 export const createQuestion = async (data) => {
     // data: { type, statement_es/en, explanation_es/en, topics_titles, concepts_names }
@@ -55,8 +63,25 @@ export const getAnalytics = async (filters) => {
     return response.data;
 };
 
+export const getAnalyticsCrosstab = async (filters) => {
+    // filters: { rows, columns, subject_id, top_rows, top_columns }
+    // Respuesta por columnas: { rows: {ids, labels}, columns: {ids, labels}, attempts, correct, accuracy }
+    const response = await apiClient.get('/analytics/crosstab/', { params: filters });
+    return response.data;
+};
+
+export const exportAnalytics = async (params) => {
+    // params: { output: 'csv'|'ndjson', level: 'aggregate'|'raw', group_by, subject_id, from, to }
+    const response = await apiClient.get('/analytics/export/', { params, responseType: 'blob' });
+    return response.data;
+};
+
 export const resetAnalytics = async (params) => {
     // params: { scope: 'global'|'subject'|'specific', ... }
+    // Si hay muchos registros responde 202 con { job } y el borrado sigue en segundo plano (ver getDeletionJob)
     const response = await apiClient.delete('/analytics/reset-analytics/', { params });
     return response.data;
-};
\ No newline at end of file
+};
+
+// Estado de un borrado en segundo plano: { id, kind, status: 'running'|'done'|'failed', total, deleted, error }
+export const getDeletionJob = async (jobId) => (await apiClient.get(`/analytics/deletion-jobs/${jobId}/`)).data;
\ No newline at end of file